@@ -1,6 +1,7 @@
 """
 运行完整的狼人杀游戏示例
 """
+import argparse
 import asyncio
 import sys
 from pathlib import Path
@@ -11,11 +12,22 @@ sys.path.insert(0, str(project_root))
 
 from src.state.game_state import StateManager
 from src.utils.role_assigner import assign_roles
-from src.graph.game_graph import create_game_graph
+from src.graph.game_graph import create_game_graph, stream_game
+from src.graph.events import log_event
+from src.utils.game_logging import configure_logging, shutdown_logging
 
 
-async def main():
-    """主函数"""
+async def main(quiet: bool = False, log_file: str = None):
+    """
+    主函数
+    
+    Args:
+        quiet: 安静模式（不输出对局过程，只输出警告和最终结果）
+        log_file: 结构化日志（JSON Lines）文件路径
+    """
+    # 对局过程通过日志队列由后台线程输出，不阻塞游戏
+    configure_logging(quiet=quiet, json_path=log_file)
+    
     print("🐺 Cyber-Werewolf 游戏开始！")
     print("=" * 60)
     
@@ -40,9 +52,14 @@ async def main():
     # 创建游戏图
     game_graph = create_game_graph()
     
-    # 运行游戏
+    # 运行游戏（游戏事件交给日志订阅者输出）
     try:
-        final_state = await game_graph.ainvoke(initial_state)
+        stream = stream_game(initial_state, graph=game_graph, consumers=[log_event])
+        async for _ in stream:
+            pass
+        final_state = stream.final_state
+        # 写完队列中的对局过程，再输出结果
+        shutdown_logging()
         
         print("\n" + "=" * 60)
         print("🎮 游戏结束！")
@@ -72,5 +89,9 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="运行完整的狼人杀游戏示例")
+    parser.add_argument("--quiet", action="store_true", help="安静模式：不输出对局过程")
+    parser.add_argument("--log-file", default=None, help="结构化日志（JSON Lines）文件路径")
+    args = parser.parse_args()
+    asyncio.run(main(quiet=args.quiet, log_file=args.log_file))
 
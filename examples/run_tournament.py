@@ -0,0 +1,94 @@
+"""
+锦标赛示例：在一个事件循环中并发运行多局游戏，结果写入 JSONL
+
+用法：
+    LLM_PROVIDER=local python examples/run_tournament.py --games 100 --concurrency 16 --output results.jsonl
+    LLM_PROVIDER=local python examples/run_tournament.py --games 1000 --workers 8 --concurrency 16 --output results.jsonl
+"""
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.utils.rate_limiter import configure_rate_limiter
+from src.utils.telemetry import configure_telemetry
+from src.utils.tournament import make_game_specs, run_tournament, run_tournament_processes
+
+
+def parse_role_config(text: str):
+    """解析角色配置，例如 "8:villager=3,werewolf=2,seer=1,witch=1,guard=1" """
+    count, _, roles = text.partition(":")
+    config = {}
+    for item in roles.split(","):
+        role, _, number = item.partition("=")
+        config[role.strip()] = int(number)
+    return int(count), config
+
+
+def main(args):
+    """主函数"""
+    specs = make_game_specs(
+        args.games,
+        seed=args.seed,
+        player_counts=args.players,
+        role_configs=dict(parse_role_config(text) for text in args.roles),
+        max_rounds=args.max_rounds,
+    )
+
+    def report(result, stats):
+        status = result.error or f"胜方: {result.winner or '平局'}，{result.days} 天"
+        print(f"  [{len(stats.results)}/{len(specs)}] 第 {result.game_index} 局（{result.player_count}人，种子 {result.seed}）{status}，耗时 {result.wall_time:.1f}s")
+
+    if args.workers > 1:
+        # 多进程：每个进程一个事件循环，限流预算平均分给各进程
+        print(f"🏆 锦标赛开始：{args.games} 局，{args.workers} 个进程，每个进程最多 {args.concurrency} 局同时进行")
+        stats = run_tournament_processes(
+            specs,
+            workers=args.workers,
+            concurrency=args.concurrency,
+            output_path=args.output,
+            on_result=report,
+            rpm=args.rpm,
+            tpm=args.tpm,
+            parallel_voting=args.parallel_voting,
+        )
+    else:
+        # 单进程：所有对局共享同一个限流器和遥测收集器
+        if args.rpm or args.tpm:
+            configure_rate_limiter(rpm=args.rpm, tpm=args.tpm)
+        configure_telemetry(enabled=True)
+        print(f"🏆 锦标赛开始：{args.games} 局，最多 {args.concurrency} 局同时进行")
+        stats = asyncio.run(run_tournament(
+            specs,
+            concurrency=args.concurrency,
+            output_path=args.output,
+            on_result=report,
+            parallel_voting=args.parallel_voting,
+        ))
+
+    if stats.cancelled:
+        print("\n⚠️  锦标赛被中断，以下为已完成对局的汇总")
+
+    print("\n📊 汇总：")
+    print(json.dumps(stats.summary(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="并发运行多局狼人杀游戏")
+    parser.add_argument("--games", type=int, default=10, help="对局数")
+    parser.add_argument("--concurrency", type=int, default=8, help="（每个进程）同时进行的最大对局数")
+    parser.add_argument("--workers", type=int, default=1, help="进程数（大于 1 时把对局分给多个进程运行）")
+    parser.add_argument("--seed", type=int, default=0, help="总随机种子（每局的种子由它派生）")
+    parser.add_argument("--players", type=int, nargs="+", default=[6], help="参与轮换的玩家人数")
+    parser.add_argument("--roles", nargs="*", default=[], help="按人数指定角色配置，如 8:villager=3,werewolf=2,seer=1,witch=1,guard=1")
+    parser.add_argument("--max-rounds", type=int, default=20, help="每局最大轮次")
+    parser.add_argument("--rpm", type=float, default=None, help="所有对局共享的每分钟请求数上限")
+    parser.add_argument("--tpm", type=float, default=None, help="所有对局共享的每分钟 token 数上限")
+    parser.add_argument("--parallel-voting", action="store_true", help="并行收集投票")
+    parser.add_argument("--output", default=None, help="JSONL 结果文件路径")
+    main(parser.parse_args())
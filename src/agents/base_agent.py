@@ -1,10 +1,16 @@
 """
 基础 Agent 类
 """
+import random
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, List
-from ..utils.llm_client import LLMClient
-from ..schemas.actions import AgentAction
+from typing import Dict, Any, Optional, List, Callable
+from ..utils.llm_client import LLMClient, get_llm_client
+from ..schemas.actions import AgentAction, SpeakDecision, VoteDecision, LastWordsDecision, SheriffTransferDecision, SpeakingOrderDecision
+from ..utils.telemetry import record_fallback
+from ..utils.game_logging import get_logger
+from ..state.game_state import player_index
+
+logger = get_logger(__name__)
 
 
 class BaseAgent(ABC):
@@ -24,13 +30,15 @@ class BaseAgent(ABC):
             agent_id: Agent ID
             role: 角色名称
             name: Agent 名称
-            llm_client: LLM 客户端（如果为 None，则创建默认的 DeepSeek 客户端）
+            llm_client: LLM 客户端（如果为 None，则使用注册表中共享的默认客户端，由 LLM_PROVIDER 决定）
         """
         self.agent_id = agent_id
         self.role = role
         self.name = name
         self.memory = []
-        self.llm_client = llm_client or LLMClient(provider="deepseek")
+        self.llm_client = llm_client or get_llm_client()
+        # 兜底随机选择使用的随机数生成器（由名册替换为本局的种子随机数生成器，保证同种子对局可复现）
+        self.rng = random.Random()
     
     @abstractmethod
     async def observe(self, game_state: Dict[str, Any]) -> Dict[str, Any]:
@@ -50,7 +58,8 @@ class BaseAgent(ABC):
     async def speak(
         self,
         game_state: Dict[str, Any],
-        context: str = "normal"
+        context: str = "normal",
+        on_token: Optional[Callable[[str], Any]] = None
     ) -> str:
         """
         发言
@@ -58,6 +67,7 @@ class BaseAgent(ABC):
         Args:
             game_state: 游戏状态
             context: 发言上下文（normal=正常发言, sheriff_campaign=警长竞选, sheriff_pk=警长PK）
+            on_token: 流式输出回调（提供时边生成边把发言的新增内容交给回调）
         
         Returns:
             发言内容
@@ -74,17 +84,9 @@ class BaseAgent(ABC):
             context
         )
         
-        # 定义发言决策的 Schema
-        from pydantic import BaseModel, Field
-        class SpeakDecision(BaseModel):
-            thought: str = Field(description="推理过程")
-            content: str = Field(description="发言内容")
-            confidence: float = Field(description="置信度（0-1）", ge=0.0, le=1.0)
-            reasoning: str = Field(description="发言理由")
-        
         try:
             # 获取结构化输出的 LLM
-            structured_llm = self.llm_client.get_structured_llm(SpeakDecision)
+            structured_llm = self.llm_client.get_structured_llm(SpeakDecision, agent_role=self.role)
             
             # 调用 LLM（使用 LangChain 消息格式）
             from langchain_core.messages import SystemMessage, HumanMessage
@@ -92,12 +94,16 @@ class BaseAgent(ABC):
                 SystemMessage(content=system_prompt),
                 HumanMessage(content=user_prompt)
             ]
-            decision = await structured_llm.ainvoke(messages)
+            if on_token is not None:
+                decision = await structured_llm.ainvoke_streaming(messages, on_token)
+            else:
+                decision = await structured_llm.ainvoke(messages)
             
             return decision.content
         except Exception as e:
             # LLM 调用失败，返回默认发言
-            print(f"⚠️  {self.name} 发言 LLM 调用失败: {e}")
+            logger.warning("⚠️  %s 发言 LLM 调用失败: %s", self.name, e)
+            record_fallback("speak", e, role=self.role)
             return f"{self.name} 的发言（LLM 调用失败，使用默认发言）"
     
     async def vote(
@@ -130,18 +136,9 @@ class BaseAgent(ABC):
             candidates
         )
         
-        # 定义投票决策的 Schema
-        from pydantic import BaseModel, Field
-        from typing import Optional
-        class VoteDecision(BaseModel):
-            thought: str = Field(description="推理过程")
-            target_id: Optional[int] = Field(default=None, description="目标玩家ID（如果不投票则返回None）")
-            confidence: float = Field(description="置信度（0-1）", ge=0.0, le=1.0)
-            reasoning: str = Field(description="决策理由")
-        
         try:
             # 获取结构化输出的 LLM
-            structured_llm = self.llm_client.get_structured_llm(VoteDecision)
+            structured_llm = self.llm_client.get_structured_llm(VoteDecision, agent_role=self.role)
             
             # 调用 LLM（使用 LangChain 消息格式）
             from langchain_core.messages import SystemMessage, HumanMessage
@@ -153,12 +150,7 @@ class BaseAgent(ABC):
             
             # 验证目标玩家是否存在
             if decision.target_id:
-                players = game_state.get("players", [])
-                alive_players = [p for p in players if p.is_alive]
-                target_player = next(
-                    (p for p in alive_players if p.player_id == decision.target_id),
-                    None
-                )
+                target_player = player_index(game_state).get_alive(decision.target_id)
                 if target_player:
                     # 如果是警长投票，验证目标是否在候选人中
                     if vote_type == "sheriff" and candidates:
@@ -172,15 +164,14 @@ class BaseAgent(ABC):
             return None
         except Exception as e:
             # LLM 调用失败，随机投票
-            print(f"⚠️  {self.name} 投票 LLM 调用失败: {e}")
-            players = game_state.get("players", [])
-            alive_players = [p for p in players if p.is_alive]
+            logger.warning("⚠️  %s 投票 LLM 调用失败: %s", self.name, e)
+            record_fallback("vote", e, role=self.role)
+            alive_players = player_index(game_state).alive()
             other_players = [p for p in alive_players if p.player_id != self.agent_id]
             if vote_type == "sheriff" and candidates:
                 other_players = [p for p in other_players if p.player_id in candidates]
             if other_players:
-                import random
-                return random.choice(other_players).player_id
+                return self.rng.choice(other_players).player_id
             return None
     
     async def leave_last_words(
@@ -210,17 +201,9 @@ class BaseAgent(ABC):
             death_reason
         )
         
-        # 定义遗言的 Schema
-        from pydantic import BaseModel, Field
-        class LastWordsDecision(BaseModel):
-            thought: str = Field(description="推理过程")
-            content: str = Field(description="遗言内容")
-            confidence: float = Field(description="置信度（0-1）", ge=0.0, le=1.0)
-            reasoning: str = Field(description="遗言理由")
-        
         try:
             # 获取结构化输出的 LLM
-            structured_llm = self.llm_client.get_structured_llm(LastWordsDecision)
+            structured_llm = self.llm_client.get_structured_llm(LastWordsDecision, agent_role=self.role)
             
             # 调用 LLM（使用 LangChain 消息格式）
             from langchain_core.messages import SystemMessage, HumanMessage
@@ -233,7 +216,8 @@ class BaseAgent(ABC):
             return decision.content
         except Exception as e:
             # LLM 调用失败，返回默认遗言
-            print(f"⚠️  {self.name} 遗言 LLM 调用失败: {e}")
+            logger.warning("⚠️  %s 遗言 LLM 调用失败: %s", self.name, e)
+            record_fallback("last_words", e, role=self.role)
             return f"{self.name} 的遗言（LLM 调用失败，使用默认遗言）"
     
     async def decide_sheriff_transfer(
@@ -250,8 +234,8 @@ class BaseAgent(ABC):
             目标玩家ID（如果移交），None（如果销毁警徽）
         """
         # 检查是否是警长
-        players = game_state.get("players", [])
-        current_player = next((p for p in players if p.player_id == self.agent_id), None)
+        index = player_index(game_state)
+        current_player = index.get(self.agent_id)
         if not current_player or not current_player.is_sheriff:
             # 不是警长，不能移交
             return None
@@ -267,19 +251,9 @@ class BaseAgent(ABC):
             observation
         )
         
-        # 定义警长移交决策的 Schema
-        from pydantic import BaseModel, Field
-        from typing import Optional
-        class SheriffTransferDecision(BaseModel):
-            thought: str = Field(description="推理过程")
-            should_transfer: bool = Field(description="是否移交警徽（True=移交，False=销毁）")
-            target_id: Optional[int] = Field(default=None, description="目标玩家ID（如果移交），None（如果销毁）")
-            confidence: float = Field(description="置信度（0-1）", ge=0.0, le=1.0)
-            reasoning: str = Field(description="决策理由")
-        
         try:
             # 获取结构化输出的 LLM
-            structured_llm = self.llm_client.get_structured_llm(SheriffTransferDecision)
+            structured_llm = self.llm_client.get_structured_llm(SheriffTransferDecision, agent_role=self.role)
             
             # 调用 LLM（使用 LangChain 消息格式）
             from langchain_core.messages import SystemMessage, HumanMessage
@@ -292,11 +266,7 @@ class BaseAgent(ABC):
             # 验证决策
             if decision.should_transfer and decision.target_id:
                 # 验证目标玩家是否存在且存活
-                alive_players = [p for p in players if p.is_alive]
-                target_player = next(
-                    (p for p in alive_players if p.player_id == decision.target_id),
-                    None
-                )
+                target_player = index.get_alive(decision.target_id)
                 if target_player and target_player.player_id != self.agent_id:
                     return decision.target_id
             
@@ -304,7 +274,8 @@ class BaseAgent(ABC):
             return None
         except Exception as e:
             # LLM 调用失败，默认销毁警徽
-            print(f"⚠️  警长 {self.name} 移交决策 LLM 调用失败: {e}")
+            logger.warning("⚠️  警长 %s 移交决策 LLM 调用失败: %s", self.name, e)
+            record_fallback("sheriff_transfer", e, role=self.role)
             return None
     
     async def decide_speaking_order(
@@ -323,8 +294,7 @@ class BaseAgent(ABC):
             True=顺序发言，False=逆序发言
         """
         # 检查是否是警长
-        players = game_state.get("players", [])
-        current_player = next((p for p in players if p.player_id == self.agent_id), None)
+        current_player = player_index(game_state).get(self.agent_id)
         if not current_player or not current_player.is_sheriff:
             # 不是警长，默认顺序
             return True
@@ -341,17 +311,9 @@ class BaseAgent(ABC):
             alive_players
         )
         
-        # 定义发言顺序决策的 Schema
-        from pydantic import BaseModel, Field
-        class SpeakingOrderDecision(BaseModel):
-            thought: str = Field(description="推理过程")
-            use_order: bool = Field(description="是否顺序发言（True=顺序，False=逆序）")
-            confidence: float = Field(description="置信度（0-1）", ge=0.0, le=1.0)
-            reasoning: str = Field(description="决策理由")
-        
         try:
             # 获取结构化输出的 LLM
-            structured_llm = self.llm_client.get_structured_llm(SpeakingOrderDecision)
+            structured_llm = self.llm_client.get_structured_llm(SpeakingOrderDecision, agent_role=self.role)
             
             # 调用 LLM（使用 LangChain 消息格式）
             from langchain_core.messages import SystemMessage, HumanMessage
@@ -364,6 +326,7 @@ class BaseAgent(ABC):
             return decision.use_order
         except Exception as e:
             # LLM 调用失败，默认顺序发言
-            print(f"⚠️  警长 {self.name} 发言顺序决策 LLM 调用失败: {e}")
+            logger.warning("⚠️  警长 %s 发言顺序决策 LLM 调用失败: %s", self.name, e)
+            record_fallback("speaking_order", e, role=self.role)
             return True
 
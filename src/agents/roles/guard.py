@@ -3,7 +3,12 @@
 """
 from typing import Dict, Any, Optional
 from ..base_agent import BaseAgent
-from ...schemas.actions import AgentAction
+from ...schemas.actions import AgentAction, GuardDecision
+from ...utils.telemetry import record_fallback
+from ...utils.game_logging import get_logger
+from ...state.game_state import player_index
+
+logger = get_logger(__name__)
 
 
 class GuardAgent(BaseAgent):
@@ -47,10 +52,10 @@ class GuardAgent(BaseAgent):
         Returns:
             目标玩家ID，如果不守护则返回 None
         """
-        alive_players = [p for p in game_state.get("players", []) if p.is_alive]
+        index = player_index(game_state)
         
         # 不能守护自己，不能连续两晚守护同一人
-        targets = [p for p in alive_players 
+        targets = [p for p in index.alive()
                    if p.player_id != self.agent_id and p.player_id != last_protected_id]
         
         if not targets:
@@ -67,17 +72,9 @@ class GuardAgent(BaseAgent):
             last_protected_id
         )
         
-        # 定义守护决策的 Schema
-        from pydantic import BaseModel, Field
-        class GuardDecision(BaseModel):
-            thought: str = Field(description="推理过程")
-            target_id: Optional[int] = Field(default=None, description="目标玩家ID（如果不守护则返回None）")
-            confidence: float = Field(description="置信度（0-1）", ge=0.0, le=1.0)
-            reasoning: str = Field(description="决策理由")
-        
         try:
             # 获取结构化输出的 LLM
-            structured_llm = self.llm_client.get_structured_llm(GuardDecision)
+            structured_llm = self.llm_client.get_structured_llm(GuardDecision, agent_role=self.role)
             
             # 调用 LLM（使用 LangChain 消息格式）
             from langchain_core.messages import SystemMessage, HumanMessage
@@ -89,19 +86,16 @@ class GuardAgent(BaseAgent):
             
             if decision.target_id:
                 # 验证目标玩家是否存在且符合规则
-                target_player = next(
-                    (p for p in targets if p.player_id == decision.target_id),
-                    None
-                )
-                if target_player:
+                target_id = decision.target_id
+                if index.is_alive(target_id) and target_id not in (self.agent_id, last_protected_id):
                     return decision.target_id
             
             return None
         except Exception as e:
             # LLM 调用失败，随机选择
-            print(f"⚠️  守卫 {self.name} 守护决策 LLM 调用失败: {e}")
-            import random
-            target = random.choice(targets)
+            logger.warning("⚠️  守卫 %s 守护决策 LLM 调用失败: %s", self.name, e)
+            record_fallback("guard_protect", e, role=self.role)
+            target = self.rng.choice(targets)
             return target.player_id
 
 
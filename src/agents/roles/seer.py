@@ -4,6 +4,11 @@
 from typing import Dict, Any, List, Optional
 from ..base_agent import BaseAgent
 from ...schemas.actions import AgentAction
+from ...utils.telemetry import record_fallback
+from ...utils.game_logging import get_logger
+from ...state.game_state import player_index
+
+logger = get_logger(__name__)
 
 
 class SeerAgent(BaseAgent):
@@ -60,7 +65,7 @@ class SeerAgent(BaseAgent):
         )
         
         # 获取结构化输出的 LLM
-        structured_llm = self.llm_client.get_structured_llm(AgentAction)
+        structured_llm = self.llm_client.get_structured_llm(AgentAction, decision_type="seer_check", agent_role=self.role)
         
         try:
             # 调用 LLM（使用 LangChain 消息格式）
@@ -74,18 +79,15 @@ class SeerAgent(BaseAgent):
             # 验证返回的 action
             if action.action_type == "check" and action.target:
                 # 验证目标玩家是否存在且存活
-                players = game_state.get("players", [])
-                target_player = next(
-                    (p for p in players if p.player_id == action.target and p.is_alive),
-                    None
-                )
+                target_player = player_index(game_state).get_alive(action.target)
                 if target_player and target_player.player_id != self.agent_id:
                     return action.target
             
             return None
         except Exception as e:
             # LLM 调用失败，返回 None
-            print(f"⚠️  预言家 {self.name} LLM 调用失败: {e}")
+            logger.warning("⚠️  预言家 %s LLM 调用失败: %s", self.name, e)
+            record_fallback("seer_check", e, role=self.role)
             return None
     
     async def check_player(self, game_state: Dict[str, Any], target_id: int) -> Dict[str, str]:
@@ -99,8 +101,7 @@ class SeerAgent(BaseAgent):
         Returns:
             查验结果 {"target_id": "好人" 或 "狼人"}
         """
-        players = game_state.get("players", [])
-        target_player = next((p for p in players if p.player_id == target_id), None)
+        target_player = player_index(game_state).get(target_id)
         
         if target_player:
             # 预言家只能知道是好人还是狼人，不能知道具体身份
@@ -3,7 +3,12 @@
 """
 from typing import Dict, Any, Optional
 from ..base_agent import BaseAgent
-from ...schemas.actions import AgentAction
+from ...schemas.actions import AgentAction, AntidoteDecision, PoisonDecision
+from ...utils.telemetry import record_fallback
+from ...utils.game_logging import get_logger
+from ...state.game_state import player_index
+
+logger = get_logger(__name__)
 
 
 class WitchAgent(BaseAgent):
@@ -67,17 +72,9 @@ class WitchAgent(BaseAgent):
             killed_player_id
         )
         
-        # 定义解药决策的 Schema
-        from pydantic import BaseModel, Field
-        class AntidoteDecision(BaseModel):
-            thought: str = Field(description="推理过程")
-            use_antidote: bool = Field(description="是否使用解药")
-            confidence: float = Field(description="置信度（0-1）", ge=0.0, le=1.0)
-            reasoning: str = Field(description="决策理由")
-        
         try:
             # 获取结构化输出的 LLM
-            structured_llm = self.llm_client.get_structured_llm(AntidoteDecision)
+            structured_llm = self.llm_client.get_structured_llm(AntidoteDecision, agent_role=self.role)
             
             # 调用 LLM（使用 LangChain 消息格式）
             from langchain_core.messages import SystemMessage, HumanMessage
@@ -90,7 +87,8 @@ class WitchAgent(BaseAgent):
             return decision.use_antidote
         except Exception as e:
             # LLM 调用失败，使用默认逻辑
-            print(f"⚠️  女巫 {self.name} 解药决策 LLM 调用失败: {e}")
+            logger.warning("⚠️  女巫 %s 解药决策 LLM 调用失败: %s", self.name, e)
+            record_fallback("witch_antidote", e, role=self.role)
             # 默认逻辑：第一夜救自己
             if self.first_night and killed_player_id == self.agent_id:
                 return True
@@ -110,8 +108,8 @@ class WitchAgent(BaseAgent):
             return None
         
         # 毒药不能给自己用
-        alive_players = [p for p in game_state.get("players", []) if p.is_alive]
-        targets = [p for p in alive_players if p.player_id != self.agent_id]
+        index = player_index(game_state)
+        targets = [p for p in index.alive() if p.player_id != self.agent_id]
         
         if not targets:
             return None
@@ -126,18 +124,9 @@ class WitchAgent(BaseAgent):
             observation
         )
         
-        # 定义毒药决策的 Schema
-        from pydantic import BaseModel, Field
-        class PoisonDecision(BaseModel):
-            thought: str = Field(description="推理过程")
-            use_poison: bool = Field(description="是否使用毒药")
-            target_id: Optional[int] = Field(default=None, description="目标玩家ID（如果使用毒药）")
-            confidence: float = Field(description="置信度（0-1）", ge=0.0, le=1.0)
-            reasoning: str = Field(description="决策理由")
-        
         try:
             # 获取结构化输出的 LLM
-            structured_llm = self.llm_client.get_structured_llm(PoisonDecision)
+            structured_llm = self.llm_client.get_structured_llm(PoisonDecision, agent_role=self.role)
             
             # 调用 LLM（使用 LangChain 消息格式）
             from langchain_core.messages import SystemMessage, HumanMessage
@@ -149,17 +138,14 @@ class WitchAgent(BaseAgent):
             
             if decision.use_poison and decision.target_id:
                 # 验证目标玩家是否存在且不是自己
-                target_player = next(
-                    (p for p in targets if p.player_id == decision.target_id),
-                    None
-                )
-                if target_player:
+                if index.is_alive(decision.target_id) and decision.target_id != self.agent_id:
                     return decision.target_id
             
             return None
         except Exception as e:
             # LLM 调用失败，返回 None（不使用毒药）
-            print(f"⚠️  女巫 {self.name} 毒药决策 LLM 调用失败: {e}")
+            logger.warning("⚠️  女巫 %s 毒药决策 LLM 调用失败: %s", self.name, e)
+            record_fallback("witch_poison", e, role=self.role)
             return None
 
 
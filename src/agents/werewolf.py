@@ -3,7 +3,12 @@
 """
 from typing import Dict, Any, List, Optional
 from .base_agent import BaseAgent
-from ..schemas.actions import AgentAction
+from ..schemas.actions import AgentAction, KillVoteDecision, ExplodeDecision
+from ..utils.telemetry import record_fallback
+from ..utils.game_logging import get_logger
+from ..state.game_state import player_index
+
+logger = get_logger(__name__)
 
 
 class WerewolfAgent(BaseAgent):
@@ -15,13 +20,13 @@ class WerewolfAgent(BaseAgent):
     
     async def observe(self, game_state: Dict[str, Any]) -> Dict[str, Any]:
         """狼人可以看到公共信息和狼人频道信息"""
-        players = game_state.get("players", [])
-        alive_players = [p for p in players if p.is_alive]
+        index = player_index(game_state)
+        alive_players = index.alive()
         
         # 识别狼人队友
         werewolf_teammates = [
-            p for p in alive_players 
-            if p.role == "werewolf" and p.player_id != self.agent_id
+            p for p in index.with_role("werewolf")
+            if p.player_id != self.agent_id
         ]
         
         return {
@@ -74,11 +79,12 @@ class WerewolfAgent(BaseAgent):
         
         try:
             # 调用 LLM 生成发言内容
-            response = await self.llm_client.call(system_prompt, user_prompt)
+            response = await self.llm_client.call(system_prompt, user_prompt, decision_type="werewolf_discuss", agent_role=self.role)
             return response.strip()
         except Exception as e:
             # LLM 调用失败，返回默认发言
-            print(f"⚠️  狼人 {self.name} 频道发言 LLM 调用失败: {e}")
+            logger.warning("⚠️  狼人 %s 频道发言 LLM 调用失败: %s", self.name, e)
+            record_fallback("werewolf_discuss", e, role=self.role)
             return "我们需要讨论今晚的攻击策略。"
     
     async def vote_to_kill(
@@ -98,8 +104,8 @@ class WerewolfAgent(BaseAgent):
         Returns:
             目标玩家ID，如果不攻击则返回 None
         """
-        alive_players = [p for p in game_state.get("players", []) if p.is_alive]
-        targets = [p for p in alive_players if p.role != "werewolf"]
+        index = player_index(game_state)
+        targets = [p for p in index.alive() if p.role != "werewolf"]
         
         if not targets:
             return None
@@ -114,18 +120,9 @@ class WerewolfAgent(BaseAgent):
             werewolf_channel_messages
         )
         
-        # 定义投票决策的 Schema
-        from pydantic import BaseModel, Field
-        from typing import Optional
-        class KillVoteDecision(BaseModel):
-            thought: str = Field(description="推理过程")
-            target_id: Optional[int] = Field(default=None, description="目标玩家ID（如果不攻击则返回None）")
-            confidence: float = Field(description="置信度（0-1）", ge=0.0, le=1.0)
-            reasoning: str = Field(description="决策理由")
-        
         try:
             # 获取结构化输出的 LLM
-            structured_llm = self.llm_client.get_structured_llm(KillVoteDecision)
+            structured_llm = self.llm_client.get_structured_llm(KillVoteDecision, agent_role=self.role)
             
             # 调用 LLM（使用 LangChain 消息格式）
             from langchain_core.messages import SystemMessage, HumanMessage
@@ -137,19 +134,16 @@ class WerewolfAgent(BaseAgent):
             
             if decision.target_id:
                 # 验证目标玩家是否存在
-                target_player = next(
-                    (p for p in targets if p.player_id == decision.target_id),
-                    None
-                )
-                if target_player:
+                target_player = index.get_alive(decision.target_id)
+                if target_player and target_player.role != "werewolf":
                     return decision.target_id
             
             return None
         except Exception as e:
             # LLM 调用失败，随机选择
-            print(f"⚠️  狼人 {self.name} 投票决策 LLM 调用失败: {e}")
-            import random
-            target = random.choice(targets)
+            logger.warning("⚠️  狼人 %s 投票决策 LLM 调用失败: %s", self.name, e)
+            record_fallback("werewolf_kill", e, role=self.role)
+            target = self.rng.choice(targets)
             return target.player_id
     
     async def decide_self_explode(
@@ -177,17 +171,9 @@ class WerewolfAgent(BaseAgent):
             game_state
         )
         
-        # 定义自爆决策的 Schema
-        from pydantic import BaseModel, Field
-        class ExplodeDecision(BaseModel):
-            thought: str = Field(description="推理过程")
-            should_explode: bool = Field(description="是否自爆")
-            confidence: float = Field(description="置信度（0-1）", ge=0.0, le=1.0)
-            reasoning: str = Field(description="决策理由")
-        
         try:
             # 获取结构化输出的 LLM
-            structured_llm = self.llm_client.get_structured_llm(ExplodeDecision)
+            structured_llm = self.llm_client.get_structured_llm(ExplodeDecision, agent_role=self.role)
             
             # 调用 LLM（使用 LangChain 消息格式）
             from langchain_core.messages import SystemMessage, HumanMessage
@@ -200,6 +186,7 @@ class WerewolfAgent(BaseAgent):
             return decision.should_explode
         except Exception as e:
             # LLM 调用失败，默认不自爆
-            print(f"⚠️  狼人 {self.name} 自爆决策 LLM 调用失败: {e}")
+            logger.warning("⚠️  狼人 %s 自爆决策 LLM 调用失败: %s", self.name, e)
+            record_fallback("self_explode", e, role=self.role)
             return False
 
@@ -2,7 +2,7 @@
 LangGraph 条件边实现
 """
 from typing import Literal
-from ..state.game_state import GameState
+from ..state.game_state import GameState, alive_counts
 
 
 def check_game_end(state: GameState) -> Literal["end", "continue"]:
@@ -12,13 +12,13 @@ def check_game_end(state: GameState) -> Literal["end", "continue"]:
     if game_status == "ended":
         return "end"
     
-    # 检查存活玩家数量
-    alive_players = [p for p in state["players"] if p.is_alive]
-    werewolves = [p for p in alive_players if p.role == "werewolf"]
-    villagers = [p for p in alive_players if p.role != "werewolf"]
+    # 检查存活玩家数量（出局时增量维护的计数）
+    counts = alive_counts(state)
+    werewolves = counts["werewolves"]
+    others = counts["villagers"] + counts["gods"]
     
     # 游戏结束条件
-    if len(werewolves) == 0 or len(werewolves) >= len(villagers):
+    if werewolves == 0 or werewolves >= others:
         return "end"
     
     return "continue"
@@ -0,0 +1,214 @@
+"""
+游戏事件：节点在关键时刻发出类型化事件（阶段切换、发言、投票、夜晚结果、出局），
+由 stream_game 交给 UI、日志、统计等消费者，节点本身不再直接输出到控制台。
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Literal, Optional, Union
+from pydantic import BaseModel, Field
+from ..utils.game_logging import get_logger
+from ..utils.telemetry import current_context
+
+logger = get_logger(__name__)
+
+
+class GameEvent(BaseModel):
+    """
+    游戏事件基类
+
+    Attributes:
+        type: 事件类型
+        game_id: 游戏ID
+        day: 发生在第几天
+        phase: 发生时所在的节点（阶段）
+        message: 面向控制台的展示文本（与原先节点打印的内容一致）
+        timestamp: 发生时间（Unix 时间戳）
+    """
+    type: str
+    game_id: Optional[str] = None
+    day: int = 0
+    phase: Optional[str] = None
+    message: str = ""
+    timestamp: float = Field(default_factory=time.time)
+
+
+class NarrationEvent(GameEvent):
+    """旁白：流程提示、警告等没有专门类型的信息"""
+    type: Literal["narration"] = "narration"
+
+
+class PhaseEvent(GameEvent):
+    """阶段切换"""
+    type: Literal["phase"] = "phase"
+    phase: str = Field(..., description="阶段名称（night / announce_death / sheriff_campaign / sheriff_pk / sheriff_voting / discussion / exile_voting / judgment）")
+
+
+class SpeechEvent(GameEvent):
+    """发言（完整内容）"""
+    type: Literal["speech"] = "speech"
+    player_id: int
+    player_name: str
+    content: str
+    context: str = Field("normal", description="发言场合（normal / sheriff_campaign / sheriff_pk / last_words / werewolf_channel）")
+    streamed: bool = Field(False, description="内容是否已经通过 SpeechTokenEvent 流式发出")
+    stream_reset: bool = Field(False, description="流式发出的内容与最终内容不一致（例如经过修复或退回默认发言），消费者应以 content 替换已输出的片段")
+
+
+class SpeechTokenEvent(GameEvent):
+    """流式发言的增量内容"""
+    type: Literal["speech_token"] = "speech_token"
+    player_id: int
+    text: str
+
+
+class VoteEvent(GameEvent):
+    """投票"""
+    type: Literal["vote"] = "vote"
+    voter_id: int
+    voter_name: str
+    target_id: Optional[int] = None  # None 表示弃权
+    vote_type: str = Field(..., description="投票类型（exile / sheriff / werewolf_kill）")
+
+
+class NightResultEvent(GameEvent):
+    """夜晚结算结果"""
+    type: Literal["night_result"] = "night_result"
+    killed: List[int] = Field(default_factory=list)
+    werewolf_target: Optional[int] = None
+    guard_blocked: bool = False
+    actions: Dict[str, Any] = Field(default_factory=dict)
+
+
+class DeathEvent(GameEvent):
+    """玩家出局"""
+    type: Literal["death"] = "death"
+    player_id: int
+    player_name: str
+    role: str
+    cause: str = Field(..., description="出局原因（night / exile / self_explode）")
+
+
+class GameOverEvent(GameEvent):
+    """游戏结束"""
+    type: Literal["game_over"] = "game_over"
+    winner: Optional[str] = None
+
+
+AnyGameEvent = Union[
+    NarrationEvent, PhaseEvent, SpeechEvent, SpeechTokenEvent,
+    VoteEvent, NightResultEvent, DeathEvent, GameOverEvent,
+]
+
+
+class GameEventBus:
+    """
+    一局游戏的事件总线
+
+    每个订阅者有自己的无界队列，发布只做 put_nowait，永远不会阻塞游戏流程；
+    慢的消费者只会积压自己的队列，不影响游戏和其他消费者。
+    """
+
+    def __init__(self):
+        self._queues: List[asyncio.Queue] = []
+
+    def subscribe(self) -> asyncio.Queue:
+        """订阅事件，返回该订阅者的队列（游戏结束后队列中会收到 None）"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._queues.append(queue)
+        return queue
+
+    def publish(self, event: Optional[GameEvent]) -> None:
+        """发布事件（None 表示事件流结束）"""
+        for queue in self._queues:
+            queue.put_nowait(event)
+
+    def close(self) -> None:
+        """结束事件流"""
+        self.publish(None)
+
+
+# 进程级事件总线表：game_id -> GameEventBus（没有订阅者的游戏不登记，事件直接丢弃）
+_buses: Dict[str, GameEventBus] = {}
+_buses_lock = threading.Lock()
+
+
+def open_event_bus(game_id: str) -> GameEventBus:
+    """为一局游戏创建事件总线并登记"""
+    bus = GameEventBus()
+    with _buses_lock:
+        _buses[game_id] = bus
+    return bus
+
+
+def close_event_bus(game_id: str) -> None:
+    """结束并注销一局游戏的事件总线"""
+    with _buses_lock:
+        bus = _buses.pop(game_id, None)
+    if bus is not None:
+        bus.close()
+
+
+def emit(state, event: GameEvent) -> None:
+    """
+    发出游戏事件（自动填充 game_id、day 和 phase）
+
+    Args:
+        state: 游戏状态
+        event: 事件
+    """
+    game_id = state.get("game_id")
+    if game_id is None:
+        return
+    with _buses_lock:
+        bus = _buses.get(game_id)
+    if bus is None:
+        return
+    event.game_id = game_id
+    if not event.day:
+        event.day = state.get("day_number", 1)
+    if event.phase is None:
+        event.phase = current_context().get("node")
+    bus.publish(event)
+
+
+def say(state, message: str) -> None:
+    """发出旁白事件"""
+    emit(state, NarrationEvent(message=message))
+
+
+def render_event(event: GameEvent) -> None:
+    """
+    把事件输出到控制台（与原先节点中的打印格式一致）
+
+    Args:
+        event: 游戏事件
+    """
+    if isinstance(event, SpeechTokenEvent):
+        print(event.message, end="", flush=True)
+    elif isinstance(event, SpeechEvent) and event.stream_reset:
+        # 已输出的片段作废，换行后输出完整内容
+        print()
+        print(event.message)
+    elif isinstance(event, SpeechEvent) and event.streamed:
+        print()
+    elif event.message:
+        print(event.message)
+
+
+def log_event(event: GameEvent) -> None:
+    """
+    把事件写入结构化日志（作为 stream_game 的消费者使用）
+
+    消息为控制台展示文本，事件字段作为结构化字段写入；流式发言的增量内容使用 DEBUG 级别。
+
+    Args:
+        event: 游戏事件
+    """
+    level = logging.DEBUG if isinstance(event, SpeechTokenEvent) else logging.INFO
+    if not logger.isEnabledFor(level):
+        return
+    fields = event.model_dump(exclude={"message", "timestamp"})
+    fields["event"] = fields.pop("type")
+    logger.log(level, event.message, extra=fields)
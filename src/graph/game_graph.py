@@ -1,9 +1,14 @@
 """
 游戏主图：完整游戏流程
 """
-from typing import Literal
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Literal, Optional, Union
 from langgraph.graph import StateGraph, END
-from ..state.game_state import GameState
+from ..state.game_state import GameState, alive_counts
+from ..utils.telemetry import with_node_context
+from ..utils.game_logging import get_logger
+from ..utils.agent_roster import release_roster
+from .events import GameEvent, open_event_bus, close_event_bus
 from .nodes import (
     role_assignment_node,
     night_phase_node,
@@ -15,6 +20,8 @@ from .nodes import (
     judgment_node,
 )
 
+logger = get_logger(__name__)
+
 
 def check_game_end(state: GameState) -> Literal["end", "continue"]:
     """检查游戏是否结束（屠边规则）"""
@@ -22,25 +29,28 @@ def check_game_end(state: GameState) -> Literal["end", "continue"]:
     if game_status == "ended":
         return "end"
     
-    alive_players = [p for p in state["players"] if p.is_alive]
-    werewolves = [p for p in alive_players if p.role == "werewolf"]
-    villagers = [p for p in alive_players if p.role == "villager"]
-    gods = [p for p in alive_players if p.role in ["seer", "witch", "guard"]]
+    # 各阵营存活人数在出局时增量维护，这里直接读取
+    counts = alive_counts(state)
     
     # 获取初始角色统计
     initial_gods_count = state.get("initial_gods_count", 0)
     initial_villagers_count = state.get("initial_villagers_count", 0)
     
     # 屠边规则：只有当初始存在该阵营时，该阵营全部出局才判定游戏结束
-    if len(werewolves) == 0:
+    if counts["werewolves"] == 0:
         return "end"
     
     # 如果初始有村民，且村民全部出局，则游戏结束
-    if initial_villagers_count > 0 and len(villagers) == 0:
+    if initial_villagers_count > 0 and counts["villagers"] == 0:
         return "end"
     
     # 如果初始有神职，且神职全部出局，则游戏结束
-    if initial_gods_count > 0 and len(gods) == 0:
+    if initial_gods_count > 0 and counts["gods"] == 0:
+        return "end"
+    
+    # 超过最大轮次，强制结束（平局）
+    max_rounds = state.get("max_rounds")
+    if max_rounds and state.get("round_number", 1) > max_rounds:
         return "end"
     
     return "continue"
@@ -104,15 +114,15 @@ def create_game_graph() -> StateGraph:
     """
     graph = StateGraph(GameState)
     
-    # 添加节点
-    graph.add_node("role_assignment", role_assignment_node)
-    graph.add_node("night", night_phase_node)
-    graph.add_node("announce_death", announce_death_node)
-    graph.add_node("sheriff_campaign", sheriff_campaign_node)
-    graph.add_node("sheriff_voting", sheriff_voting_node)
-    graph.add_node("discussion", discussion_node)
-    graph.add_node("exile_voting", exile_voting_node)
-    graph.add_node("judgment", judgment_node)
+    # 添加节点（节点内的 LLM 调用带上 game_id 和节点名，用于遥测统计）
+    graph.add_node("role_assignment", with_node_context("role_assignment", role_assignment_node))
+    graph.add_node("night", with_node_context("night", night_phase_node))
+    graph.add_node("announce_death", with_node_context("announce_death", announce_death_node))
+    graph.add_node("sheriff_campaign", with_node_context("sheriff_campaign", sheriff_campaign_node))
+    graph.add_node("sheriff_voting", with_node_context("sheriff_voting", sheriff_voting_node))
+    graph.add_node("discussion", with_node_context("discussion", discussion_node))
+    graph.add_node("exile_voting", with_node_context("exile_voting", exile_voting_node))
+    graph.add_node("judgment", with_node_context("judgment", judgment_node))
     
     # 设置入口点
     graph.set_entry_point("role_assignment")
@@ -120,8 +130,11 @@ def create_game_graph() -> StateGraph:
     # 身份分配后进入第一夜
     graph.add_edge("role_assignment", "night")
     
-    # 夜晚后的路由：第一天进入警长竞选，其他天公布出局
-    def route_after_night_first_day(state: GameState) -> Literal["sheriff_campaign", "announce_death"]:
+    # 夜晚后的路由：游戏结束进入判定，第一天进入警长竞选，其他天公布出局
+    # （只注册一个路由函数，否则多个分支会在同一步并发写入状态）
+    def route_after_night_first_day(state: GameState) -> Literal["judgment", "sheriff_campaign", "announce_death"]:
+        if route_after_night(state) == "judgment":
+            return "judgment"
         day_number = state.get("day_number", 1)
         if day_number == 1:
             return "sheriff_campaign"
@@ -131,6 +144,7 @@ def create_game_graph() -> StateGraph:
         "night",
         route_after_night_first_day,
         {
+            "judgment": "judgment",
             "sheriff_campaign": "sheriff_campaign",
             "announce_death": "announce_death",
         }
@@ -239,18 +253,133 @@ def create_game_graph() -> StateGraph:
         }
     )
     
-    # 夜晚后的路由（进入新的一天）
-    graph.add_conditional_edges(
-        "night",
-        route_after_night,
-        {
-            "judgment": "judgment",
-            "day": "announce_death",  # 进入新的一天，先公布出局
-        }
-    )
-    
     # 结果判定后结束
     graph.add_edge("judgment", END)
     
     return graph.compile()
 
+
+
+async def run_game(
+    initial_state: GameState,
+    graph=None,
+    config: Optional[Dict[str, Any]] = None
+) -> GameState:
+    """
+    运行一局游戏并返回最终状态
+    
+    与直接调用 graph.ainvoke 相同，但无论游戏正常结束、出错、超过递归上限还是被取消，
+    都会释放本局的 Agent 名册（正常结束时判定节点已经释放，这里再释放一次无副作用）。
+    
+    Args:
+        initial_state: 初始游戏状态
+        graph: 编译好的游戏图（为 None 时新建）
+        config: 传给 graph.ainvoke 的配置（如 recursion_limit）
+    
+    Returns:
+        最终游戏状态
+    """
+    graph = graph if graph is not None else create_game_graph()
+    try:
+        return await graph.ainvoke(initial_state, config=config)
+    finally:
+        release_roster(initial_state.get("game_id"))
+
+
+EventConsumer = Callable[[GameEvent], Union[None, Awaitable[None]]]
+
+
+class GameStream:
+    """
+    游戏事件流：运行一局游戏，并以异步迭代器的形式逐个产出游戏事件
+    
+    游戏在后台任务中运行，节点发出事件时只放入队列，不等待消费者；
+    迭代结束后可以通过 final_state 获取最终状态。提前停止迭代会取消游戏。
+    """
+    
+    def __init__(
+        self,
+        initial_state: GameState,
+        graph=None,
+        config: Optional[Dict[str, Any]] = None,
+        consumers: Optional[List[EventConsumer]] = None
+    ):
+        self.initial_state = initial_state
+        self.graph = graph if graph is not None else create_game_graph()
+        self.config = config
+        self.consumers = list(consumers or [])
+        self.final_state: Optional[GameState] = None
+    
+    async def __aiter__(self) -> AsyncIterator[GameEvent]:
+        game_id = self.initial_state["game_id"]
+        bus = open_event_bus(game_id)
+        queue = bus.subscribe()
+        consumer_tasks = [
+            asyncio.ensure_future(self._drain(bus.subscribe(), consumer))
+            for consumer in self.consumers
+        ]
+        game = asyncio.ensure_future(self.graph.ainvoke(self.initial_state, config=self.config))
+        game.add_done_callback(lambda _: self._release(game_id))
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield event
+            self.final_state = await game
+            await asyncio.gather(*consumer_tasks)
+        finally:
+            if not game.done():
+                game.cancel()
+            close_event_bus(game_id)
+            for task in consumer_tasks:
+                if not task.done():
+                    task.cancel()
+    
+    @staticmethod
+    def _release(game_id: str) -> None:
+        """游戏任务结束（包括出错、被取消）后关闭事件总线并释放本局 Agent 名册"""
+        close_event_bus(game_id)
+        release_roster(game_id)
+    
+    @staticmethod
+    async def _drain(queue: asyncio.Queue, consumer: EventConsumer) -> None:
+        """把事件逐个交给消费者（消费者出错时停止该消费者，不影响游戏）"""
+        while True:
+            event = await queue.get()
+            if event is None:
+                return
+            try:
+                result = consumer(event)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.warning("⚠️  事件消费者出错，已停止: %s", e)
+                return
+
+
+def stream_game(
+    initial_state: GameState,
+    graph=None,
+    config: Optional[Dict[str, Any]] = None,
+    consumers: Optional[List[EventConsumer]] = None
+) -> GameStream:
+    """
+    以事件流的方式运行一局游戏
+    
+    用法：
+        stream = stream_game(initial_state)
+        async for event in stream:
+            render_event(event)
+        final_state = stream.final_state
+    
+    Args:
+        initial_state: 初始游戏状态
+        graph: 编译好的游戏图（为 None 时新建）
+        config: 传给 graph.ainvoke 的配置（如 recursion_limit）
+        consumers: 额外的事件消费者（普通函数或协程函数），各自独立排队，不会阻塞游戏
+    
+    Returns:
+        GameStream（异步迭代器，迭代结束后 final_state 为最终状态）
+    """
+    return GameStream(initial_state, graph=graph, config=config, consumers=consumers)
@@ -2,17 +2,70 @@
 LangGraph 节点实现 - 完整游戏流程
 """
 from typing import Dict, Any, List, Optional
-from ..state.game_state import GameState, Player
+from ..state.game_state import GameState, Player, player_index, players_update, update_player, alive_counts, count_alive
+from ..utils.agent_roster import build_roster, get_roster, release_roster
+from ..utils.pacing import pace
+from ..utils.telemetry import telemetry_context
+from .events import (
+    emit,
+    say,
+    PhaseEvent,
+    SpeechEvent,
+    SpeechTokenEvent,
+    VoteEvent,
+    NightResultEvent,
+    DeathEvent,
+    GameOverEvent,
+)
 import asyncio
 import random
 
 
+async def _cast_votes(
+    state: GameState,
+    voters: List[Player],
+    vote_type: str,
+    candidates: Optional[List[int]] = None
+):
+    """
+    收集投票，按座位顺序逐个产出 (投票玩家, 目标ID)
+    
+    顺序模式下逐个调用 Agent 投票；并行模式（state["parallel_voting"]）下
+    所有投票同时发起（最多 vote_concurrency 个并发），全部完成后再按座位顺序产出，
+    因此两种模式的输出和计票结果完全一致。
+    
+    Args:
+        state: 游戏状态
+        voters: 投票玩家列表（座位顺序）
+        vote_type: 投票类型（exile / sheriff）
+        candidates: 候选人列表（仅用于警长投票）
+    """
+    roster = get_roster(state)
+    
+    if not state.get("parallel_voting", False):
+        for player in voters:
+            target = await roster.get(player).vote(state, vote_type=vote_type, candidates=candidates)
+            yield player, target
+        return
+    
+    semaphore = asyncio.Semaphore(max(1, state.get("vote_concurrency") or len(voters) or 1))
+    
+    async def cast(player: Player) -> Optional[int]:
+        async with semaphore:
+            return await roster.get(player).vote(state, vote_type=vote_type, candidates=candidates)
+    
+    targets = await asyncio.gather(*(cast(player) for player in voters))
+    for player, target in zip(voters, targets):
+        yield player, target
+
+
 async def role_assignment_node(state: GameState) -> Dict[str, Any]:
     """身份分配节点"""
-    print("🎲 随机分配身份...")
+    say(state, "🎲 随机分配身份...")
     
-    # 如果玩家已经有身份，跳过
+    # 如果玩家已经有身份，跳过分配，只创建本局 Agent 名册
     if state.get("players") and any(p.role for p in state["players"]):
+        build_roster(state.get("game_id"), state["players"], seed=state.get("seed"))
         return {}
     
     # TODO: 这里应该从配置或输入获取玩家名称
@@ -20,262 +73,328 @@ async def role_assignment_node(state: GameState) -> Dict[str, Any]:
     player_names = [f"玩家{i}" for i in range(1, len(state.get("players", [])) + 1)]
     
     from ..utils.role_assigner import assign_roles
-    players = assign_roles(player_names)
+    players = assign_roles(player_names, rng=random.Random(state.get("seed")))
     
-    print("✅ 身份分配完成：")
+    say(state, "✅ 身份分配完成：")
     for p in players:
         role_cn = {"villager": "村民", "werewolf": "狼人", "seer": "预言家", 
                   "witch": "女巫", "guard": "守卫"}.get(p.role, p.role)
-        print(f"  {p.name}: {role_cn}")
+        say(state, f"  {p.name}: {role_cn}")
     
-    return {"players": players}
+    # 身份确定后创建本局 Agent 名册，后续节点按 player_id 复用
+    build_roster(state.get("game_id"), players, seed=state.get("seed"))
+    
+    return {**players_update(players), "alive_counts": count_alive(players)}
+
+
+def resolve_night(
+    werewolf_target: Optional[int],
+    guard_target: Optional[int],
+    antidote_target: Optional[int],
+    poison_target: Optional[int]
+) -> Dict[str, Any]:
+    """
+    结算夜晚结果（纯函数）
+    
+    规则：
+    - 狼人攻击的玩家出局，除非被守卫守护或被女巫解药救下
+    - 女巫毒药的目标出局（守卫不能防御毒药）
+    
+    Args:
+        werewolf_target: 狼人攻击目标
+        guard_target: 守卫守护目标
+        antidote_target: 女巫解药救下的玩家
+        poison_target: 女巫毒药目标
+    
+    Returns:
+        {"killed": 出局玩家ID列表, "guard_blocked": 守卫是否抵消了狼人攻击}
+    """
+    killed = []
+    guard_blocked = False
+    
+    if werewolf_target is not None:
+        if guard_target is not None and guard_target == werewolf_target:
+            guard_blocked = True
+        elif antidote_target != werewolf_target:
+            killed.append(werewolf_target)
+    
+    if poison_target is not None and poison_target not in killed:
+        killed.append(poison_target)
+    
+    return {"killed": killed, "guard_blocked": guard_blocked}
+
+
+async def _werewolf_night_decision(
+    state: GameState,
+    werewolves: List[Player],
+    roster
+) -> Dict[str, Any]:
+    """狼人夜晚决策：频道讨论（依次发言）+ 投票决定攻击目标（同时投票）"""
+    werewolf_channel_messages = []
+    
+    # 1. 狼人频道发言（天黑讨论）
+    for wolf in werewolves:
+        wolf_agent = roster.get(wolf)
+        
+        # 获取可见信息
+        observation = await wolf_agent.observe(state)
+        werewolf_teammates = observation.get("werewolf_teammates", [])
+        
+        # 在狼人频道发言
+        message = await wolf_agent.discuss_in_werewolf_channel(
+            state, 
+            werewolf_teammates
+        )
+        werewolf_channel_messages.append({
+            "player_id": wolf.player_id,
+            "player_name": wolf.name,
+            "message": message
+        })
+        await pace(state, message)
+    
+    # 2. 狼人投票决定攻击目标（投票相互独立，同时发起）
+    async def vote_to_kill(wolf: Player) -> Optional[int]:
+        wolf_agent = roster.get(wolf)
+        observation = await wolf_agent.observe(state)
+        return await wolf_agent.vote_to_kill(
+            state,
+            observation.get("werewolf_teammates", []),
+            werewolf_channel_messages
+        )
+    
+    targets = await asyncio.gather(*(vote_to_kill(wolf) for wolf in werewolves))
+    werewolf_votes = {
+        wolf.player_id: target_id
+        for wolf, target_id in zip(werewolves, targets)
+        if target_id
+    }
+    
+    # 统计狼人投票结果：得票最多的被攻击（平票则从平票玩家中随机选一人攻击）
+    vote_counts = {}
+    for target_id in werewolf_votes.values():
+        vote_counts[target_id] = vote_counts.get(target_id, 0) + 1
+    
+    target = None
+    tied_targets = []
+    if vote_counts:
+        max_votes = max(vote_counts.values())
+        attacked_players = [pid for pid, votes in vote_counts.items() if votes == max_votes]
+        if len(attacked_players) == 1:
+            target = attacked_players[0]
+        else:
+            tied_targets = attacked_players
+            target = roster.rng.choice(attacked_players)
+    
+    return {
+        "channel_messages": werewolf_channel_messages,
+        "votes": werewolf_votes,
+        "vote_counts": vote_counts,
+        "target": target,
+        "tied_targets": tied_targets,
+    }
+
+
+async def _seer_night_decision(state: GameState, seer: Player, roster) -> Dict[str, Any]:
+    """预言家夜晚决策：决定查验目标并查验"""
+    seer_agent = roster.get(seer)
+    
+    # 调用 Agent 决定查验目标（使用 LLM）
+    target_id = await seer_agent.decide_check_target(state)
+    if not target_id:
+        return {"target": None}
+    
+    target_player = player_index(state).get_alive(target_id)
+    if not target_player:
+        return {"target": None}
+    
+    # 执行查验（查验历史保留在 Agent 中）
+    check_result = await seer_agent.check_player(state, target_id)
+    return {"target": target_id, "check_result": check_result}
+
+
+async def _guard_night_decision(state: GameState, guard: Player, roster) -> Optional[int]:
+    """守卫夜晚决策：决定守护目标（不能连续两晚守护同一人）"""
+    guard_agent = roster.get(guard)
+    return await guard_agent.decide_protect(state, state.get("guard_protected"))
+
+
+async def _noop_decision():
+    return None
 
 
 async def night_phase_node(state: GameState) -> Dict[str, Any]:
-    """夜晚阶段节点"""
+    """
+    夜晚阶段节点
+    
+    分为三步：
+    1. 并行收集狼人、预言家、守卫的决策（相互独立）
+    2. 女巫根据狼人攻击目标决定是否用药
+    3. 调用 resolve_night 结算守卫、解药、毒药效果
+    """
     day_number = state.get("day_number", 1)
-    print(f"\n🌙 夜晚阶段 - 第 {day_number} 天")
-    print("=" * 60)
-    
-    alive_players = [p for p in state["players"] if p.is_alive]
+    # 第一夜之后，每次入夜开始新的一天（否则每天都会重复第一天的警长竞选）；
+    # 从最近的历史记录往前找，不必读取已写入磁盘的早期记录
+    if any(entry.get("type") == "night_action" for entry in reversed(state.get("history", []))):
+        day_number += 1
+        # 本节点内使用新一天的视图（浅拷贝，不修改传入的状态）
+        state = {**state, "day_number": day_number, "round_number": state.get("round_number", 1) + 1}
+    emit(state, PhaseEvent(phase="night", message=f"\n🌙 夜晚阶段 - 第 {day_number} 天\n" + "=" * 60))
+    
+    index = player_index(state)
     night_actions = {}
-    killed_players = []
+    roster = get_roster(state)
     
     # 按角色分组
-    werewolves = [p for p in alive_players if p.role == "werewolf"]
-    seers = [p for p in alive_players if p.role == "seer"]
-    witches = [p for p in alive_players if p.role == "witch"]
-    guards = [p for p in alive_players if p.role == "guard"]
-    
-    # 1. 狼人和预言家先行动
-    print("\n📋 第一阶段：狼人和预言家行动")
-    
-    # 狼人行动（天黑发言 + 投票杀人）
-    if werewolves:
-        print(f"  🐺 狼人团队行动（{len(werewolves)}人）")
-        
-        # 1. 狼人频道发言（天黑讨论）
-        print(f"    💬 狼人频道讨论：")
-        werewolf_channel_messages = []
-        werewolf_agents = {}
-        
-        from ..utils.agent_factory import create_agent_by_role
+    werewolves = index.with_role("werewolf")
+    seers = index.with_role("seer")
+    witches = index.with_role("witch")
+    guards = index.with_role("guard")
+    
+    # 1. 狼人、预言家、守卫同时决策
+    wolf_decision, seer_decision, guard_target = await asyncio.gather(
+        _werewolf_night_decision(state, werewolves, roster) if werewolves else _noop_decision(),
+        _seer_night_decision(state, seers[0], roster) if seers else _noop_decision(),
+        _guard_night_decision(state, guards[0], roster) if guards else _noop_decision(),
+    )
+    
+    # 按固定顺序输出决策结果
+    say(state, "\n📋 第一阶段：狼人和预言家行动")
+    
+    werewolf_target = None
+    if wolf_decision is not None:
+        say(state, f"  🐺 狼人团队行动（{len(werewolves)}人）")
+        say(state, f"    💬 狼人频道讨论：")
+        for message in wolf_decision["channel_messages"]:
+            emit(state, SpeechEvent(
+                player_id=message["player_id"],
+                player_name=message["player_name"],
+                content=message["message"],
+                context="werewolf_channel",
+                message=f"      {message['player_name']}: {message['message']}"
+            ))
         
+        say(state, f"    🗳️  狼人投票决定攻击目标：")
         for wolf in werewolves:
-            # 创建狼人 Agent
-            wolf_agent = create_agent_by_role(wolf.player_id, wolf.name, "werewolf")
-            werewolf_agents[wolf.player_id] = wolf_agent
-            
-            # 获取可见信息
-            observation = await wolf_agent.observe(state)
-            werewolf_teammates = observation.get("werewolf_teammates", [])
-            
-            # 在狼人频道发言
-            message = await wolf_agent.discuss_in_werewolf_channel(
-                state, 
-                werewolf_teammates
-            )
-            werewolf_channel_messages.append({
-                "player_id": wolf.player_id,
-                "player_name": wolf.name,
-                "message": message
-            })
-            print(f"      {wolf.name}: {message}")
-            await asyncio.sleep(0.1)
-        
-    # 狼人频道信息将在返回时更新到游戏状态
+            target_id = wolf_decision["votes"].get(wolf.player_id)
+            target_player = index.get_alive(target_id)
+            if target_player:
+                emit(state, VoteEvent(
+                    voter_id=wolf.player_id,
+                    voter_name=wolf.name,
+                    target_id=target_id,
+                    vote_type="werewolf_kill",
+                    message=f"      {wolf.name} 投票攻击: {target_player.name} (玩家{target_id})"
+                ))
         
-        # 2. 狼人投票决定攻击目标
-        print(f"    🗳️  狼人投票决定攻击目标：")
-        werewolf_votes = {}
+        if wolf_decision["tied_targets"]:
+            say(state, f"    ⚠️  狼人投票平票，从平票玩家中随机选择: {wolf_decision['tied_targets']}")
         
-        for wolf in werewolves:
-            wolf_agent = werewolf_agents[wolf.player_id]
-            observation = await wolf_agent.observe(state)
-            werewolf_teammates = observation.get("werewolf_teammates", [])
-            
-            # 投票决定攻击目标
-            target_id = await wolf_agent.vote_to_kill(
-                state,
-                werewolf_teammates,
-                werewolf_channel_messages
-            )
-            
-            if target_id:
-                werewolf_votes[wolf.player_id] = target_id
-                target_player = next((p for p in alive_players if p.player_id == target_id), None)
-                if target_player:
-                    print(f"      {wolf.name} 投票攻击: {target_player.name} (玩家{target_id})")
-        
-        # 统计狼人投票结果
-        if werewolf_votes:
-            vote_counts = {}
-            for target_id in werewolf_votes.values():
-                vote_counts[target_id] = vote_counts.get(target_id, 0) + 1
-            
-            # 得票最多的被攻击（平票则从平票玩家中随机选一人攻击）
-            if vote_counts:
-                max_votes = max(vote_counts.values())
-                attacked_players = [pid for pid, votes in vote_counts.items() if votes == max_votes]
-                
-                if len(attacked_players) == 1:
-                    attacked_id = attacked_players[0]
-                else:
-                    # 平票：从平票玩家中随机选一人攻击
-                    attacked_id = random.choice(attacked_players)
-                    print(f"    ⚠️  狼人投票平票，从平票玩家中随机选择: {attacked_players}")
-                
-                attacked_player = next((p for p in alive_players if p.player_id == attacked_id), None)
-                if attacked_player:
-                    night_actions["werewolf"] = {
-                        "target": attacked_id,
-                        "votes": werewolf_votes,
-                        "vote_counts": vote_counts
-                    }
-                    killed_players.append(attacked_id)
-                    print(f"    ✅ 狼人团队决定攻击: {attacked_player.name} (玩家{attacked_id})")
-        else:
-            print(f"    ⚠️  狼人未选择攻击目标，平安夜")
+        attacked_id = wolf_decision["target"]
+        attacked_player = index.get_alive(attacked_id)
+        if attacked_player:
+            werewolf_target = attacked_id
+            night_actions["werewolf"] = {
+                "target": attacked_id,
+                "votes": wolf_decision["votes"],
+                "vote_counts": wolf_decision["vote_counts"]
+            }
+            say(state, f"    ✅ 狼人团队决定攻击: {attacked_player.name} (玩家{attacked_id})")
+        elif not wolf_decision["votes"]:
+            say(state, f"    ⚠️  狼人未选择攻击目标，平安夜")
     
-    # 预言家行动（查验）
-    if seers:
+    seer_checks = {}
+    if seer_decision is not None:
         seer = seers[0]
-        print(f"  🔮 预言家行动: {seer.name}")
-        
-        # 创建预言家 Agent（如果还没有）
-        from ..utils.agent_factory import create_agent_by_role
-        seer_agent = create_agent_by_role(seer.player_id, seer.name, "seer")
-        
-        # 获取可见信息
-        observation = await seer_agent.observe(state)
-        
-        # 调用 Agent 决定查验目标（使用 LLM）
-        target_id = await seer_agent.decide_check_target(state)
-        
+        say(state, f"  🔮 预言家行动: {seer.name}")
+        target_id = seer_decision["target"]
         if target_id:
-            target_player = next((p for p in alive_players if p.player_id == target_id), None)
+            target_player = index.get_alive(target_id)
+            check_result = seer_decision["check_result"]
+            check_result_value = check_result.get(target_id, "未知")
             
-            if target_player:
-                # 执行查验
-                check_result = await seer_agent.check_player(state, target_id)
-                check_result_value = check_result.get(target_id, "未知")
-                
-                # 更新查验历史
-                seer_checks = state.get("seer_checks", {})
-                seer_checks.update(check_result)
-                
-                night_actions["seer"] = {
-                    "target": target_id,
-                    "result": check_result_value,  # "好人" 或 "狼人"
-                    "agent_id": seer.player_id
-                }
-                print(f"    预言家查验: {target_player.name} (玩家{target_id}) - {check_result_value}")
-                
-                # 更新查验历史（不提前返回，继续执行守卫和女巫）
-                state["seer_checks"] = seer_checks
+            # 更新查验历史（只返回新增的查验结果，由 reducer 合并）
+            seer_checks = dict(check_result)
+            
+            night_actions["seer"] = {
+                "target": target_id,
+                "result": check_result_value,  # "好人" 或 "狼人"
+                "agent_id": seer.player_id
+            }
+            say(state, f"    预言家查验: {target_player.name} (玩家{target_id}) - {check_result_value}")
         else:
             # 预言家选择不查验或无效目标
-            print(f"    预言家选择不查验")
+            say(state, f"    预言家选择不查验")
     
     # 2. 守卫行动（在女巫之前）
     if guards:
         guard = guards[0]
-        print(f"\n🛡️  守卫行动: {guard.name}")
-        
-        # 创建守卫 Agent
-        from ..utils.agent_factory import create_agent_by_role
-        guard_agent = create_agent_by_role(guard.player_id, guard.name, "guard")
-        
-        # 获取上一晚守护的玩家
-        last_protected = state.get("guard_protected")
-        
-        # 获取可见信息
-        observation = await guard_agent.observe(state)
-        
-        # 调用 Agent 决定守护目标
-        protect_target_id = await guard_agent.decide_protect(state, last_protected)
-        
-        if protect_target_id:
-            target_player = next((p for p in alive_players if p.player_id == protect_target_id), None)
-            if target_player:
-                night_actions["guard"] = {
-                    "target": protect_target_id,
-                    "agent_id": guard.player_id
-                }
-                print(f"    守卫守护: {target_player.name} (玩家{protect_target_id})")
-        else:
-            print(f"    守卫选择不守护")
-    
-    # 3. 女巫后行动
+        say(state, f"\n🛡️  守卫行动: {guard.name}")
+        target_player = index.get_alive(guard_target)
+        if target_player:
+            night_actions["guard"] = {
+                "target": guard_target,
+                "agent_id": guard.player_id
+            }
+            say(state, f"    守卫守护: {target_player.name} (玩家{guard_target})")
+        elif not guard_target:
+            say(state, f"    守卫选择不守护")
+    
+    # 3. 女巫后行动（需要知道狼人攻击目标）
+    antidote_target = None
+    poison_target = None
+    antidote_used = state.get("witch_antidote_used", False)
+    poison_used = state.get("witch_poison_used", False)
     if witches:
         witch = witches[0]
-        print(f"\n🧪 女巫行动: {witch.name}")
-        
-        # 创建女巫 Agent
-        from ..utils.agent_factory import create_agent_by_role
-        witch_agent = create_agent_by_role(witch.player_id, witch.name, "witch")
+        say(state, f"\n🧪 女巫行动: {witch.name}")
         
-        # 检查是否有人被杀
-        someone_killed = len(killed_players) > 0
-        killed_player_id = killed_players[0] if killed_players else None
-        antidote_used = state.get("witch_antidote_used", False)
-        poison_used = state.get("witch_poison_used", False)
+        witch_agent = roster.get(witch)
         
         # 更新女巫 Agent 状态
         witch_agent.antidote_used = antidote_used
         witch_agent.poison_used = poison_used
         witch_agent.first_night = (day_number == 1)
         
-        # 获取可见信息
-        observation = await witch_agent.observe(state)
-        
         # 决定是否使用解药
-        if someone_killed and not antidote_used:
-            use_antidote = await witch_agent.decide_antidote(state, killed_player_id)
+        if werewolf_target is not None and not antidote_used:
+            use_antidote = await witch_agent.decide_antidote(state, werewolf_target)
             if use_antidote:
-                # 解药救人：从被杀列表中移除
-                if killed_player_id in killed_players:
-                    killed_players.remove(killed_player_id)
+                antidote_target = werewolf_target
                 night_actions["witch"] = {
                     "antidote": True,
-                    "target": killed_player_id,
+                    "target": werewolf_target,
                     "agent_id": witch.player_id
                 }
                 witch_agent.antidote_used = True
-                print(f"    女巫使用解药救: 玩家{killed_player_id}")
+                say(state, f"    女巫使用解药救: 玩家{werewolf_target}")
         
-        # 决定是否使用毒药（不能给自己用）
+        # 决定是否使用毒药（不能给自己用，已在 decide_poison 中处理）
         if not poison_used:
-            poison_target_id = await witch_agent.decide_poison(state)
-            if poison_target_id:
-                # 毒药不能给自己用（已在 decide_poison 中处理）
-                killed_players.append(poison_target_id)
+            poison_target = await witch_agent.decide_poison(state)
+            if poison_target:
                 night_actions.setdefault("witch", {})["poison"] = True
-                night_actions.setdefault("witch", {})["poison_target"] = poison_target_id
+                night_actions.setdefault("witch", {})["poison_target"] = poison_target
                 night_actions.setdefault("witch", {})["agent_id"] = witch.player_id
                 witch_agent.poison_used = True
-                target_player = next((p for p in alive_players if p.player_id == poison_target_id), None)
+                target_player = index.get_alive(poison_target)
                 if target_player:
-                    print(f"    女巫使用毒药: {target_player.name} (玩家{poison_target_id})")
+                    say(state, f"    女巫使用毒药: {target_player.name} (玩家{poison_target})")
         
-        # 更新状态中的女巫技能使用情况（不提前返回，继续执行夜晚结果处理）
-        if witch_agent.antidote_used:
-            state["witch_antidote_used"] = True
-        if witch_agent.poison_used:
-            state["witch_poison_used"] = True
+        # 更新女巫技能使用情况
+        antidote_used = witch_agent.antidote_used
+        poison_used = witch_agent.poison_used
     
-    # 处理守卫守护效果：如果被守护的玩家被狼人攻击，则不受伤害
+    # 4. 结算夜晚结果（守卫不能防御女巫毒药）
     guard_protected_tonight = night_actions.get("guard", {}).get("target")
-    werewolf_target = night_actions.get("werewolf", {}).get("target")
-    
-    # 如果守卫守护了被狼人攻击的目标，则抵消伤害
-    if guard_protected_tonight and werewolf_target == guard_protected_tonight:
-        if werewolf_target in killed_players:
-            killed_players.remove(werewolf_target)
-            print(f"    🛡️  守卫成功守护了玩家{werewolf_target}，抵消了狼人攻击")
-    
-    # 处理女巫解药和毒药效果（已在女巫行动中处理）
-    # 注意：守卫不能防御女巫毒药
+    resolution = resolve_night(werewolf_target, guard_protected_tonight, antidote_target, poison_target)
+    killed_players = resolution["killed"]
+    emit(state, NightResultEvent(
+        killed=killed_players,
+        werewolf_target=werewolf_target,
+        guard_blocked=resolution["guard_blocked"],
+        actions=night_actions,
+        message=f"    🛡️  守卫成功守护了玩家{werewolf_target}，抵消了狼人攻击" if resolution["guard_blocked"] else ""
+    ))
     
     # 注意：夜晚阶段不立即淘汰玩家，只记录被杀玩家
     # 玩家将在"公布出局玩家"阶段才真正出局
@@ -292,6 +411,8 @@ async def night_phase_node(state: GameState) -> Dict[str, Any]:
     
     # 准备返回的更新（不更新players，保持玩家存活状态）
     updates = {
+        "day_number": day_number,
+        "round_number": state.get("round_number", 1),
         "night_actions": night_actions,
         "history": [history_entry],  # 返回单个历史记录项作为列表
         "current_phase": "day",
@@ -300,22 +421,18 @@ async def night_phase_node(state: GameState) -> Dict[str, Any]:
     }
     
     # 更新女巫技能使用状态
-    if state.get("witch_antidote_used"):
+    if antidote_used:
         updates["witch_antidote_used"] = True
-    if state.get("witch_poison_used"):
+    if poison_used:
         updates["witch_poison_used"] = True
     
-    # 更新预言家查验历史
-    if state.get("seer_checks"):
-        updates["seer_checks"] = state["seer_checks"]
+    # 更新预言家查验历史（只返回今晚的查验结果）
+    if seer_checks:
+        updates["seer_checks"] = seer_checks
     
-    # 更新狼人频道信息（如果有狼人发言）
-    if werewolves:
-        # 从局部变量获取狼人频道消息（如果存在）
-        if "werewolf_channel_messages" in locals():
-            current_werewolf_channel = state.get("werewolf_channel", {})
-            current_werewolf_channel[f"night_{day_number}"] = werewolf_channel_messages
-            updates["werewolf_channel"] = current_werewolf_channel
+    # 更新狼人频道信息（如果有狼人发言，只返回今晚的频道记录）
+    if wolf_decision is not None:
+        updates["werewolf_channel"] = {f"night_{day_number}": wolf_decision["channel_messages"]}
     
     return updates
 
@@ -323,7 +440,7 @@ async def night_phase_node(state: GameState) -> Dict[str, Any]:
 async def announce_death_node(state: GameState) -> Dict[str, Any]:
     """公布出局玩家节点"""
     day_number = state.get("day_number", 1)
-    print(f"\n📢 公布出局玩家 - 第 {day_number} 天")
+    emit(state, PhaseEvent(phase="announce_death", message=f"\n📢 公布出局玩家 - 第 {day_number} 天"))
     
     # 找出昨晚出局的玩家
     last_night_action = None
@@ -337,51 +454,51 @@ async def announce_death_node(state: GameState) -> Dict[str, Any]:
         killed_players = last_night_action.get("killed", [])
     
     # 真正淘汰被杀的玩家（在公布出局阶段）
-    updated_players = []
-    for p in state["players"]:
-        if p.player_id in killed_players:
-            updated_p = Player(
-                player_id=p.player_id,
-                name=p.name,
-                role=p.role,
-                is_alive=False,
-                vote_target=p.vote_target,
-                is_sheriff=p.is_sheriff
-            )
-            updated_players.append(updated_p)
-        else:
-            updated_players.append(p)
+    player_updates = {}
+    for pid in killed_players:
+        player_updates.update(update_player({**state, **player_updates}, pid, is_alive=False))
     
+    index = player_index(state)
     if killed_players:
-        print("  出局玩家：")
-        last_words = state.get("last_words", {})
+        say(state, "  出局玩家：")
+        last_words = {}
         
         for pid in killed_players:
-            player = next((p for p in state["players"] if p.player_id == pid), None)
+            player = index.get(pid)
             if player:
-                print(f"    ❌ {player.name} (玩家{pid}) - {player.role}")
+                emit(state, DeathEvent(
+                    player_id=pid,
+                    player_name=player.name,
+                    role=player.role,
+                    cause="night",
+                    message=f"    ❌ {player.name} (玩家{pid}) - {player.role}"
+                ))
                 
                 # 只有第一天夜里出局的玩家有遗言
                 if day_number == 1:
                     # 第一天夜里出局，有遗言
-                    from ..utils.agent_factory import create_agent_by_role
-                    agent = create_agent_by_role(player.player_id, player.name, player.role)
+                    agent = get_roster(state).get(player)
                     last_word = await agent.leave_last_words(state, death_reason="night_first")
                     last_words[pid] = last_word
-                    print(f"      💬 遗言: {last_word}")
+                    emit(state, SpeechEvent(
+                        player_id=pid,
+                        player_name=player.name,
+                        content=last_word,
+                        context="last_words",
+                        message=f"      💬 遗言: {last_word}"
+                    ))
                 else:
                     # 其他天夜里出局，只能发动特殊技能，没有遗言
-                    print(f"      ⚠️  {player.name} 夜里出局，没有遗言（只能发动特殊技能）")
+                    say(state, f"      ⚠️  {player.name} 夜里出局，没有遗言（只能发动特殊技能）")
                     # TODO: 实现特殊技能发动（如女巫毒药、守卫守护等）
                 
     # 处理警长移交（如果有警长出局）
     sheriff_transfer_info = None
     for pid in killed_players:
-        player = next((p for p in state["players"] if p.player_id == pid), None)
+        player = index.get(pid)
         if player and player.is_sheriff:
-            print(f"      👮 警长 {player.name} 出局，需要处理警徽")
-            from ..utils.agent_factory import create_agent_by_role
-            agent = create_agent_by_role(player.player_id, player.name, player.role)
+            say(state, f"      👮 警长 {player.name} 出局，需要处理警徽")
+            agent = get_roster(state).get(player)
             transfer_target = await agent.decide_sheriff_transfer(state)
             
             if transfer_target:
@@ -391,21 +508,11 @@ async def announce_death_node(state: GameState) -> Dict[str, Any]:
                     "to_id": transfer_target,
                     "destroyed": False
                 }
-                target_player = next((p for p in updated_players if p.player_id == transfer_target), None)
+                target_player = index.get(transfer_target)
                 if target_player:
-                    print(f"      ✅ 警长 {player.name} 将警徽移交给 {target_player.name} (玩家{transfer_target})")
+                    say(state, f"      ✅ 警长 {player.name} 将警徽移交给 {target_player.name} (玩家{transfer_target})")
                     # 更新玩家状态：新玩家成为警长
-                    for i, p in enumerate(updated_players):
-                        if p.player_id == transfer_target:
-                            updated_players[i] = Player(
-                                player_id=p.player_id,
-                                name=p.name,
-                                role=p.role,
-                                is_alive=p.is_alive,
-                                vote_target=p.vote_target,
-                                is_sheriff=True
-                            )
-                            break
+                    player_updates.update(update_player({**state, **player_updates}, transfer_target, is_sheriff=True))
             else:
                 # 销毁警徽
                 sheriff_transfer_info = {
@@ -413,12 +520,12 @@ async def announce_death_node(state: GameState) -> Dict[str, Any]:
                     "to_id": None,
                     "destroyed": True
                 }
-                print(f"      ❌ 警长 {player.name} 销毁警徽，本局没有警长")
+                say(state, f"      ❌ 警长 {player.name} 销毁警徽，本局没有警长")
     
     if killed_players:
         # 返回更新的玩家列表和相关信息
         result = {
-            "players": updated_players,
+            **player_updates,
             "last_words": last_words,
         }
         if sheriff_transfer_info:
@@ -426,7 +533,7 @@ async def announce_death_node(state: GameState) -> Dict[str, Any]:
         
         return result
     else:
-        print("  ✅ 平安夜（无人出局）")
+        say(state, "  ✅ 平安夜（无人出局）")
         return {}
 
 
@@ -443,24 +550,29 @@ async def sheriff_campaign_node(state: GameState) -> Dict[str, Any]:
     
     # 如果是PK发言阶段
     if sheriff_vote_round == 1 and sheriff_tied_candidates:
-        print(f"\n👮 警长投票平票PK发言阶段")
-        print("=" * 60)
-        print(f"  平票候选人: {[f'玩家{pid}' for pid in sheriff_tied_candidates]}")
+        emit(state, PhaseEvent(phase="sheriff_pk", message=f"\n👮 警长投票平票PK发言阶段\n" + "=" * 60))
+        say(state, f"  平票候选人: {[f'玩家{pid}' for pid in sheriff_tied_candidates]}")
         
-        alive_players = [p for p in state["players"] if p.is_alive]
-        pk_candidates = [p for p in alive_players if p.player_id in sheriff_tied_candidates]
+        index = player_index(state)
+        pk_candidates = [p for p in index.alive() if p.player_id in sheriff_tied_candidates]
         
         # PK发言
-        print(f"\n  PK发言（{len(pk_candidates)}人）：")
-        random.shuffle(pk_candidates)
-        from ..utils.agent_factory import create_agent_by_role
+        say(state, f"\n  PK发言（{len(pk_candidates)}人）：")
+        roster = get_roster(state)
+        roster.rng.shuffle(pk_candidates)
         for candidate in pk_candidates:
-            print(f"    {candidate.name} (玩家{candidate.player_id}) 正在PK发言...")
+            say(state, f"    {candidate.name} (玩家{candidate.player_id}) 正在PK发言...")
             # 调用 Agent 发言逻辑
-            agent = create_agent_by_role(candidate.player_id, candidate.name, candidate.role)
+            agent = roster.get(candidate)
             content = await agent.speak(state, context="sheriff_pk")
-            print(f"      💬 {content}")
-            await asyncio.sleep(0.1)
+            emit(state, SpeechEvent(
+                player_id=candidate.player_id,
+                player_name=candidate.name,
+                content=content,
+                context="sheriff_pk",
+                message=f"      💬 {content}"
+            ))
+            await pace(state, content)
         
         # PK发言后，保持平票候选人状态，以便进入第二轮投票
         return {
@@ -468,77 +580,84 @@ async def sheriff_campaign_node(state: GameState) -> Dict[str, Any]:
         }
     
     # 正常警长竞选阶段
-    print(f"\n👮 警长竞选阶段")
-    print("=" * 60)
+    emit(state, PhaseEvent(phase="sheriff_campaign", message=f"\n👮 警长竞选阶段\n" + "=" * 60))
     
-    alive_players = [p for p in state["players"] if p.is_alive]
+    index = player_index(state)
+    alive_players = index.alive()
+    rng = get_roster(state).rng
     
     # 玩家选择是否竞选警长
-    print("  玩家选择是否竞选警长：")
+    say(state, "  玩家选择是否竞选警长：")
     candidates = []
     for player in alive_players:
         # TODO: 调用 Agent 决定是否竞选
         # 目前随机决定
-        will_campaign = random.choice([True, False])
+        will_campaign = rng.choice([True, False])
         if will_campaign:
             candidates.append(player.player_id)
-            print(f"    ✅ {player.name} (玩家{player.player_id}) 选择竞选")
+            say(state, f"    ✅ {player.name} (玩家{player.player_id}) 选择竞选")
         else:
-            print(f"    ❌ {player.name} (玩家{player.player_id}) 不竞选")
+            say(state, f"    ❌ {player.name} (玩家{player.player_id}) 不竞选")
     
     # 如果全部玩家上警，则本局失去警徽
     if len(candidates) == len(alive_players):
-        print(f"\n  ⚠️  全部玩家上警竞选，本局失去警徽，没有警长")
+        say(state, f"\n  ⚠️  全部玩家上警竞选，本局失去警徽，没有警长")
         return {
             "sheriff_candidates": [],
             "sheriff_votes": {},
         }
     
     if not candidates:
-        print("  ⚠️  无人竞选警长，本局没有警长")
+        say(state, "  ⚠️  无人竞选警长，本局没有警长")
         return {
             "sheriff_candidates": [],
             "sheriff_votes": {},
         }
     
     # 竞选者发言（顺序发言，随机选择第一个），支持退水
-    print(f"\n  竞选者发言（{len(candidates)}人，可退水）：")
+    say(state, f"\n  竞选者发言（{len(candidates)}人，可退水）：")
     # 按玩家序号排序
-    candidate_players = [p for p in alive_players if p.player_id in candidates]
+    candidate_players = [index.get(pid) for pid in candidates]
     candidate_players.sort(key=lambda p: p.player_id)
     
     # 随机选择第一个发言的玩家
     if candidate_players:
-        first_index = random.randint(0, len(candidate_players) - 1)
+        first_index = rng.randint(0, len(candidate_players) - 1)
         # 重新排列：从第一个开始，然后顺序
         ordered_candidates = candidate_players[first_index:] + candidate_players[:first_index]
         candidates = [p.player_id for p in ordered_candidates]
-        print(f"    发言顺序（从玩家{candidates[0]}开始）：{' → '.join([f'玩家{pid}' for pid in candidates])}")
+        say(state, f"    发言顺序（从玩家{candidates[0]}开始）：{' → '.join([f'玩家{pid}' for pid in candidates])}")
     final_candidates = []
+    roster = get_roster(state)
     
     for candidate_id in candidates:
-        candidate = next((p for p in alive_players if p.player_id == candidate_id), None)
+        candidate = index.get_alive(candidate_id)
         if candidate:
-            print(f"    {candidate.name} (玩家{candidate_id}) 正在发言...")
+            say(state, f"    {candidate.name} (玩家{candidate_id}) 正在发言...")
             # 调用 Agent 发言逻辑
-            from ..utils.agent_factory import create_agent_by_role
-            agent = create_agent_by_role(candidate.player_id, candidate.name, candidate.role)
+            agent = roster.get(candidate)
             content = await agent.speak(state, context="sheriff_campaign")
-            print(f"      💬 {content}")
+            emit(state, SpeechEvent(
+                player_id=candidate_id,
+                player_name=candidate.name,
+                content=content,
+                context="sheriff_campaign",
+                message=f"      💬 {content}"
+            ))
             
             # 退水操作（随机模拟，TODO: 可以集成到 LLM 决策中）
-            will_withdraw = random.choice([False])  # 模拟（暂时不退水）
+            will_withdraw = rng.choice([False])  # 模拟（暂时不退水）
             if will_withdraw:
                 sheriff_withdrawn.append(candidate_id)
-                print(f"      💧 {candidate.name} 退水")
+                say(state, f"      💧 {candidate.name} 退水")
             else:
                 final_candidates.append(candidate_id)
             
-            await asyncio.sleep(0.1)
+            await pace(state, content)
     
     # 如果全部退水，则没有警长
     if len(final_candidates) == 0:
-        print(f"\n  ⚠️  全部竞选者退水，本局没有警长")
+        say(state, f"\n  ⚠️  全部竞选者退水，本局没有警长")
         return {
             "sheriff_candidates": [],
             "sheriff_votes": {},
@@ -564,28 +683,31 @@ async def sheriff_voting_node(state: GameState) -> Dict[str, Any]:
     if not candidates:
         return {}
     
-    if sheriff_vote_round == 0:
-        print(f"\n🗳️  警长投票阶段（第一轮）")
-    else:
-        print(f"\n🗳️  警长投票阶段（第二轮）")
+    round_name = "第一轮" if sheriff_vote_round == 0 else "第二轮"
+    emit(state, PhaseEvent(phase="sheriff_voting", message=f"\n🗳️  警长投票阶段（{round_name}）"))
     
-    print(f"  候选人: {[f'玩家{pid}' for pid in candidates]}")
+    say(state, f"  候选人: {[f'玩家{pid}' for pid in candidates]}")
     
-    alive_players = [p for p in state["players"] if p.is_alive]
+    index = player_index(state)
+    alive_players = index.alive()
     sheriff_votes = {}
     
     # 所有玩家投票
-    from ..utils.agent_factory import create_agent_by_role
-    for player in alive_players:
-        # 调用 Agent 投票逻辑
-        agent = create_agent_by_role(player.player_id, player.name, player.role)
-        target = await agent.vote(state, vote_type="sheriff", candidates=candidates)
+    async for player, target in _cast_votes(state, alive_players, "sheriff", candidates):
         if target:
             sheriff_votes[player.player_id] = target
-            candidate_name = next((p.name for p in alive_players if p.player_id == target), f"玩家{target}")
-            print(f"    {player.name} 投票给 {candidate_name}")
+            candidate = index.get_alive(target)
+            candidate_name = candidate.name if candidate else f"玩家{target}"
+            message = f"    {player.name} 投票给 {candidate_name}"
         else:
-            print(f"    {player.name} 弃权")
+            message = f"    {player.name} 弃权"
+        emit(state, VoteEvent(
+            voter_id=player.player_id,
+            voter_name=player.name,
+            target_id=target or None,
+            vote_type="sheriff",
+            message=message
+        ))
     
     # 统计投票结果
     vote_counts = {}
@@ -600,24 +722,12 @@ async def sheriff_voting_node(state: GameState) -> Dict[str, Any]:
         if len(winners) == 1:
             sheriff_id = winners[0]
             # 更新玩家状态，设置警长
-            updated_players = []
-            for p in state["players"]:
-                if p.player_id == sheriff_id:
-                    updated_p = Player(
-                        player_id=p.player_id,
-                        name=p.name,
-                        role=p.role,
-                        is_alive=p.is_alive,
-                        vote_target=p.vote_target,
-                        is_sheriff=True
-                    )
-                    updated_players.append(updated_p)
-                    print(f"\n  ✅ {p.name} (玩家{sheriff_id}) 当选警长！")
-                else:
-                    updated_players.append(p)
+            sheriff = index.get(sheriff_id)
+            if sheriff:
+                say(state, f"\n  ✅ {sheriff.name} (玩家{sheriff_id}) 当选警长！")
             
             return {
-                "players": updated_players,
+                **update_player(state, sheriff_id, is_sheriff=True),
                 "sheriff_votes": sheriff_votes,
                 "sheriff_vote_round": 0,  # 重置
                 "sheriff_tied_candidates": [],
@@ -626,8 +736,8 @@ async def sheriff_voting_node(state: GameState) -> Dict[str, Any]:
             # 平票情况
             if sheriff_vote_round == 0:
                 # 第一轮平票：进入PK发言
-                print(f"\n  ⚠️  警长投票平票！平票候选人: {winners}")
-                print(f"  进入PK发言阶段...")
+                say(state, f"\n  ⚠️  警长投票平票！平票候选人: {winners}")
+                say(state, f"  进入PK发言阶段...")
                 return {
                     "sheriff_votes": sheriff_votes,
                     "sheriff_vote_round": 1,
@@ -635,7 +745,7 @@ async def sheriff_voting_node(state: GameState) -> Dict[str, Any]:
                 }
             else:
                 # 第二轮依然平票：警徽流失
-                print(f"\n  ⚠️  第二轮投票依然平票！本局没有警长，警徽流失")
+                say(state, f"\n  ⚠️  第二轮投票依然平票！本局没有警长，警徽流失")
                 return {
                     "sheriff_votes": sheriff_votes,
                     "sheriff_vote_round": 0,
@@ -643,6 +753,16 @@ async def sheriff_voting_node(state: GameState) -> Dict[str, Any]:
                     "sheriff_candidates": [],  # 清空候选人
                 }
     
+    if sheriff_vote_round == 1:
+        # 第二轮无人投票：警徽流失（否则会反复进入PK发言）
+        say(state, f"\n  ⚠️  第二轮无人投票！本局没有警长，警徽流失")
+        return {
+            "sheriff_votes": sheriff_votes,
+            "sheriff_vote_round": 0,
+            "sheriff_tied_candidates": [],
+            "sheriff_candidates": [],
+        }
+    
     return {"sheriff_votes": sheriff_votes}
 
 
@@ -650,18 +770,17 @@ async def sheriff_voting_node(state: GameState) -> Dict[str, Any]:
 async def discussion_node(state: GameState) -> Dict[str, Any]:
     """发言阶段节点（支持警长选择顺序、自爆）"""
     day_number = state.get("day_number", 1)
-    print(f"\n💬 发言阶段 - 第 {day_number} 天")
-    print("=" * 60)
+    emit(state, PhaseEvent(phase="discussion", message=f"\n💬 发言阶段 - 第 {day_number} 天\n" + "=" * 60))
     
-    alive_players = [p for p in state["players"] if p.is_alive]
+    index = player_index(state)
+    alive_players = index.alive()
     
     # 检查是否有警长，如果有则警长选择发言顺序
-    sheriff = next((p for p in alive_players if p.is_sheriff), None)
+    sheriff = index.sheriff()
     if sheriff:
-        print(f"  👮 警长 {sheriff.name} (玩家{sheriff.player_id}) 选择发言顺序")
+        say(state, f"  👮 警长 {sheriff.name} (玩家{sheriff.player_id}) 选择发言顺序")
         # 调用警长 Agent 选择发言顺序
-        from ..utils.agent_factory import create_agent_by_role
-        sheriff_agent = create_agent_by_role(sheriff.player_id, sheriff.name, sheriff.role)
+        sheriff_agent = get_roster(state).get(sheriff)
         use_order = await sheriff_agent.decide_speaking_order(state, alive_players)
         
         # 按玩家序号排序
@@ -672,58 +791,50 @@ async def discussion_node(state: GameState) -> Dict[str, Any]:
         if use_order:
             # 顺序发言：从警长下一个开始，到最后一个，然后从第一个到警长
             speaking_order = player_ids[sheriff_index + 1:] + player_ids[:sheriff_index + 1]
-            print(f"    选择顺序发言：{' → '.join([f'玩家{pid}' for pid in speaking_order])}")
+            say(state, f"    选择顺序发言：{' → '.join([f'玩家{pid}' for pid in speaking_order])}")
         else:
             # 逆序发言：从警长前一个开始，逆序到第一个，然后从最后一个到警长
             speaking_order = player_ids[:sheriff_index][::-1] + player_ids[sheriff_index:][::-1]
-            print(f"    选择逆序发言：{' → '.join([f'玩家{pid}' for pid in speaking_order])}")
+            say(state, f"    选择逆序发言：{' → '.join([f'玩家{pid}' for pid in speaking_order])}")
         
         # 重新排列 alive_players 按照发言顺序
-        player_dict = {p.player_id: p for p in alive_players}
-        alive_players = [player_dict[pid] for pid in speaking_order]
+        alive_players = [index.get(pid) for pid in speaking_order]
     else:
         # 无警长，随机顺序
-        random.shuffle(alive_players)
+        get_roster(state).rng.shuffle(alive_players)
     
     discussions = []
     
     # 按顺序发言
-    from ..utils.agent_factory import create_agent_by_role
+    roster = get_roster(state)
     
     for player in alive_players:
         # 检查是否有狼人自爆（之前已经自爆）
         if state.get("self_exploded"):
             exploded_id = state["self_exploded"]
-            exploded_player = next((p for p in alive_players if p.player_id == exploded_id), None)
+            exploded_player = index.get_alive(exploded_id)
             if exploded_player:
-                print(f"\n  💥 {exploded_player.name} (玩家{exploded_id}) 自爆！发言终止，直接进入黑夜")
+                say(state, f"\n  💥 {exploded_player.name} (玩家{exploded_id}) 自爆！发言终止，直接进入黑夜")
             break
         
-        # 创建对应角色的 Agent
-        agent = create_agent_by_role(player.player_id, player.name, player.role)
+        # 获取对应角色的 Agent
+        agent = roster.get(player)
         
         # 只有狼人可以自爆（与是否警长无关）
         if player.role == "werewolf":
             # 调用狼人 Agent 决定是否自爆
             will_explode = await agent.decide_self_explode(state, player.player_id)
             if will_explode:
-                print(f"\n  💥 {player.name} (狼人) 自爆！发言终止，直接进入黑夜")
+                emit(state, DeathEvent(
+                    player_id=player.player_id,
+                    player_name=player.name,
+                    role=player.role,
+                    cause="self_explode",
+                    message=f"\n  💥 {player.name} (狼人) 自爆！发言终止，直接进入黑夜"
+                ))
                 
                 # 更新玩家状态：自爆的狼人立即出局
-                updated_players = []
-                for p in state["players"]:
-                    if p.player_id == player.player_id:
-                        updated_p = Player(
-                            player_id=p.player_id,
-                            name=p.name,
-                            role=p.role,
-                            is_alive=False,  # 自爆后立即出局
-                            vote_target=p.vote_target,
-                            is_sheriff=p.is_sheriff
-                        )
-                        updated_players.append(updated_p)
-                    else:
-                        updated_players.append(p)
+                player_updates = update_player(state, player.player_id, is_alive=False)
                 
                 # 记录历史（返回单个历史记录项作为列表，以便 LangGraph 合并）
                 history_entry = {
@@ -736,29 +847,47 @@ async def discussion_node(state: GameState) -> Dict[str, Any]:
                 
                 return {
                     "self_exploded": player.player_id,
-                    "players": updated_players,
+                    **player_updates,
                     "history": [history_entry],  # 返回单个历史记录项作为列表
                     "current_phase": "night",  # 自爆后直接进入黑夜
                 }
         
-        print(f"  {player.name} (玩家{player.player_id}) 正在发言...")
+        say(state, f"  {player.name} (玩家{player.player_id}) 正在发言...")
         
-        # 调用 Agent 发言逻辑
-        content = await agent.speak(state, context="normal")
-        print(f"    💬 {content}")
+        # 调用 Agent 发言逻辑（流式模式下边生成边发出增量内容）
+        streamed = []
+        
+        def on_token(text: str):
+            emit(state, SpeechTokenEvent(
+                player_id=player.player_id,
+                text=text,
+                message=text if streamed else f"    💬 {text}"
+            ))
+            streamed.append(text)
+        
+        with telemetry_context(agent_id=player.player_id):
+            if state.get("stream_speech"):
+                content = await agent.speak(state, context="normal", on_token=on_token)
+            else:
+                content = await agent.speak(state, context="normal")
+        # 发言失败退回默认发言时没有流式输出，SpeechEvent 携带完整内容；
+        # 已流式发出的内容与最终发言不一致（修复或中途失败）时，通知消费者替换
+        emit(state, SpeechEvent(
+            player_id=player.player_id,
+            player_name=player.name,
+            content=content,
+            streamed=bool(streamed),
+            stream_reset=bool(streamed) and "".join(streamed) != content,
+            message=f"    💬 {content}"
+        ))
         
         discussion = {
             "player_id": player.player_id,
             "player_name": player.name,
-            "role": player.role,
             "content": content,
-            "day": day_number,
         }
         discussions.append(discussion)
-        await asyncio.sleep(0.1)
-    
-    current_discussions = state.get("discussions", [])
-    current_discussions.extend(discussions)
+        await pace(state, content)
     
     # 记录历史（返回单个历史记录项作为列表，以便 LangGraph 合并）
     history_entry = {
@@ -768,7 +897,6 @@ async def discussion_node(state: GameState) -> Dict[str, Any]:
     }
     
     return {
-        "discussions": current_discussions,
         "history": [history_entry],  # 返回单个历史记录项作为列表
     }
 
@@ -780,11 +908,13 @@ async def exile_voting_node(state: GameState) -> Dict[str, Any]:
     tied_players = state.get("tied_players", [])
     
     if tie_vote_round > 0:
-        print(f"\n🗳️  放逐投票（平票重议第{tie_vote_round}轮）- 第 {day_number} 天")
+        title = f"\n🗳️  放逐投票（平票重议第{tie_vote_round}轮）- 第 {day_number} 天"
     else:
-        print(f"\n🗳️  放逐投票 - 第 {day_number} 天")
+        title = f"\n🗳️  放逐投票 - 第 {day_number} 天"
+    emit(state, PhaseEvent(phase="exile_voting", message=title))
     
-    alive_players = [p for p in state["players"] if p.is_alive]
+    index = player_index(state)
+    alive_players = index.alive()
     
     # 如果是平票重议，只能投票给平票的玩家
     if tie_vote_round > 0 and tied_players:
@@ -795,17 +925,21 @@ async def exile_voting_node(state: GameState) -> Dict[str, Any]:
     votes = {}
     
     # 收集投票
-    from ..utils.agent_factory import create_agent_by_role
-    for player in alive_players:
-        # 调用 Agent 投票逻辑
-        agent = create_agent_by_role(player.player_id, player.name, player.role)
-        target = await agent.vote(state, vote_type="exile")
+    async for player, target in _cast_votes(state, alive_players, "exile"):
         if target:
             votes[player.player_id] = target
-            target_name = next((p.name for p in alive_players if p.player_id == target), f"玩家{target}")
-            print(f"  {player.name} 投票给 {target_name}")
+            target_player = index.get_alive(target)
+            target_name = target_player.name if target_player else f"玩家{target}"
+            message = f"  {player.name} 投票给 {target_name}"
         else:
-            print(f"  {player.name} 弃权")
+            message = f"  {player.name} 弃权"
+        emit(state, VoteEvent(
+            voter_id=player.player_id,
+            voter_name=player.name,
+            target_id=target or None,
+            vote_type="exile",
+            message=message
+        ))
     
     # 统计投票结果
     vote_results = {}
@@ -836,74 +970,60 @@ async def exile_voting_node(state: GameState) -> Dict[str, Any]:
         
         if len(eliminated_players) == 1:
             eliminated_id = eliminated_players[0]
-            eliminated_player = next((p for p in alive_players if p.player_id == eliminated_id), None)
             
             # 更新玩家状态
-            updated_players = []
-            for p in state["players"]:
-                if p.player_id == eliminated_id:
-                    updated_p = Player(
-                        player_id=p.player_id,
-                        name=p.name,
-                        role=p.role,
-                        is_alive=False,
-                        vote_target=p.vote_target,
-                        is_sheriff=p.is_sheriff
-                    )
-                    updated_players.append(updated_p)
-                    print(f"\n  ❌ {p.name} (玩家{eliminated_id}) 被放逐")
-                    
-                    # 被放逐的玩家有遗言
-                    from ..utils.agent_factory import create_agent_by_role
-                    agent = create_agent_by_role(eliminated_id, p.name, p.role)
-                    last_word = await agent.leave_last_words(state, death_reason="exile")
-                    
-                    last_words = state.get("last_words", {})
-                    last_words[eliminated_id] = last_word
-                    updates["last_words"] = last_words
-                    print(f"      💬 遗言: {last_word}")
+            p = index.get(eliminated_id)
+            if p:
+                updates.update(update_player(state, eliminated_id, is_alive=False))
+                emit(state, DeathEvent(
+                    player_id=eliminated_id,
+                    player_name=p.name,
+                    role=p.role,
+                    cause="exile",
+                    message=f"\n  ❌ {p.name} (玩家{eliminated_id}) 被放逐"
+                ))
+                
+                # 被放逐的玩家有遗言
+                agent = get_roster(state).get(p)
+                last_word = await agent.leave_last_words(state, death_reason="exile")
+                
+                updates["last_words"] = {eliminated_id: last_word}
+                emit(state, SpeechEvent(
+                    player_id=eliminated_id,
+                    player_name=p.name,
+                    content=last_word,
+                    context="last_words",
+                    message=f"      💬 遗言: {last_word}"
+                ))
+                
+                # 如果被放逐的是警长，处理警长移交
+                if p.is_sheriff:
+                    say(state, f"      👮 警长 {p.name} 被放逐，需要处理警徽")
+                    transfer_target = await agent.decide_sheriff_transfer(state)
                     
-                    # 如果被放逐的是警长，处理警长移交
-                    if p.is_sheriff:
-                        print(f"      👮 警长 {p.name} 被放逐，需要处理警徽")
-                        transfer_target = await agent.decide_sheriff_transfer(state)
-                        
-                        if transfer_target:
-                            # 移交警徽
-                            transfer_info = {
-                                "from_id": eliminated_id,
-                                "to_id": transfer_target,
-                                "destroyed": False
-                            }
-                            target_player = next((p2 for p2 in alive_players if p2.player_id == transfer_target), None)
-                            if target_player:
-                                print(f"      ✅ 警长 {p.name} 将警徽移交给 {target_player.name} (玩家{transfer_target})")
-                                # 更新玩家状态：新玩家成为警长
-                                for i, updated_p in enumerate(updated_players):
-                                    if updated_p.player_id == transfer_target:
-                                        updated_players[i] = Player(
-                                            player_id=updated_p.player_id,
-                                            name=updated_p.name,
-                                            role=updated_p.role,
-                                            is_alive=updated_p.is_alive,
-                                            vote_target=updated_p.vote_target,
-                                            is_sheriff=True
-                                        )
-                                        break
-                                updates["sheriff_transfer"] = transfer_info
-                        else:
-                            # 销毁警徽
-                            transfer_info = {
-                                "from_id": eliminated_id,
-                                "to_id": None,
-                                "destroyed": True
-                            }
-                            print(f"      ❌ 警长 {p.name} 销毁警徽，本局没有警长")
+                    if transfer_target:
+                        # 移交警徽
+                        transfer_info = {
+                            "from_id": eliminated_id,
+                            "to_id": transfer_target,
+                            "destroyed": False
+                        }
+                        target_player = index.get_alive(transfer_target)
+                        if target_player:
+                            say(state, f"      ✅ 警长 {p.name} 将警徽移交给 {target_player.name} (玩家{transfer_target})")
+                            # 更新玩家状态：新玩家成为警长
+                            updates.update(update_player({**state, **updates}, transfer_target, is_sheriff=True))
                             updates["sheriff_transfer"] = transfer_info
-                else:
-                    updated_players.append(p)
+                    else:
+                        # 销毁警徽
+                        transfer_info = {
+                            "from_id": eliminated_id,
+                            "to_id": None,
+                            "destroyed": True
+                        }
+                        say(state, f"      ❌ 警长 {p.name} 销毁警徽，本局没有警长")
+                        updates["sheriff_transfer"] = transfer_info
             
-            updates["players"] = updated_players
             updates["consecutive_ties"] = 0
             updates["tie_vote_round"] = 0
             updates["tied_players"] = []
@@ -913,12 +1033,12 @@ async def exile_voting_node(state: GameState) -> Dict[str, Any]:
                 # 第一轮平票：进入重议
                 updates["tie_vote_round"] = 1
                 updates["tied_players"] = eliminated_players
-                print(f"  ⚠️  第一轮投票平票！平票玩家: {eliminated_players}")
+                say(state, f"  ⚠️  第一轮投票平票！平票玩家: {eliminated_players}")
             elif tie_vote_round == 1:
                 # 第二轮依然平票：直接进入黑夜，无人出局
                 updates["tie_vote_round"] = 2
                 updates["tied_players"] = []
-                print(f"  ⚠️  第二轮投票依然平票！无人出局，直接进入黑夜")
+                say(state, f"  ⚠️  第二轮投票依然平票！无人出局，直接进入黑夜")
         
         return updates
     
@@ -927,44 +1047,47 @@ async def exile_voting_node(state: GameState) -> Dict[str, Any]:
 
 async def judgment_node(state: GameState) -> Dict[str, Any]:
     """结果判定节点：屠边规则"""
-    print(f"\n⚖️  结果判定")
-    print("=" * 60)
+    emit(state, PhaseEvent(phase="judgment", message=f"\n⚖️  结果判定\n" + "=" * 60))
     
-    alive_players = [p for p in state["players"] if p.is_alive]
-    werewolves = [p for p in alive_players if p.role == "werewolf"]
-    villagers = [p for p in alive_players if p.role == "villager"]
-    gods = [p for p in alive_players if p.role in ["seer", "witch", "guard"]]
+    counts = alive_counts(state)
     
     winner = None
     game_status = "playing"
     
     # 屠边规则判断
-    if len(werewolves) == 0:
+    if counts["werewolves"] == 0:
         # 狼人全部出局，好人获胜
         winner = "villagers"
         game_status = "ended"
-        print(f"  ✅ 好人获胜！（狼人全部出局）")
-    elif len(villagers) == 0:
+        emit(state, GameOverEvent(winner="villagers", message="  ✅ 好人获胜！（狼人全部出局）"))
+    elif counts["villagers"] == 0:
         # 平民全部出局，狼人获胜
         winner = "werewolves"
         game_status = "ended"
-        print(f"  ✅ 狼人获胜！（平民全部出局）")
-    elif len(gods) == 0:
+        emit(state, GameOverEvent(winner="werewolves", message="  ✅ 狼人获胜！（平民全部出局）"))
+    elif counts["gods"] == 0:
         # 神职全部出局，狼人获胜
         winner = "werewolves"
         game_status = "ended"
-        print(f"  ✅ 狼人获胜！（神职全部出局）")
+        emit(state, GameOverEvent(winner="werewolves", message="  ✅ 狼人获胜！（神职全部出局）"))
+    elif state.get("max_rounds") and state.get("round_number", 1) > state["max_rounds"]:
+        # 超过最大轮次，平局
+        game_status = "ended"
+        emit(state, GameOverEvent(winner=None, message=f"  ⚠️  超过最大轮次（{state['max_rounds']}），平局"))
     
     # 记录结果（返回单个历史记录项作为列表，以便 LangGraph 合并）
     if game_status == "ended":
+        # 游戏结束，释放本局 Agent 名册
+        release_roster(state.get("game_id"))
+        
         history_entry = {
             "type": "game_end",
             "winner": winner,
             "day": state.get("day_number", 1),
             "round": state.get("round_number", 1),
-            "alive_werewolves": len(werewolves),
-            "alive_villagers": len(villagers),
-            "alive_gods": len(gods),
+            "alive_werewolves": counts["werewolves"],
+            "alive_villagers": counts["villagers"],
+            "alive_gods": counts["gods"],
         }
         return {
             "game_status": game_status,
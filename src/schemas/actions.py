@@ -53,3 +53,68 @@ class VoteDecision(BaseModel):
     confidence: float = Field(description="置信度（0-1）", ge=0.0, le=1.0)
     reasoning: str = Field(description="决策理由")
 
+
+class LastWordsDecision(BaseModel):
+    """遗言决策（结构化输出）"""
+    thought: str = Field(description="推理过程")
+    content: str = Field(description="遗言内容")
+    confidence: float = Field(description="置信度（0-1）", ge=0.0, le=1.0)
+    reasoning: str = Field(description="遗言理由")
+
+
+class SheriffTransferDecision(BaseModel):
+    """警长移交决策（结构化输出）"""
+    thought: str = Field(description="推理过程")
+    should_transfer: bool = Field(description="是否移交警徽（True=移交，False=销毁）")
+    target_id: Optional[int] = Field(default=None, description="目标玩家ID（如果移交），None（如果销毁）")
+    confidence: float = Field(description="置信度（0-1）", ge=0.0, le=1.0)
+    reasoning: str = Field(description="决策理由")
+
+
+class SpeakingOrderDecision(BaseModel):
+    """发言顺序决策（结构化输出）"""
+    thought: str = Field(description="推理过程")
+    use_order: bool = Field(description="是否顺序发言（True=顺序，False=逆序）")
+    confidence: float = Field(description="置信度（0-1）", ge=0.0, le=1.0)
+    reasoning: str = Field(description="决策理由")
+
+
+class KillVoteDecision(BaseModel):
+    """狼人攻击投票决策（结构化输出）"""
+    thought: str = Field(description="推理过程")
+    target_id: Optional[int] = Field(default=None, description="目标玩家ID（如果不攻击则返回None）")
+    confidence: float = Field(description="置信度（0-1）", ge=0.0, le=1.0)
+    reasoning: str = Field(description="决策理由")
+
+
+class ExplodeDecision(BaseModel):
+    """狼人自爆决策（结构化输出）"""
+    thought: str = Field(description="推理过程")
+    should_explode: bool = Field(description="是否自爆")
+    confidence: float = Field(description="置信度（0-1）", ge=0.0, le=1.0)
+    reasoning: str = Field(description="决策理由")
+
+
+class AntidoteDecision(BaseModel):
+    """女巫解药决策（结构化输出）"""
+    thought: str = Field(description="推理过程")
+    use_antidote: bool = Field(description="是否使用解药")
+    confidence: float = Field(description="置信度（0-1）", ge=0.0, le=1.0)
+    reasoning: str = Field(description="决策理由")
+
+
+class PoisonDecision(BaseModel):
+    """女巫毒药决策（结构化输出）"""
+    thought: str = Field(description="推理过程")
+    use_poison: bool = Field(description="是否使用毒药")
+    target_id: Optional[int] = Field(default=None, description="目标玩家ID（如果使用毒药）")
+    confidence: float = Field(description="置信度（0-1）", ge=0.0, le=1.0)
+    reasoning: str = Field(description="决策理由")
+
+
+class GuardDecision(BaseModel):
+    """守卫守护决策（结构化输出）"""
+    thought: str = Field(description="推理过程")
+    target_id: Optional[int] = Field(default=None, description="目标玩家ID（如果不守护则返回None）")
+    confidence: float = Field(description="置信度（0-1）", ge=0.0, le=1.0)
+    reasoning: str = Field(description="决策理由")
@@ -0,0 +1,226 @@
+"""
+决策 Schema 注册表：每个 Schema 的 JSON 格式指令、字段映射表和缺省值填充规则只计算一次
+"""
+import json
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from .actions import (
+    AgentAction,
+    SpeakDecision,
+    VoteDecision,
+    LastWordsDecision,
+    SheriffTransferDecision,
+    SpeakingOrderDecision,
+    KillVoteDecision,
+    ExplodeDecision,
+    AntidoteDecision,
+    PoisonDecision,
+    GuardDecision,
+)
+
+# 常见的字段名不匹配（LLM 返回的字段名 -> Schema 字段名）
+COMMON_FIELD_ALIASES = {
+    'action': 'action_type',
+    'actionType': 'action_type',
+    'type': 'action_type',
+    'reason': 'reasoning',
+    'reasoning_text': 'reasoning',
+    'text': 'content',
+    'message': 'content',
+}
+
+DEFAULT_EXAMPLE = '{"thought": "...", "action_type": "vote", "target": 1, "confidence": 0.75, "reasoning": "..."}'
+
+_MISSING = object()
+
+
+class DecisionSpec:
+    """
+    编译后的决策 Schema
+
+    Attributes:
+        schema: Pydantic Schema 类
+        decision_type: 决策类型名称（用于缓存、统计等）
+        field_names: Schema 字段名列表
+        json_instruction: 追加到 system 消息末尾的 JSON 格式指令（纯 prompt 约束）
+        compact_instruction: JSON Mode 下使用的简短字段说明
+        tool: 工具调用方式下使用的 OpenAI 工具定义
+        field_mapping: 字段名映射表
+        target_fields: 需要从字符串中提取玩家ID的字段
+    """
+
+    def __init__(self, schema: Type[BaseModel], decision_type: Optional[str] = None):
+        self.schema = schema
+        self.decision_type = decision_type or schema.__name__
+        fields = schema.model_fields
+        self.field_names = list(fields)
+        self.field_mapping = self._build_field_mapping(fields)
+        self.target_fields = {name for name in ("target", "target_id") if name in fields}
+        self._fillers = self._build_fillers(fields)
+        self.json_instruction = self._build_json_instruction(fields)
+        self.compact_instruction = self._build_compact_instruction(fields)
+        self.tool = convert_to_openai_tool(schema)
+        self.tool_choice = {"type": "function", "function": {"name": self.tool["function"]["name"]}}
+
+    @staticmethod
+    def _build_field_mapping(fields) -> Dict[str, str]:
+        mapping = {
+            alias: name for alias, name in COMMON_FIELD_ALIASES.items()
+            if name in fields and alias not in fields
+        }
+        # 目标字段名互相兼容（target <-> target_id）
+        if "target_id" in fields and "target" not in fields:
+            mapping["target"] = "target_id"
+        if "target" in fields and "target_id" not in fields:
+            mapping["target_id"] = "target"
+        return mapping
+
+    @staticmethod
+    def _build_fillers(fields) -> List[Tuple[str, Callable[[Dict[str, Any]], Any]]]:
+        """为缺失字段生成填充函数（返回 _MISSING 表示不填充）"""
+        fillers = []
+        for field_name, field_info in fields.items():
+            default = field_info.default
+            if default is not None and default is not PydanticUndefined:
+                fillers.append((field_name, lambda data, value=default: value))
+                continue
+
+            ann = str(field_info.annotation)
+            if 'str' in ann or 'String' in ann:
+                fallback = ''
+            elif 'int' in ann or 'Integer' in ann:
+                fallback = 0
+            elif 'float' in ann:
+                fallback = 0.0
+            else:
+                fallback = _MISSING
+
+            if field_name == 'thought':
+                filler = lambda data: data.get('reasoning', data.get('reason', ''))
+            elif field_name == 'reasoning':
+                filler = lambda data: data.get('thought', data.get('reason', ''))
+            elif field_name == 'confidence':
+                filler = lambda data: 0.5
+            elif field_name == 'target':
+                filler = lambda data, fallback=fallback: (
+                    None if data.get('action_type') in ['skip', 'explode'] else fallback
+                )
+            else:
+                filler = lambda data, fallback=fallback: fallback
+            fillers.append((field_name, filler))
+        return fillers
+
+    def _build_json_instruction(self, fields) -> str:
+        field_descriptions = []
+        for field_name, field_info in fields.items():
+            field_desc = f"- {field_name} ({field_info.annotation})"
+            if not field_info.is_required():
+                field_desc += f" [可选，默认: {field_info.default}]"
+            field_descriptions.append(field_desc)
+
+        example = None
+        extra = self.schema.model_config.get('json_schema_extra')
+        if isinstance(extra, dict):
+            example = extra.get('example')
+
+        return f"""
+
+重要：请严格按照以下 JSON 格式返回结果，不要使用其他字段名。
+
+必需字段：
+{chr(10).join(field_descriptions)}
+
+JSON 格式要求：
+1. 必须使用上述确切的字段名（如 action_type 而不是 action）
+2. target 字段必须是整数（玩家ID），不是字符串（如 1 而不是 "玩家1"）
+3. 所有必需字段都必须包含
+4. 只返回纯 JSON 对象，不要包含任何其他文本、说明或代码块标记
+5. 确保 JSON 格式完全正确，可以被直接解析
+
+示例格式：
+{json.dumps(example, ensure_ascii=False, indent=2) if example else DEFAULT_EXAMPLE}
+"""
+
+    @staticmethod
+    def _build_compact_instruction(fields) -> str:
+        field_descriptions = []
+        for field_name, field_info in fields.items():
+            type_name = re.sub(r"<class '(\w+)'>", r"\1", str(field_info.annotation)).replace("typing.", "")
+            field_descriptions.append(f"{field_name}: {type_name}")
+        return f"\n\n请只返回一个 JSON 对象，字段：{', '.join(field_descriptions)}。"
+
+    def map_fields(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        映射字段名并为缺失字段填充缺省值
+
+        Args:
+            data: LLM 返回的 JSON 对象
+
+        Returns:
+            可以直接构造 Schema 的字典
+        """
+        mapped_data = {}
+        for key, value in data.items():
+            mapped_key = self.field_mapping.get(key, key)
+
+            # 目标字段：如果是字符串，尝试提取数字（如 "玩家1" -> 1）
+            if mapped_key in self.target_fields and isinstance(value, str):
+                numbers = re.findall(r'\d+', value)
+                value = int(numbers[0]) if numbers else None
+
+            mapped_data[mapped_key] = value
+
+        for field_name, filler in self._fillers:
+            if field_name not in mapped_data:
+                value = filler(mapped_data)
+                if value is not _MISSING:
+                    mapped_data[field_name] = value
+
+        return mapped_data
+
+
+# 决策 Schema 注册表：Schema 类 -> DecisionSpec
+_registry: Dict[Type[BaseModel], DecisionSpec] = {}
+_registry_lock = threading.Lock()
+
+
+def register_decision(schema: Type[BaseModel], decision_type: str) -> DecisionSpec:
+    """
+    注册决策 Schema
+
+    Args:
+        schema: Pydantic Schema 类
+        decision_type: 决策类型名称
+
+    Returns:
+        编译后的 DecisionSpec
+    """
+    spec = DecisionSpec(schema, decision_type)
+    with _registry_lock:
+        _registry[schema] = spec
+    return spec
+
+
+def get_decision_spec(schema: Type[BaseModel]) -> DecisionSpec:
+    """获取 Schema 的 DecisionSpec（未注册的 Schema 在首次使用时编译并缓存）"""
+    spec = _registry.get(schema)
+    if spec is None:
+        spec = register_decision(schema, schema.__name__)
+    return spec
+
+
+register_decision(AgentAction, "action")
+register_decision(SpeakDecision, "speak")
+register_decision(VoteDecision, "vote")
+register_decision(LastWordsDecision, "last_words")
+register_decision(SheriffTransferDecision, "sheriff_transfer")
+register_decision(SpeakingOrderDecision, "speaking_order")
+register_decision(KillVoteDecision, "werewolf_kill")
+register_decision(ExplodeDecision, "self_explode")
+register_decision(AntidoteDecision, "witch_antidote")
+register_decision(PoisonDecision, "witch_poison")
+register_decision(GuardDecision, "guard_protect")
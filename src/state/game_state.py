@@ -1,14 +1,22 @@
 """
 游戏状态定义
 """
-from typing import List, Dict, Any, Optional, Literal, Annotated
+from typing import List, Dict, Any, Optional, Literal, Annotated, Iterable, Set
 from typing_extensions import TypedDict
-from pydantic import BaseModel
-import operator
+from pydantic import BaseModel, ConfigDict
+import uuid
+from ..utils.pacing import make_pacing
+from .history import GameHistory, append_history, DEFAULT_HISTORY_WINDOW
 
 
 class Player(BaseModel):
-    """玩家信息"""
+    """
+    玩家信息
+    
+    玩家记录不可变：修改玩家请使用 update_player（不同状态快照之间共享未变化的记录）。
+    """
+    model_config = ConfigDict(frozen=True)
+    
     player_id: int
     name: str
     role: str
@@ -17,22 +25,319 @@ class Player(BaseModel):
     is_sheriff: bool = False  # 是否为警长
 
 
+class PlayerIndex:
+    """
+    玩家索引：ID -> 玩家、存活玩家ID集合、角色 -> 玩家ID
+    
+    与 players 列表一起保存在状态中，每次出局或警长变化时随新的玩家列表重建，
+    节点和 Agent 通过它按ID、存活状态、角色查找玩家，不再逐个扫描玩家列表。
+    索引只读，玩家列表变化时请通过 players_update 生成新的索引。
+    """
+    
+    __slots__ = ("players", "by_id", "positions", "alive_ids", "role_ids", "sheriff_id", "_alive")
+    
+    def __init__(self, players: List[Player]):
+        self.players = players
+        self.by_id: Dict[int, Player] = {}
+        self.positions: Dict[int, int] = {}
+        self.alive_ids: Set[int] = set()
+        self.role_ids: Dict[str, List[int]] = {}
+        self.sheriff_id: Optional[int] = None
+        self._alive: List[Player] = []
+        for position, p in enumerate(players):
+            self.by_id[p.player_id] = p
+            self.positions[p.player_id] = position
+            self.role_ids.setdefault(p.role, []).append(p.player_id)
+            if p.is_alive:
+                self.alive_ids.add(p.player_id)
+                self._alive.append(p)
+                if p.is_sheriff:
+                    self.sheriff_id = p.player_id
+    
+    def replace(self, players: List[Player], old: Player, new: Player) -> "PlayerIndex":
+        """
+        生成替换了一名玩家之后的索引（不重新扫描玩家列表）
+        
+        Args:
+            players: 替换后的玩家列表
+            old: 被替换的玩家记录
+            new: 新的玩家记录（player_id 相同）
+        
+        Returns:
+            新的索引（原索引不变）
+        """
+        if new.role != old.role:
+            return PlayerIndex(players)
+        index = PlayerIndex.__new__(PlayerIndex)
+        index.players = players
+        index.by_id = {**self.by_id, new.player_id: new}
+        index.positions = self.positions
+        index.role_ids = self.role_ids
+        index.alive_ids = self.alive_ids
+        index.sheriff_id = self.sheriff_id
+        if new.is_alive != old.is_alive:
+            index.alive_ids = self.alive_ids ^ {new.player_id}
+            if new.is_alive:
+                index._alive = [p for p in players if p.is_alive]
+            else:
+                index._alive = [p for p in self._alive if p.player_id != new.player_id]
+        elif new.is_alive:
+            index._alive = [new if p.player_id == new.player_id else p for p in self._alive]
+        else:
+            index._alive = self._alive
+        if new.is_alive and new.is_sheriff:
+            index.sheriff_id = new.player_id
+        elif self.sheriff_id == new.player_id:
+            index.sheriff_id = None
+        return index
+    
+    def get(self, player_id: Optional[int]) -> Optional[Player]:
+        """按ID查找玩家（不存在时返回 None）"""
+        return self.by_id.get(player_id)
+    
+    def get_alive(self, player_id: Optional[int]) -> Optional[Player]:
+        """按ID查找存活玩家（不存在或已出局时返回 None）"""
+        return self.by_id.get(player_id) if player_id in self.alive_ids else None
+    
+    def is_alive(self, player_id: Optional[int]) -> bool:
+        """玩家是否存活"""
+        return player_id in self.alive_ids
+    
+    def alive(self) -> List[Player]:
+        """存活玩家列表（按座位顺序，返回新列表）"""
+        return list(self._alive)
+    
+    def with_role(self, *roles: str, alive_only: bool = True) -> List[Player]:
+        """
+        按角色查找玩家
+        
+        Args:
+            roles: 一个或多个角色
+            alive_only: 是否只返回存活玩家
+        
+        Returns:
+            玩家列表（同一角色内按座位顺序）
+        """
+        result = []
+        for role in roles:
+            for pid in self.role_ids.get(role, ()):
+                if not alive_only or pid in self.alive_ids:
+                    result.append(self.by_id[pid])
+        return result
+    
+    def sheriff(self) -> Optional[Player]:
+        """当前警长（存活且持有警徽的玩家）"""
+        return self.by_id.get(self.sheriff_id) if self.sheriff_id is not None else None
+
+
+def player_index(state: Dict[str, Any]) -> PlayerIndex:
+    """
+    获取状态中的玩家索引
+    
+    索引与状态中的玩家列表不对应时（如直接构造的状态、只更新了 players 的状态）
+    按当前玩家列表重建。
+    
+    Args:
+        state: 游戏状态
+    
+    Returns:
+        玩家索引
+    """
+    players = state.get("players", [])
+    index = state.get("player_index")
+    if index is None or index.players is not players:
+        index = PlayerIndex(players)
+    return index
+
+
+def players_update(players: List[Player]) -> Dict[str, Any]:
+    """
+    生成玩家列表的状态更新（同时附带新的玩家索引）
+    
+    Args:
+        players: 新的玩家列表
+    
+    Returns:
+        {"players": ..., "player_index": ...}
+    """
+    return {"players": players, "player_index": PlayerIndex(players)}
+
+
+def merge_dict(left: Dict[Any, Any], right: Dict[Any, Any]) -> Dict[Any, Any]:
+    """
+    字典合并 reducer：节点只返回新增或修改的条目，合并时生成新字典
+    
+    原字典不被修改，之前的状态快照仍然有效；值对象在新旧字典之间共享。
+    """
+    if not right:
+        return left
+    return {**left, **right}
+
+
+# 角色所属阵营（用于屠边规则的存活计数）
+ROLE_FACTIONS = {
+    "werewolf": "werewolves",
+    "villager": "villagers",
+    "seer": "gods",
+    "witch": "gods",
+    "guard": "gods",
+}
+
+
+def role_faction(role: str) -> str:
+    """
+    获取角色所属阵营
+    
+    新增角色时必须在 ROLE_FACTIONS 中登记，否则存活计数会漏掉该角色、悄悄改变胜负判定，
+    因此未登记的角色直接报错。
+    
+    Args:
+        role: 角色名称
+    
+    Returns:
+        阵营（werewolves / villagers / gods）
+    
+    Raises:
+        ValueError: 角色未在 ROLE_FACTIONS 中登记
+    """
+    try:
+        return ROLE_FACTIONS[role]
+    except KeyError:
+        raise ValueError(f"未知角色 {role!r}：请在 ROLE_FACTIONS 中登记其阵营") from None
+
+
+def count_alive(players: Iterable[Player]) -> Dict[str, int]:
+    """
+    统计各阵营存活人数（完整扫描，用于初始化）
+    
+    Args:
+        players: 玩家列表
+    
+    Returns:
+        {"werewolves": 狼人数, "villagers": 村民数, "gods": 神职数}
+    
+    Raises:
+        ValueError: 存在未登记阵营的角色
+    """
+    counts = {"werewolves": 0, "villagers": 0, "gods": 0}
+    for p in players:
+        faction = role_faction(p.role)
+        if p.is_alive:
+            counts[faction] += 1
+    return counts
+
+
+def alive_counts(state: Dict[str, Any]) -> Dict[str, int]:
+    """
+    获取各阵营存活人数（O(1)，状态中没有计数时按玩家列表统计）
+    
+    Args:
+        state: 游戏状态
+    
+    Returns:
+        {"werewolves": 狼人数, "villagers": 村民数, "gods": 神职数}
+    """
+    counts = state.get("alive_counts")
+    if counts is None:
+        counts = count_alive(state.get("players", []))
+    return counts
+
+
+def record_deaths(state: Dict[str, Any], dead_players: Iterable[Player]) -> Dict[str, int]:
+    """
+    按出局玩家增量更新各阵营存活人数
+    
+    Args:
+        state: 游戏状态（出局前）
+        dead_players: 本次出局的玩家（出局前的记录，None 和已出局的玩家会被忽略）
+    
+    Returns:
+        新的存活计数（不修改状态中的原计数）
+    
+    Raises:
+        ValueError: 出局玩家的角色未登记阵营
+    """
+    counts = dict(alive_counts(state))
+    for p in dead_players:
+        if p is not None and p.is_alive:
+            counts[role_faction(p.role)] -= 1
+    return counts
+
+
+def update_player(state: Dict[str, Any], player_id: int, **changes: Any) -> Dict[str, Any]:
+    """
+    修改一名玩家，生成对应的状态更新
+    
+    只复制被修改的玩家记录（model_copy，不重新校验），新的玩家列表与原列表共享其余记录；
+    玩家索引和各阵营存活人数随之增量更新。连续修改多名玩家时，
+    把上一次的更新合并到状态上再调用（如 update_player({**state, **updates}, ...)）。
+    
+    Args:
+        state: 游戏状态
+        player_id: 玩家ID
+        changes: 要修改的字段（如 is_alive=False、is_sheriff=True）
+    
+    Returns:
+        {"players": ..., "player_index": ..., "alive_counts": ...}（玩家不存在时为空字典）
+    """
+    index = player_index(state)
+    old = index.get(player_id)
+    if old is None:
+        return {}
+    new = old.model_copy(update=changes)
+    players = list(index.players)
+    players[index.positions[player_id]] = new
+    
+    return {
+        "players": players,
+        "player_index": index.replace(players, old, new),
+        "alive_counts": record_deaths(state, [old]) if old.is_alive and not new.is_alive else alive_counts(state),
+    }
+
+
+def get_player(state: Dict[str, Any], player_id: Optional[int]) -> Optional[Player]:
+    """按ID查找玩家"""
+    return player_index(state).get(player_id)
+
+
+def get_alive_player(state: Dict[str, Any], player_id: Optional[int]) -> Optional[Player]:
+    """按ID查找存活玩家"""
+    return player_index(state).get_alive(player_id)
+
+
+def alive_players(state: Dict[str, Any]) -> List[Player]:
+    """存活玩家列表（按座位顺序）"""
+    return player_index(state).alive()
+
+
+def alive_with_role(state: Dict[str, Any], *roles: str) -> List[Player]:
+    """指定角色的存活玩家列表"""
+    return player_index(state).with_role(*roles)
+
+
+def get_sheriff(state: Dict[str, Any]) -> Optional[Player]:
+    """当前警长"""
+    return player_index(state).sheriff()
+
+
 class GameState(TypedDict):
     """游戏全局状态"""
+    game_id: str  # 游戏ID（用于关联本局的 Agent 名册等运行期资源）
     players: List[Player]
+    player_index: PlayerIndex  # 玩家索引（随 players 一起更新，见 players_update）
+    alive_counts: Dict[str, int]  # 各阵营存活人数 {"werewolves": ..., "villagers": ..., "gods": ...}（出局时增量更新，见 record_deaths）
     current_phase: Literal["day", "night"]
     round_number: int
     day_number: int
     game_status: Literal["playing", "ended"]
     winner: Optional[str]
     public_info: Dict[str, Any]
-    werewolf_channel: Dict[str, Any]
-    history: Annotated[List[Dict[str, Any]], operator.add]  # 允许多个节点追加历史记录
+    werewolf_channel: Annotated[Dict[str, Any], merge_dict]  # 狼人频道 {"night_N": [...]}（节点只返回新增的夜晚）
+    history: Annotated[GameHistory, append_history]  # 只追加的历史事件日志（节点返回新增记录列表，较早的记录写入磁盘）
     # 投票相关
     votes: Dict[int, int]  # {voter_id: target_id}
     vote_results: Dict[int, int]  # {target_id: vote_count}
-    # 发言相关
-    discussions: List[Dict[str, Any]]  # 发言记录
+    # 发言相关（发言内容记录在 history 的 discussion 记录中）
     current_speaker: Optional[int]  # 当前发言玩家ID
     # 夜晚行动相关
     night_actions: Dict[str, Dict[str, Any]]  # {role: {agent_id: target_id}}
@@ -50,7 +355,7 @@ class GameState(TypedDict):
     sheriff_withdrawn: List[int]  # 退水的玩家ID列表
     sheriff_transfer: Optional[Dict[str, Any]]  # 警长移交信息 {from_id: int, to_id: Optional[int], destroyed: bool}
     # 角色特殊能力相关
-    seer_checks: Dict[int, str]  # 预言家查验结果 {target_id: "好人" 或 "狼人"}
+    seer_checks: Annotated[Dict[int, str], merge_dict]  # 预言家查验结果 {target_id: "好人" 或 "狼人"}（节点只返回新增结果）
     witch_antidote_used: bool  # 女巫解药是否已使用
     witch_poison_used: bool  # 女巫毒药是否已使用
     guard_protected: Optional[int]  # 守卫守护的玩家ID（上一晚）
@@ -58,10 +363,16 @@ class GameState(TypedDict):
     # 自爆相关
     self_exploded: Optional[int]  # 自爆的玩家ID
     # 遗言相关
-    last_words: Dict[int, str]  # 遗言 {player_id: last_word}
+    last_words: Annotated[Dict[int, str], merge_dict]  # 遗言 {player_id: last_word}（节点只返回新增遗言）
     # 初始角色统计（用于游戏结束判定）
     initial_gods_count: int  # 初始神职数量
     initial_villagers_count: int  # 初始村民数量
+    # 运行配置
+    parallel_voting: bool  # 是否并行收集投票（放逐投票、警长投票）
+    vote_concurrency: int  # 并行投票的最大并发数（0 表示不限制）
+    pacing: Dict[str, Any]  # 发言节奏配置（见 utils.pacing.make_pacing）
+    stream_speech: bool  # 是否流式输出发言（边生成边显示）
+    seed: Optional[int]  # 本局随机种子（流程中的随机选择使用本局独立的随机数生成器）
 
 
 class StateManager:
@@ -70,10 +381,36 @@ class StateManager:
     def __init__(self):
         self.state: Optional[GameState] = None
     
-    def init_state(self, players: List[Player], max_rounds: int = 20) -> GameState:
-        """初始化游戏状态"""
+    def init_state(
+        self,
+        players: List[Player],
+        max_rounds: int = 20,
+        parallel_voting: bool = False,
+        vote_concurrency: int = 0,
+        pacing: Optional[Dict[str, Any]] = None,
+        stream_speech: bool = False,
+        seed: Optional[int] = None,
+        history_window: int = DEFAULT_HISTORY_WINDOW
+    ) -> GameState:
+        """
+        初始化游戏状态
+        
+        Args:
+            players: 玩家列表
+            max_rounds: 最大轮次限制
+            parallel_voting: 是否并行收集投票（输出与顺序投票一致）
+            vote_concurrency: 并行投票的最大并发数（0 表示不限制）
+            pacing: 发言节奏配置（见 utils.pacing.make_pacing，默认每次发言后停顿 0.1 秒；
+                    批量模拟可使用 make_pacing("turbo") 去掉停顿）
+            stream_speech: 是否流式输出发言（边生成边显示，并记录每位发言者的首字延迟）
+            seed: 本局随机种子（竞选、发言顺序、平票等随机选择可复现；为 None 时不固定）
+            history_window: 内存中最多保留的历史记录条数（更早的记录写入临时文件）
+        """
         self.state = {
+            "game_id": uuid.uuid4().hex,
             "players": players,
+            "player_index": PlayerIndex(players),
+            "alive_counts": count_alive(players),
             "current_phase": "day",
             "round_number": 1,
             "day_number": 1,
@@ -81,10 +418,9 @@ class StateManager:
             "winner": None,
             "public_info": {},
             "werewolf_channel": {},
-            "history": [],
+            "history": GameHistory(window=history_window),
             "votes": {},
             "vote_results": {},
-            "discussions": [],
             "current_speaker": None,
             "night_actions": {},
             "max_rounds": max_rounds,
@@ -107,6 +443,11 @@ class StateManager:
             # 记录初始角色统计
             "initial_gods_count": len([p for p in players if p.role in ["seer", "witch", "guard"]]),
             "initial_villagers_count": len([p for p in players if p.role == "villager"]),
+            "parallel_voting": parallel_voting,
+            "vote_concurrency": vote_concurrency,
+            "pacing": pacing if pacing is not None else make_pacing(),
+            "stream_speech": stream_speech,
+            "seed": seed,
         }
         return self.state
     
@@ -115,6 +456,10 @@ class StateManager:
         if self.state is None:
             raise ValueError("State not initialized")
         self.state.update(updates)
+        if "players" in updates and "player_index" not in updates:
+            self.state["player_index"] = PlayerIndex(self.state["players"])
+        if "players" in updates and "alive_counts" not in updates:
+            self.state["alive_counts"] = count_alive(self.state["players"])
         return self.state
     
     def get_state(self) -> Optional[GameState]:
@@ -0,0 +1,246 @@
+"""
+游戏历史：只追加的事件日志
+
+历史记录按类型区分（entry["type"]）：
+- night_action: 夜晚行动 {day, actions, killed, guard_protected}
+- discussion: 白天发言 {day, discussions: [{player_id, player_name, content}]}
+- exile_voting: 放逐投票 {day, votes, vote_results, eliminated, tie, tie_vote_round}
+- self_explode: 狼人自爆 {day, player_id, player_name, role}
+- game_end: 游戏结束 {winner, day, round, alive_werewolves, alive_villagers, alive_gods}
+
+日志只在内存中保留最近的一段记录（供 prompt 构建使用），更早的记录写入临时文件，
+长对局或大量并发对局的内存占用不随历史增长。每个状态快照是日志的一个前缀视图，
+追加记录只生成新的视图，不影响已有快照。
+"""
+import pickle
+import tempfile
+import threading
+from collections.abc import Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Literal, Optional, Tuple
+
+HistoryEntryType = Literal["night_action", "discussion", "exile_voting", "self_explode", "game_end"]
+
+# 内存中最多保留的历史记录条数（更早的记录写入磁盘）
+DEFAULT_HISTORY_WINDOW = 256
+
+
+class _EventLog:
+    """历史记录的存储：内存中的尾部 + 磁盘上的更早记录"""
+
+    def __init__(self, window: int, spill_dir: Optional[str] = None):
+        self.window = max(1, window)
+        self.spill_dir = spill_dir
+        self.tail: List[Dict[str, Any]] = []
+        self.spilled = 0  # 已写入磁盘的记录数（即内存尾部第一条记录的序号）
+        self.offsets: List[int] = []  # 磁盘上每条记录的起始位置
+        self.file = None  # 匿名临时文件，对象回收时自动删除
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.spilled + len(self.tail)
+
+    def append(self, entries: Iterable[Dict[str, Any]]) -> None:
+        """追加记录，内存尾部超过窗口时把更早的记录写入磁盘"""
+        self.tail.extend(entries)
+        overflow = len(self.tail) - self.window
+        if overflow > 0:
+            self._spill(overflow)
+
+    def _spill(self, count: int) -> None:
+        with self.lock:
+            if self.file is None:
+                self.file = tempfile.TemporaryFile(prefix="werewolf-history-", dir=self.spill_dir)
+            self.file.seek(0, 2)
+            for entry in self.tail[:count]:
+                self.offsets.append(self.file.tell())
+                self.file.write(pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL))
+            self.file.flush()
+        del self.tail[:count]
+        self.spilled += count
+
+    def get(self, position: int) -> Dict[str, Any]:
+        """按序号读取一条记录"""
+        if position >= self.spilled:
+            return self.tail[position - self.spilled]
+        with self.lock:
+            self.file.seek(self.offsets[position])
+            return pickle.load(self.file)
+
+    def snapshot(self, end: int) -> Tuple[bytes, List[int], List[Dict[str, Any]]]:
+        """
+        导出前 end 条记录：磁盘记录的原始字节、各记录的起始位置和内存中的尾部
+
+        Args:
+            end: 导出的记录条数
+
+        Returns:
+            (磁盘字节, 起始位置列表, 尾部记录)
+        """
+        spilled = min(end, self.spilled)
+        data = b""
+        if spilled:
+            with self.lock:
+                stop = self.offsets[spilled] if spilled < self.spilled else self.file.seek(0, 2)
+                self.file.seek(0)
+                data = self.file.read(stop)
+        return data, self.offsets[:spilled], self.tail[:max(0, end - self.spilled)]
+
+    @classmethod
+    def restore(
+        cls,
+        window: int,
+        data: bytes,
+        offsets: List[int],
+        tail: List[Dict[str, Any]]
+    ) -> "_EventLog":
+        """从 snapshot() 导出的内容重建日志（磁盘记录直接写回临时文件，不逐条反序列化）"""
+        log = cls(window)
+        if offsets:
+            log.file = tempfile.TemporaryFile(prefix="werewolf-history-")
+            log.file.write(data)
+            log.file.flush()
+            log.offsets = list(offsets)
+            log.spilled = len(offsets)
+        log.append(tail)
+        return log
+
+
+class GameHistory(Sequence):
+    """
+    游戏历史记录（只追加的事件日志的前缀视图）
+
+    用法与列表一致（len、下标、切片、迭代、reversed），最近的记录直接从内存读取，
+    更早的记录按需从磁盘读取。作为 GameState.history 的 reducer 使用时，
+    节点仍然只返回本步新增的记录列表。
+    """
+
+    __slots__ = ("_log", "_end")
+
+    def __init__(
+        self,
+        entries: Iterable[Dict[str, Any]] = (),
+        window: int = DEFAULT_HISTORY_WINDOW,
+        spill_dir: Optional[str] = None
+    ):
+        """
+        创建历史记录
+
+        Args:
+            entries: 初始记录
+            window: 内存中最多保留的记录条数（更早的记录写入磁盘）
+            spill_dir: 磁盘记录文件所在目录（默认系统临时目录）
+        """
+        self._log = _EventLog(window, spill_dir)
+        self._log.append(entries)
+        self._end = len(self._log)
+
+    @property
+    def window(self) -> int:
+        """内存中最多保留的记录条数"""
+        return self._log.window
+
+    @property
+    def in_memory(self) -> int:
+        """当前保存在内存中的记录条数"""
+        return len(self._log.tail)
+
+    def extend(self, entries: Iterable[Dict[str, Any]]) -> "GameHistory":
+        """
+        追加记录，返回新的视图（原视图不变）
+
+        Args:
+            entries: 新增的记录
+
+        Returns:
+            包含新增记录的历史视图
+        """
+        entries = list(entries)
+        if not entries:
+            return self
+        if self._end == len(self._log):
+            log = self._log
+        else:
+            # 从较早的快照继续追加（分支）：复制该快照的记录到新日志
+            log = GameHistory(self, self._log.window, self._log.spill_dir)._log
+        log.append(entries)
+        view = GameHistory.__new__(GameHistory)
+        view._log = log
+        view._end = len(log)
+        return view
+
+    def tail(self, count: int) -> List[Dict[str, Any]]:
+        """最近的 count 条记录（按时间顺序）"""
+        return [self._log.get(i) for i in range(max(0, self._end - count), self._end)]
+
+    def __len__(self) -> int:
+        return self._end
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self._log.get(i) for i in range(*item.indices(self._end))]
+        if item < 0:
+            item += self._end
+        if not 0 <= item < self._end:
+            raise IndexError("history index out of range")
+        return self._log.get(item)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(self._end):
+            yield self._log.get(i)
+
+    def __reversed__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(self._end - 1, -1, -1):
+            yield self._log.get(i)
+
+    def __add__(self, other: Iterable[Dict[str, Any]]) -> "GameHistory":
+        return self.extend(other)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, Sequence) and not isinstance(other, (str, bytes)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    # 与列表一样按内容比较，因此不可哈希
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"GameHistory(len={self._end}, in_memory={self.in_memory})"
+
+    def __reduce__(self):
+        # 序列化（检查点、跨进程传递）时只复制磁盘记录的字节和内存尾部，不逐条展开
+        return (_restore_history, (self._log.window, *self._log.snapshot(self._end)))
+
+
+def _restore_history(
+    window: int,
+    data: bytes,
+    offsets: List[int],
+    tail: List[Dict[str, Any]]
+) -> GameHistory:
+    """反序列化 GameHistory（见 GameHistory.__reduce__）"""
+    view = GameHistory.__new__(GameHistory)
+    view._log = _EventLog.restore(window, data, offsets, tail)
+    view._end = len(view._log)
+    return view
+
+
+def append_history(
+    current: Sequence,
+    new: Iterable[Dict[str, Any]]
+) -> GameHistory:
+    """
+    GameState.history 的 reducer：把节点返回的新记录追加到事件日志
+
+    Args:
+        current: 当前历史（GameHistory，或图初始化时的空列表）
+        new: 新增的记录（列表或 GameHistory）
+
+    Returns:
+        追加后的历史视图
+    """
+    if isinstance(new, GameHistory) and not current:
+        # 图初始化：直接使用初始状态中的历史（保留其窗口配置）
+        return new
+    if isinstance(current, GameHistory):
+        return current.extend(new)
+    return GameHistory([*current, *new])
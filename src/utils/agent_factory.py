@@ -6,7 +6,7 @@ from ..agents.base_agent import BaseAgent
 from ..agents.villager import VillagerAgent
 from ..agents.werewolf import WerewolfAgent
 from ..agents.roles import SeerAgent, WitchAgent, GuardAgent
-from ..utils.llm_client import LLMClient
+from ..utils.llm_client import LLMClient, get_llm_client
 
 
 def create_agent_by_role(
@@ -22,13 +22,13 @@ def create_agent_by_role(
         agent_id: Agent ID
         name: Agent 名称
         role: 角色名称
-        llm_client: LLM 客户端
+        llm_client: LLM 客户端（如果为 None，则使用注册表中共享的默认客户端，由 LLM_PROVIDER 决定）
     
     Returns:
         对应的 Agent 实例
     """
     if llm_client is None:
-        llm_client = LLMClient(provider="deepseek")
+        llm_client = get_llm_client()
     
     role_map = {
         "villager": VillagerAgent,
@@ -0,0 +1,128 @@
+"""
+每局游戏的 Agent 名册：身份分配后创建一次，各节点按 player_id 查找
+"""
+import random
+import threading
+from typing import Dict, List, Optional
+from ..agents.base_agent import BaseAgent
+from ..utils.agent_factory import create_agent_by_role
+from ..utils.llm_client import LLMClient
+
+
+class AgentRoster:
+    """
+    一局游戏的 Agent 名册
+
+    Agent 在首次查找时创建，之后整局游戏保持同一个实例，因此角色的私有状态
+    （如预言家查验历史、女巫用药情况、狼人队友）可以跨阶段保留。
+    """
+
+    def __init__(self, players: list, llm_client: Optional[LLMClient] = None, seed: Optional[int] = None):
+        """
+        初始化名册
+
+        Args:
+            players: 玩家列表（已分配身份）
+            llm_client: LLM 客户端（如果为 None，则使用注册表中共享的客户端）
+            seed: 本局随机种子（为 None 时不固定）
+        """
+        self.llm_client = llm_client
+        # 本局独立的随机数生成器：同一进程中并发运行多局时，各局的随机选择互不干扰
+        self.rng = random.Random(seed)
+        self.agents: Dict[int, BaseAgent] = {}
+        self.werewolf_team: List[int] = [p.player_id for p in players if p.role == "werewolf"]
+
+    def get(self, player) -> BaseAgent:
+        """
+        获取玩家对应的 Agent
+
+        Args:
+            player: Player 对象
+
+        Returns:
+            该玩家的 Agent（首次查找或身份不一致时创建）
+        """
+        agent = self.agents.get(player.player_id)
+        if agent is None or agent.role != player.role:
+            agent = create_agent_by_role(
+                agent_id=player.player_id,
+                name=player.name,
+                role=player.role,
+                llm_client=self.llm_client
+            )
+            # 兜底随机选择也使用本局的随机数生成器
+            agent.rng = self.rng
+            if agent.role == "werewolf":
+                agent.werewolf_team = list(self.werewolf_team)
+            self.agents[player.player_id] = agent
+        return agent
+
+    def __contains__(self, player_id: int) -> bool:
+        return player_id in self.agents
+
+    def __len__(self) -> int:
+        return len(self.agents)
+
+
+# 进程级名册表：game_id -> AgentRoster
+_rosters: Dict[str, AgentRoster] = {}
+_rosters_lock = threading.Lock()
+
+
+def build_roster(
+    game_id: Optional[str],
+    players: List,
+    llm_client: Optional[LLMClient] = None,
+    seed: Optional[int] = None
+) -> AgentRoster:
+    """
+    为一局游戏创建 Agent 名册并登记
+
+    Args:
+        game_id: 游戏ID（为 None 时不登记，只返回临时名册）
+        players: 玩家列表（已分配身份）
+        llm_client: LLM 客户端
+        seed: 本局随机种子
+
+    Returns:
+        新建的名册
+    """
+    roster = AgentRoster(players, llm_client, seed)
+    if game_id is not None:
+        with _rosters_lock:
+            _rosters[game_id] = roster
+    return roster
+
+
+def get_roster(state) -> AgentRoster:
+    """
+    获取当前游戏的 Agent 名册
+
+    如果名册尚未创建（例如直接调用节点而未经过身份分配），则按当前玩家列表创建。
+
+    Args:
+        state: 游戏状态
+
+    Returns:
+        当前游戏的名册
+    """
+    game_id = state.get("game_id")
+    if game_id is not None:
+        with _rosters_lock:
+            roster = _rosters.get(game_id)
+        if roster is not None:
+            return roster
+    return build_roster(game_id, state.get("players", []), seed=state.get("seed"))
+
+
+def release_roster(game_id: Optional[str]) -> None:
+    """
+    游戏结束后释放名册
+
+    判定节点在正常结束时调用；对局出错或被取消时由 run_game / stream_game 调用，
+    直接调用 graph.ainvoke 的代码需要在 finally 中自行调用。
+    """
+    if game_id is None:
+        return
+    with _rosters_lock:
+        _rosters.pop(game_id, None)
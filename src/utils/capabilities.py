@@ -0,0 +1,118 @@
+"""
+各 LLM 提供商的结构化输出能力：工具调用、JSON Mode（response_format=json_object）或纯 prompt 约束
+
+优先使用最可靠的方式；如果服务端拒绝（例如不支持 response_format），自动降级到下一种方式并记住。
+"""
+import os
+import threading
+from typing import Dict, Literal, Optional, Tuple
+
+StructuredMode = Literal["tool_calling", "json_mode", "prompt"]
+
+# 从最可靠到最不可靠
+STRUCTURED_MODES: Tuple[str, ...] = ("tool_calling", "json_mode", "prompt")
+
+# 各提供商的默认方式
+DEFAULT_STRUCTURED_MODES: Dict[str, str] = {
+    "openai": "tool_calling",
+    "deepseek": "json_mode",
+    "local": "prompt",
+}
+
+# 服务端拒绝某种方式时返回的状态码（参数不支持）
+UNSUPPORTED_STATUS_CODES = {400, 422}
+
+# 各结构化输出方式使用的请求参数：错误信息指明这些参数时，才认为是该方式本身不被支持
+# （同样返回 400 的上下文超长、内容审核、"temperature not supported" 等不能触发降级）
+MODE_PARAMETERS: Dict[str, Tuple[str, ...]] = {
+    "tool_calling": ("tools", "tool_choice"),
+    "json_mode": ("response_format",),
+}
+
+_modes: Dict[Tuple[str, Optional[str]], str] = {}
+_modes_lock = threading.Lock()
+
+
+def configure_structured_mode(provider: str, mode: StructuredMode, model: Optional[str] = None) -> None:
+    """
+    为提供商（或某个模型）指定结构化输出方式
+
+    Args:
+        provider: LLM 提供商
+        mode: tool_calling / json_mode / prompt
+        model: 模型名称（为 None 时对该提供商的所有模型生效）
+    """
+    if mode not in STRUCTURED_MODES:
+        raise ValueError(f"Unknown structured mode: {mode}")
+    with _modes_lock:
+        _modes[(provider, model)] = mode
+
+
+def get_structured_mode(provider: str, model: Optional[str] = None) -> str:
+    """
+    获取结构化输出方式
+
+    优先级：按模型配置 > 按提供商配置 > 环境变量 LLM_STRUCTURED_MODE > 提供商默认值
+    """
+    with _modes_lock:
+        mode = _modes.get((provider, model)) or _modes.get((provider, None))
+    if mode:
+        return mode
+    env_mode = os.getenv("LLM_STRUCTURED_MODE")
+    if env_mode in STRUCTURED_MODES:
+        return env_mode
+    return DEFAULT_STRUCTURED_MODES.get(provider, "prompt")
+
+
+def downgrade_structured_mode(provider: str, model: Optional[str], mode: str) -> Optional[str]:
+    """
+    服务端不支持某种方式时降级到下一种，并记住该模型的能力
+
+    Args:
+        provider: LLM 提供商
+        model: 模型名称
+        mode: 被拒绝的方式
+
+    Returns:
+        降级后的方式（已经是 prompt 时返回 None）
+    """
+    index = STRUCTURED_MODES.index(mode)
+    if index + 1 >= len(STRUCTURED_MODES):
+        return None
+    fallback = STRUCTURED_MODES[index + 1]
+    with _modes_lock:
+        _modes[(provider, model)] = fallback
+    return fallback
+
+
+def is_unsupported_error(error: BaseException, mode: Optional[str] = None) -> bool:
+    """
+    判断异常是否表示服务端不支持请求中的结构化输出参数
+
+    只有状态码为 400 / 422，且错误信息指明该方式使用的参数（response_format / tools / tool_choice）时才返回 True；
+    降级会被记住并影响该模型之后的所有调用，其他原因的请求错误不能触发。
+
+    Args:
+        error: 请求异常
+        mode: 被拒绝请求使用的结构化输出方式（为 None 时检查所有方式的参数）
+
+    Returns:
+        是否应该降级
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status not in UNSUPPORTED_STATUS_CODES:
+        return False
+    text = f"{error} {getattr(error, 'body', None) or ''}".lower()
+    if mode is None:
+        parameters = [name for names in MODE_PARAMETERS.values() for name in names]
+    else:
+        parameters = MODE_PARAMETERS.get(mode, ())
+    return any(name in text for name in parameters)
+
+
+def clear_structured_modes() -> None:
+    """清空已配置和已探测的结构化输出方式（主要用于测试）"""
+    with _modes_lock:
+        _modes.clear()
@@ -0,0 +1,172 @@
+"""
+结构化日志：所有日志先进入内存队列，由后台线程写到控制台或 JSON Lines 文件
+
+游戏流程和 Agent 中不直接做同步的 stdout 写入；每条日志自动带上当前对局的
+game_id、day、phase（节点名），大量对局并发运行时也能按局区分。
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from typing import Any, Dict, Optional, TextIO
+from .telemetry import current_context
+
+LOGGER_NAME = "cyber_werewolf"
+
+# 每条日志都带上的上下文字段
+CONTEXT_FIELDS = ("game_id", "day", "phase", "agent_id")
+
+# LogRecord 自带的属性（其余属性视为 extra 字段写入 JSON）
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def get_logger(name: Optional[str] = None) -> logging.Logger:
+    """
+    获取项目日志器
+
+    Args:
+        name: 模块名（通常传 __name__，会去掉开头的 "src."）
+
+    Returns:
+        cyber_werewolf 下的子日志器
+    """
+    if not name:
+        return logging.getLogger(LOGGER_NAME)
+    if name.startswith("src."):
+        name = name[len("src."):]
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+class ContextFilter(logging.Filter):
+    """把当前调用上下文（game_id / day / phase / agent_id）写入日志记录（已通过 extra 指定的字段不覆盖）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = current_context()
+        context.setdefault("phase", context.get("node"))
+        for field in CONTEXT_FIELDS:
+            if not hasattr(record, field):
+                setattr(record, field, context.get(field))
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """JSON Lines 格式：时间、级别、日志器、消息、上下文字段和 extra 字段"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _LoggingRuntime:
+    """当前生效的日志配置（队列 + 后台写入线程）"""
+
+    def __init__(self, listener: logging.handlers.QueueListener, handler: logging.Handler):
+        self.listener = listener
+        self.handler = handler
+
+    def stop(self) -> None:
+        """写完队列中剩余的日志，停止后台线程并关闭输出"""
+        logging.getLogger(LOGGER_NAME).removeHandler(self.handler)
+        self.listener.stop()
+        for handler in self.listener.handlers:
+            handler.close()
+
+
+_runtime: Optional[_LoggingRuntime] = None
+_runtime_lock = threading.Lock()
+
+
+def configure_logging(
+    level: str = "INFO",
+    quiet: bool = False,
+    console: bool = True,
+    json_path: Optional[str] = None,
+    stream: Optional[TextIO] = None
+) -> logging.Logger:
+    """
+    配置项目日志（可重复调用，新配置替换旧配置）
+
+    日志记录只做 put_nowait 放入无界队列，格式化和写入都在后台线程中完成。
+
+    Args:
+        level: 日志级别（写入 JSON 文件的级别）
+        quiet: 安静模式（控制台只输出警告和错误）
+        console: 是否输出到控制台（只输出消息文本，即对局的可读过程）
+        json_path: JSON Lines 日志文件路径（为 None 时不写文件）
+        stream: 控制台输出流（默认 sys.stdout）
+
+    Returns:
+        项目根日志器
+    """
+    global _runtime
+    handlers = []
+    if console:
+        console_handler = logging.StreamHandler(stream or sys.stdout)
+        console_handler.setFormatter(logging.Formatter("%(message)s"))
+        console_handler.setLevel(logging.WARNING if quiet else logging.INFO)
+        # 没有展示文本的事件（如无人被守卫挡刀的夜晚结果）只写入 JSON 日志
+        console_handler.addFilter(lambda record: bool(record.getMessage()))
+        handlers.append(console_handler)
+    if json_path:
+        file_handler = logging.FileHandler(json_path, encoding="utf-8")
+        file_handler.setFormatter(JsonFormatter())
+        file_handler.setLevel(level)
+        handlers.append(file_handler)
+
+    log_queue: queue.Queue = queue.Queue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # 上下文在发出日志的协程中读取，必须在入队之前补齐
+    queue_handler.addFilter(ContextFilter())
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+
+    logger = logging.getLogger(LOGGER_NAME)
+    with _runtime_lock:
+        if _runtime is not None:
+            _runtime.stop()
+        levels = [h.level for h in handlers] or [logging.WARNING]
+        logger.setLevel(min(levels))
+        logger.addHandler(queue_handler)
+        logger.propagate = False
+        listener.start()
+        _runtime = _LoggingRuntime(listener, queue_handler)
+    return logger
+
+
+def configure_logging_from_env() -> logging.Logger:
+    """
+    按环境变量配置日志
+
+    LOG_LEVEL（默认 INFO）、LOG_QUIET=1 安静模式、LOG_FILE JSON Lines 日志文件
+    """
+    return configure_logging(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        quiet=os.getenv("LOG_QUIET", "0").lower() in ("1", "true", "yes"),
+        json_path=os.getenv("LOG_FILE") or None,
+    )
+
+
+def shutdown_logging() -> None:
+    """停止后台写入线程（会先写完队列中剩余的日志）"""
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            return
+        _runtime.stop()
+        _runtime = None
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,207 @@
+"""
+对冲请求：慢请求超过近期延迟的某个分位数后，再发一个相同请求，取先返回的结果
+
+用于压缩长尾延迟（发言等串行节点位于关键路径上，一次慢请求会拖慢整局游戏）。
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+from .telemetry import percentile
+
+
+class HedgingPolicy:
+    """
+    对冲策略
+
+    按决策类型记录近期延迟；请求耗时超过 percentile 分位数时发出对冲请求。
+    对冲请求数不超过总请求数的 max_extra_ratio（额外请求预算）。
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        window: int = 200,
+        min_samples: int = 20,
+        min_delay: float = 0.05,
+        max_extra_ratio: float = 0.1
+    ):
+        """
+        初始化对冲策略
+
+        Args:
+            percentile: 触发对冲的延迟分位数（0-100）
+            window: 每种决策类型保留的近期延迟样本数
+            min_samples: 样本数不足时不对冲
+            min_delay: 最小对冲等待时间（秒）
+            max_extra_ratio: 对冲请求占总请求数的上限
+        """
+        self.percentile = percentile
+        self.window = window
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_extra_ratio = max_extra_ratio
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "hedges": 0, "hedge_wins": 0, "primary_wins": 0, "skipped_budget": 0}
+        self._stats_by_decision: Dict[str, Dict[str, int]] = {}
+
+    def observe(self, decision_type: str, latency: float) -> None:
+        """记录一次请求延迟"""
+        with self._lock:
+            samples = self._latencies.get(decision_type)
+            if samples is None:
+                samples = self._latencies[decision_type] = deque(maxlen=self.window)
+            samples.append(latency)
+
+    def hedge_delay(self, decision_type: str) -> Optional[float]:
+        """
+        计算对冲等待时间
+
+        Returns:
+            等待秒数，样本不足时返回 None（不对冲）
+        """
+        with self._lock:
+            samples = list(self._latencies.get(decision_type, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return max(self.min_delay, percentile(samples, self.percentile))
+
+    def _count(self, decision_type: str, name: str) -> None:
+        self._stats[name] += 1
+        counters = self._stats_by_decision.setdefault(
+            decision_type, {key: 0 for key in self._stats}
+        )
+        counters[name] += 1
+
+    def _try_spend_budget(self, decision_type: str) -> bool:
+        with self._lock:
+            if self._stats["hedges"] + 1 > self._stats["requests"] * self.max_extra_ratio:
+                self._count(decision_type, "skipped_budget")
+                return False
+            self._count(decision_type, "hedges")
+            return True
+
+    async def run(
+        self,
+        decision_type: str,
+        request: Callable[[], Awaitable[Any]],
+        before_hedge: Optional[Callable[[], Awaitable[Any]]] = None
+    ) -> Any:
+        """
+        执行请求（必要时对冲）
+
+        Args:
+            decision_type: 决策类型
+            request: 发起一次请求的协程工厂（主请求和对冲请求各调用一次）
+            before_hedge: 发出对冲请求前执行的协程工厂（例如向限流器申请配额）
+
+        Returns:
+            先成功返回的请求结果
+        """
+        with self._lock:
+            self._count(decision_type, "requests")
+        delay = self.hedge_delay(decision_type)
+        started = time.perf_counter()
+        primary = asyncio.ensure_future(request())
+        tasks = [primary]
+        try:
+            if delay is None:
+                result = await primary
+                self.observe(decision_type, time.perf_counter() - started)
+                return result
+
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not self._try_spend_budget(decision_type):
+                result = await primary
+                self.observe(decision_type, time.perf_counter() - started)
+                return result
+
+            async def hedged_request():
+                if before_hedge is not None:
+                    await before_hedge()
+                return await request()
+
+            hedge = asyncio.ensure_future(hedged_request())
+            tasks.append(hedge)
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                succeeded = [task for task in done if task.exception() is None]
+                if not succeeded:
+                    # 两个请求都失败时抛出主请求的异常
+                    if not pending:
+                        raise (primary if primary in done else hedge).exception()
+                    continue
+                winner = primary if primary in succeeded else succeeded[0]
+                with self._lock:
+                    self._count(decision_type, "hedge_wins" if winner is hedge else "primary_wins")
+                # 主请求被取消时，已等待的时间是其延迟的下界
+                self.observe(decision_type, time.perf_counter() - started)
+                return winner.result()
+        finally:
+            # 调用方被取消或超时时，不留下仍在运行的请求
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取对冲统计
+
+        Returns:
+            {"requests", "hedges", "hedge_wins", "primary_wins", "skipped_budget", "by_decision": {...}}
+        """
+        with self._lock:
+            return dict(
+                self._stats,
+                by_decision={k: dict(v) for k, v in self._stats_by_decision.items()}
+            )
+
+
+# 进程级对冲策略（默认关闭，通过 configure_hedging 或环境变量 LLM_HEDGE_PERCENTILE 开启）
+_policy: Optional[HedgingPolicy] = None
+_policy_configured = False
+_policy_lock = threading.Lock()
+
+
+def configure_hedging(enabled: bool = True, **kwargs) -> Optional[HedgingPolicy]:
+    """
+    配置进程级对冲策略
+
+    Args:
+        enabled: 是否开启
+        **kwargs: 传给 HedgingPolicy 的参数
+
+    Returns:
+        新的对冲策略（关闭时返回 None）
+    """
+    global _policy, _policy_configured
+    with _policy_lock:
+        _policy = HedgingPolicy(**kwargs) if enabled else None
+        _policy_configured = True
+        return _policy
+
+
+def get_hedging_policy() -> Optional[HedgingPolicy]:
+    """
+    获取进程级对冲策略
+
+    首次调用时读取环境变量：LLM_HEDGE_PERCENTILE（如 95）开启对冲，
+    LLM_HEDGE_BUDGET 指定额外请求预算比例（默认 0.1）。
+    """
+    global _policy, _policy_configured
+    if _policy_configured:
+        return _policy
+    with _policy_lock:
+        if not _policy_configured:
+            pct = float(os.getenv("LLM_HEDGE_PERCENTILE", "0"))
+            if pct > 0:
+                _policy = HedgingPolicy(
+                    percentile=pct,
+                    max_extra_ratio=float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))
+                )
+            _policy_configured = True
+    return _policy
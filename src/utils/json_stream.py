@@ -0,0 +1,85 @@
+"""
+从流式返回的不完整 JSON 中增量提取某个字符串字段（如发言的 content）
+"""
+import json
+import re
+from typing import Optional
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class PartialFieldExtractor:
+    """
+    增量提取 JSON 字符串字段
+
+    每次 feed 一段新到达的文本，返回该字段新增的已解码内容；
+    字段出现之前、字段结束之后都返回空字符串。
+    """
+
+    def __init__(self, field: str = "content"):
+        self.field = field
+        self._pattern = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._buffer = ""
+        self._cursor: Optional[int] = None  # 字段值中下一个待解码字符的位置
+        self.done = False
+        self.value = ""
+
+    def feed(self, chunk: str) -> str:
+        """
+        输入新到达的文本
+
+        Args:
+            chunk: 新的文本片段
+
+        Returns:
+            字段新增的内容
+        """
+        if self.done or not chunk:
+            return ""
+        self._buffer += chunk
+        if self._cursor is None:
+            match = self._pattern.search(self._buffer)
+            if match is None:
+                return ""
+            self._cursor = match.end()
+
+        decoded = []
+        buffer = self._buffer
+        i = self._cursor
+        while i < len(buffer):
+            char = buffer[i]
+            if char == '"':
+                self.done = True
+                i += 1
+                break
+            if char != "\\":
+                decoded.append(char)
+                i += 1
+                continue
+            # 转义序列不完整时等待后续文本
+            if i + 1 >= len(buffer):
+                break
+            escape = buffer[i + 1]
+            if escape == "u":
+                if i + 6 > len(buffer):
+                    break
+                # 代理对（如 emoji）需要两个 \uXXXX 一起解码
+                width = 12 if buffer[i + 2:i + 4].lower() in ("d8", "d9", "da", "db") else 6
+                if i + width > len(buffer):
+                    break
+                decoded.append(self._decode_unicode(buffer[i:i + width]))
+                i += width
+            else:
+                decoded.append(_ESCAPES.get(escape, escape))
+                i += 2
+        self._cursor = i
+        delta = "".join(decoded)
+        self.value += delta
+        return delta
+
+    @staticmethod
+    def _decode_unicode(escape: str) -> str:
+        try:
+            return json.loads(f'"{escape}"')
+        except json.JSONDecodeError:
+            return ""
@@ -0,0 +1,277 @@
+"""
+LLM 响应缓存：内容寻址（model, temperature, messages, schema, 请求参数）+ 内存 LRU + 可选 SQLite 磁盘层
+
+用于回放和固定种子的对局：完全相同的 prompt 直接返回缓存的响应，不再请求网络。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# 影响响应内容、需要参与缓存键计算的请求参数
+KEY_PARAMS = ("response_format", "tools", "tool_choice", "max_tokens", "stop")
+
+
+@lru_cache(maxsize=None)
+def schema_fingerprint(schema: Any) -> str:
+    """
+    计算结构化输出 Schema 的指纹（字段、类型、描述变化时指纹随之变化）
+
+    Args:
+        schema: Pydantic 模型类
+
+    Returns:
+        JSON Schema 的 SHA-256 十六进制摘要
+    """
+    if hasattr(schema, "model_json_schema"):
+        definition = schema.model_json_schema()
+    else:
+        definition = getattr(schema, "__name__", repr(schema))
+    raw = json.dumps(definition, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    两级 LLM 响应缓存
+
+    - 内存层：LRU，进程内共享
+    - 磁盘层（可选）：SQLite，多进程共享（WAL 模式）
+    - 按决策类型配置 TTL 或跳过缓存
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        sqlite_path: Optional[str] = None,
+        default_ttl: Optional[float] = None,
+        ttl_by_decision: Optional[Dict[str, Optional[float]]] = None,
+        bypass: Iterable[str] = ()
+    ):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 内存层最大条目数
+            sqlite_path: SQLite 文件路径（为 None 时只使用内存层）
+            default_ttl: 默认过期时间（秒），None 表示永不过期
+            ttl_by_decision: 按决策类型覆盖过期时间 {decision_type: ttl}
+            bypass: 不缓存的决策类型
+        """
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.ttl_by_decision = dict(ttl_by_decision or {})
+        self.bypass = set(bypass)
+        self._memory: "OrderedDict[str, Tuple[str, float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "decision_type TEXT, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(
+        model: str,
+        temperature: float,
+        messages: list,
+        schema: Any = None,
+        params: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """
+        计算缓存键（内容寻址）
+
+        Args:
+            model: 模型名称
+            temperature: 温度参数
+            messages: LangChain 消息列表
+            schema: 结构化输出的 Schema（可选，按名称和 JSON Schema 指纹区分）
+            params: 请求参数（只有 KEY_PARAMS 中的参数参与计算）
+
+        Returns:
+            SHA-256 十六进制摘要
+        """
+        params = params or {}
+        payload = {
+            "model": model,
+            "temperature": temperature,
+            "messages": [
+                [getattr(msg, "type", type(msg).__name__), getattr(msg, "content", str(msg))]
+                for msg in messages
+            ],
+            "schema": [schema.__name__, schema_fingerprint(schema)] if schema is not None else None,
+            "params": {name: params[name] for name in KEY_PARAMS if name in params},
+        }
+        raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def should_cache(self, decision_type: str) -> bool:
+        """判断该决策类型是否使用缓存"""
+        return decision_type not in self.bypass
+
+    def _ttl(self, decision_type: str) -> Optional[float]:
+        return self.ttl_by_decision.get(decision_type, self.default_ttl)
+
+    def _expired(self, created_at: float, decision_type: str) -> bool:
+        ttl = self._ttl(decision_type)
+        return ttl is not None and time.time() - created_at > ttl
+
+    def _record(self, decision_type: str, outcome: str) -> None:
+        counters = self._stats.setdefault(
+            decision_type, {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        )
+        counters[outcome] += 1
+
+    def get(self, key: str, decision_type: str = "text") -> Optional[str]:
+        """
+        读取缓存
+
+        Args:
+            key: 缓存键
+            decision_type: 决策类型（用于 TTL 和命中率统计）
+
+        Returns:
+            缓存的响应内容，未命中时返回 None
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at, _ = entry
+                if not self._expired(created_at, decision_type):
+                    self._memory.move_to_end(key)
+                    self._record(decision_type, "memory_hits")
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created_at FROM llm_responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and not self._expired(row[1], decision_type):
+                    self._put_memory(key, row[0], row[1], decision_type)
+                    self._record(decision_type, "disk_hits")
+                    return row[0]
+
+            self._record(decision_type, "misses")
+            return None
+
+    def set(self, key: str, value: str, decision_type: str = "text") -> None:
+        """写入缓存（同时写入内存层和磁盘层）"""
+        created_at = time.time()
+        with self._lock:
+            self._put_memory(key, value, created_at, decision_type)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_responses (key, value, decision_type, created_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, value, decision_type, created_at)
+                )
+                self._db.commit()
+
+    def _put_memory(self, key: str, value: str, created_at: float, decision_type: str) -> None:
+        self._memory[key] = (value, created_at, decision_type)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取命中率统计
+
+        Returns:
+            {"hits", "misses", "hit_rate", "by_decision": {decision_type: {...}}}
+        """
+        with self._lock:
+            by_decision = {}
+            total_hits = total_misses = 0
+            for decision_type, counters in self._stats.items():
+                hits = counters["memory_hits"] + counters["disk_hits"]
+                lookups = hits + counters["misses"]
+                by_decision[decision_type] = dict(
+                    counters, hit_rate=hits / lookups if lookups else 0.0
+                )
+                total_hits += hits
+                total_misses += counters["misses"]
+            lookups = total_hits + total_misses
+            return {
+                "hits": total_hits,
+                "misses": total_misses,
+                "hit_rate": total_hits / lookups if lookups else 0.0,
+                "entries": len(self._memory),
+                "by_decision": by_decision,
+            }
+
+    def clear(self) -> None:
+        """清空内存层和统计（不删除磁盘层）"""
+        with self._lock:
+            self._memory.clear()
+            self._stats.clear()
+
+    def close(self) -> None:
+        """关闭磁盘层连接"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+# 进程级缓存（默认关闭，通过 configure_llm_cache 或环境变量 LLM_CACHE 开启）
+_cache: Optional[LLMResponseCache] = None
+_cache_configured = False
+_cache_lock = threading.Lock()
+
+
+def configure_llm_cache(
+    enabled: bool = True,
+    **kwargs
+) -> Optional[LLMResponseCache]:
+    """
+    配置进程级 LLM 响应缓存
+
+    Args:
+        enabled: 是否开启缓存
+        **kwargs: 传给 LLMResponseCache 的参数
+
+    Returns:
+        新的缓存实例（关闭时返回 None）
+    """
+    global _cache, _cache_configured
+    with _cache_lock:
+        if _cache is not None:
+            _cache.close()
+        _cache = LLMResponseCache(**kwargs) if enabled else None
+        _cache_configured = True
+        return _cache
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """
+    获取进程级 LLM 响应缓存
+
+    首次调用时读取环境变量：LLM_CACHE=1 开启缓存，LLM_CACHE_PATH 指定 SQLite 文件，
+    LLM_CACHE_BYPASS 指定不缓存的决策类型（逗号分隔）。
+    """
+    global _cache, _cache_configured
+    if _cache_configured:
+        return _cache
+    with _cache_lock:
+        if not _cache_configured:
+            if os.getenv("LLM_CACHE", "0").lower() in ("1", "true", "yes"):
+                bypass = [t for t in os.getenv("LLM_CACHE_BYPASS", "").split(",") if t]
+                _cache = LLMResponseCache(
+                    sqlite_path=os.getenv("LLM_CACHE_PATH") or None,
+                    bypass=bypass
+                )
+            _cache_configured = True
+    return _cache
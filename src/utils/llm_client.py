@@ -1,22 +1,60 @@
 """
-LLM 客户端封装（支持 DeepSeek-V3 和 OpenAI）
+LLM 客户端封装（支持 DeepSeek-V3、OpenAI 和离线本地后端）
 """
 import os
+import asyncio
 import json
-from typing import Optional, Literal
+import threading
+import time
+import inspect
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Literal, Tuple
+import httpx
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
 from dotenv import load_dotenv
+from .llm_cache import LLMResponseCache, get_llm_cache
+from .rate_limiter import get_rate_limiter, estimate_tokens
+from .telemetry import LLMCallRecord, get_telemetry
+from .hedging import get_hedging_policy
+from .single_flight import get_single_flight
+from .retry import get_retry_policy
+from .repair import get_repair_policy, short_error
+from .capabilities import get_structured_mode, downgrade_structured_mode, is_unsupported_error
+from .json_stream import PartialFieldExtractor
+from ..schemas.registry import get_decision_spec
 
 load_dotenv()
 
 
+# 共享 HTTP 连接池：所有 ChatOpenAI 实例复用同一个 httpx 客户端，避免重复 TLS 握手
+_http_clients: Dict[str, httpx.AsyncClient] = {}
+_http_lock = threading.Lock()
+
+
+def get_shared_http_client() -> httpx.AsyncClient:
+    """
+    获取进程级共享的异步 HTTP 客户端（单一连接池）
+    
+    连接池大小可通过环境变量 LLM_MAX_CONNECTIONS / LLM_MAX_KEEPALIVE 配置
+    """
+    with _http_lock:
+        client = _http_clients.get("default")
+        if client is None or client.is_closed:
+            limits = httpx.Limits(
+                max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+                max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE", "20")),
+            )
+            client = httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(60.0))
+            _http_clients["default"] = client
+        return client
+
+
 class LLMClient:
     """LLM 客户端（优先使用 DeepSeek-V3）"""
     
     def __init__(
         self, 
-        provider: Literal["deepseek", "openai"] = "deepseek",
+        provider: Literal["deepseek", "openai", "local"] = "deepseek",
         model: Optional[str] = None,
         temperature: float = 0.7
     ):
@@ -24,13 +62,17 @@ class LLMClient:
         初始化 LLM 客户端
         
         Args:
-            provider: LLM 提供商，"deepseek" 或 "openai"
+            provider: LLM 提供商，"deepseek"、"openai" 或 "local"（离线后端，不访问网络）
             model: 模型名称，如果为 None 则使用默认值
             temperature: 温度参数
         """
         self.provider = provider
+        self.temperature = temperature
         
-        if provider == "deepseek":
+        if provider == "local":
+            from .local_llm import create_local_chat_model
+            self.llm = create_local_chat_model(model)
+        elif provider == "deepseek":
             api_key = os.getenv("DEEPSEEK_API_KEY")
             if not api_key:
                 raise ValueError("DEEPSEEK_API_KEY not found in environment variables")
@@ -43,7 +85,9 @@ class LLMClient:
                 model=default_model,
                 temperature=temperature,
                 api_key=api_key,
-                base_url=base_url
+                base_url=base_url,
+                http_async_client=get_shared_http_client(),
+                max_retries=0  # 重试由 complete 中的重试策略统一处理
             )
         else:  # OpenAI
             api_key = os.getenv("OPENAI_API_KEY")
@@ -54,43 +98,374 @@ class LLMClient:
             self.llm = ChatOpenAI(
                 model=default_model,
                 temperature=temperature,
-                api_key=api_key
+                api_key=api_key,
+                http_async_client=get_shared_http_client(),
+                max_retries=0  # 重试由 complete 中的重试策略统一处理
+            )
+    
+    async def complete(
+        self,
+        messages: list,
+        decision_type: str = "text",
+        schema=None,
+        record: Optional[LLMCallRecord] = None,
+        coalesce: Optional[bool] = None,
+        **kwargs
+    ) -> str:
+        """
+        发送消息并返回响应文本（所有 LLM 请求的统一入口）
+        
+        如果开启了响应缓存，相同的 (model, temperature, messages, schema) 直接返回缓存内容；
+        完全相同的请求同时在途时（temperature=0 或 coalesce=True），只向服务端发送一次；
+        如果配置了限流器，请求在发出前按 RPM/TPM 预算排队；
+        如果开启了对冲策略，慢请求会再发一次，取先返回的结果；
+        临时性错误（超时、429、5xx）按重试策略退避重试，解析失败不在这里重试。
+        
+        Args:
+            messages: LangChain 消息列表
+            decision_type: 决策类型（用于缓存策略和统计）
+            schema: 结构化输出的 Schema（参与缓存键计算）
+            record: 遥测记录（由调用方提交；为 None 时在这里创建并提交）
+            coalesce: 是否与相同的在途请求合并（None 表示仅 temperature=0 时合并）
+            **kwargs: 传给底层 LLM 的其他参数（response_format、tools、max_tokens 等参与缓存键计算）
+        
+        Returns:
+            响应文本
+        """
+        telemetry = get_telemetry()
+        owns_record = record is None and telemetry is not None
+        if owns_record:
+            record = telemetry.start_call(decision_type)
+        if record is not None:
+            record.model = self.model
+        
+        try:
+            return await self._complete(messages, decision_type, schema, record, coalesce, **kwargs)
+        except Exception as e:
+            if record is not None:
+                record.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            if owns_record:
+                telemetry.submit(record)
+    
+    async def _complete(
+        self,
+        messages: list,
+        decision_type: str,
+        schema,
+        record: Optional[LLMCallRecord],
+        coalesce: Optional[bool],
+        **kwargs
+    ) -> str:
+        cache = get_llm_cache()
+        key = None
+        if cache is not None and cache.should_cache(decision_type):
+            key = cache.make_key(self.model, self.temperature, messages, schema, kwargs)
+            cached = cache.get(key, decision_type)
+            if cached is not None:
+                if record is not None:
+                    record.cache_hit = True
+                return cached
+        
+        single_flight = get_single_flight()
+        if single_flight is not None and single_flight.should_coalesce(self.temperature, coalesce):
+            flight_key = LLMResponseCache.make_key(self.model, self.temperature, messages, schema, kwargs)
+            if kwargs:
+                flight_key += json.dumps(kwargs, sort_keys=True, ensure_ascii=False, default=str)
+            started = time.perf_counter()
+            content, shared = await single_flight.do(
+                flight_key, lambda: self._invoke(messages, decision_type, schema, record, **kwargs)
             )
+            if shared and record is not None:
+                record.coalesced = True
+                record.latency = time.perf_counter() - started
+        else:
+            content = await self._invoke(messages, decision_type, schema, record, **kwargs)
+        
+        if key is not None:
+            cache.set(key, content, decision_type)
+        return content
     
-    async def call(self, system_prompt: str, user_prompt: str) -> str:
+    async def _invoke(
+        self,
+        messages: list,
+        decision_type: str,
+        schema,
+        record: Optional[LLMCallRecord],
+        **kwargs
+    ) -> str:
+        """向服务端发送请求（限流、对冲、重试），返回响应文本"""
+        limiter = get_rate_limiter()
+        estimated_tokens = estimate_tokens(messages)
+        if schema is not None and getattr(self.llm, "accepts_schema_hint", False):
+            kwargs["schema"] = schema
+        hedging = get_hedging_policy()
+        started = time.perf_counter()
+        
+        async def attempt():
+            nonlocal started
+            if limiter is not None:
+                queue_wait = await limiter.acquire(self.provider, self.model, estimated_tokens)
+                if record is not None:
+                    record.queue_wait += queue_wait
+            started = time.perf_counter()
+            if hedging is None:
+                return await self.llm.ainvoke(messages, **kwargs)
+            # 对冲请求同样占用限流配额
+            before_hedge = None
+            if limiter is not None:
+                before_hedge = lambda: limiter.acquire(self.provider, self.model, estimated_tokens)
+            return await hedging.run(
+                decision_type,
+                lambda: self.llm.ainvoke(messages, **kwargs),
+                before_hedge=before_hedge
+            )
+        
+        def on_retry(error: BaseException) -> None:
+            if record is not None:
+                record.retries += 1
+        
+        retry_policy = get_retry_policy()
+        if retry_policy is not None:
+            response = await retry_policy.run(decision_type, attempt, on_retry=on_retry)
+        else:
+            response = await attempt()
+        content = response.content if hasattr(response, 'content') else str(response)
+        tool_calls = getattr(response, "tool_calls", None)
+        if tool_calls:
+            # 工具调用方式：返回工具参数的 JSON
+            content = json.dumps(tool_calls[0]["args"], ensure_ascii=False)
+        usage = getattr(response, "usage_metadata", None) or {}
+        if record is not None:
+            record.latency = time.perf_counter() - started
+            record.prompt_tokens = usage.get("input_tokens", 0)
+            record.completion_tokens = usage.get("output_tokens", 0)
+        
+        if limiter is not None:
+            limiter.record_usage(self.provider, self.model, estimated_tokens, usage.get("total_tokens", 0))
+        return content
+    
+    async def stream(
+        self,
+        messages: list,
+        decision_type: str = "text",
+        schema=None,
+        record: Optional[LLMCallRecord] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        流式发送消息，逐块返回响应文本（工具调用方式下返回工具参数的片段）
+        
+        命中缓存时一次性返回缓存内容；请求在发出前同样按限流预算排队。
+        流式请求不做对冲和重试（由调用方在第一个片段到达前失败时退回 complete）。
+        
+        Args:
+            messages: LangChain 消息列表
+            decision_type: 决策类型
+            schema: 结构化输出的 Schema
+            record: 遥测记录（记录首个片段的到达时间 ttft）
+            **kwargs: 传给底层 LLM 的其他参数
+        
+        Yields:
+            响应文本片段
+        """
+        telemetry = get_telemetry()
+        owns_record = record is None and telemetry is not None
+        if owns_record:
+            record = telemetry.start_call(decision_type)
+        if record is not None:
+            record.model = self.model
+        
+        try:
+            cache = get_llm_cache()
+            key = None
+            if cache is not None and cache.should_cache(decision_type):
+                key = cache.make_key(self.model, self.temperature, messages, schema, kwargs)
+                cached = cache.get(key, decision_type)
+                if cached is not None:
+                    if record is not None:
+                        record.cache_hit = True
+                    yield cached
+                    return
+            
+            if not hasattr(self.llm, "astream"):
+                yield await self._invoke(messages, decision_type, schema, record, **kwargs)
+                return
+            
+            limiter = get_rate_limiter()
+            estimated_tokens = estimate_tokens(messages)
+            if limiter is not None:
+                queue_wait = await limiter.acquire(self.provider, self.model, estimated_tokens)
+                if record is not None:
+                    record.queue_wait += queue_wait
+            if schema is not None and getattr(self.llm, "accepts_schema_hint", False):
+                kwargs["schema"] = schema
+            
+            started = time.perf_counter()
+            parts = []
+            usage = {}
+            async for chunk in self.llm.astream(messages, **kwargs):
+                text = chunk.content if isinstance(chunk.content, str) else ""
+                tool_call_chunks = getattr(chunk, "tool_call_chunks", None)
+                if tool_call_chunks:
+                    text += "".join(c.get("args") or "" for c in tool_call_chunks)
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                if not text:
+                    continue
+                if record is not None and record.ttft is None:
+                    record.ttft = time.perf_counter() - started
+                parts.append(text)
+                yield text
+            
+            content = "".join(parts)
+            if record is not None:
+                record.latency = time.perf_counter() - started
+                record.prompt_tokens = usage.get("input_tokens", 0)
+                record.completion_tokens = usage.get("output_tokens", 0)
+            if limiter is not None:
+                limiter.record_usage(self.provider, self.model, estimated_tokens, usage.get("total_tokens", 0))
+            if key is not None:
+                cache.set(key, content, decision_type)
+        except Exception as e:
+            if record is not None:
+                record.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            if owns_record:
+                telemetry.submit(record)
+    
+    async def call(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        decision_type: str = "text",
+        agent_role: Optional[str] = None
+    ) -> str:
         """调用 LLM"""
         messages = [
             SystemMessage(content=system_prompt),
             HumanMessage(content=user_prompt)
         ]
-        response = await self.llm.ainvoke(messages)
-        return response.content
+        telemetry = get_telemetry()
+        record = telemetry.start_call(decision_type, role=agent_role) if telemetry is not None else None
+        try:
+            return await self.complete(messages, decision_type=decision_type, record=record)
+        finally:
+            if record is not None:
+                telemetry.submit(record)
     
-    def get_structured_llm(self, schema):
+    @property
+    def model(self) -> str:
+        """实际使用的模型名称"""
+        return self.llm.model_name
+    
+    def get_structured_llm(
+        self,
+        schema,
+        decision_type: Optional[str] = None,
+        agent_role: Optional[str] = None
+    ):
         """
         获取支持结构化输出的 LLM
         
-        注意：DeepSeek API 目前不支持 response_format 参数，
-        所以对于 DeepSeek，我们使用 JSON Mode + 手动解析的方式
+        Args:
+            schema: 决策 Schema（见 schemas.registry）
+            decision_type: 决策类型名称（默认使用注册表中的名称）
+            agent_role: 发起调用的 Agent 角色（用于遥测统计）
+        
+        结构化输出方式按提供商能力选择（见 utils.capabilities）：工具调用、
+        JSON Mode（response_format=json_object）或纯 prompt 约束，不支持时自动降级
         """
-        if self.provider == "deepseek":
-            # DeepSeek 不支持 with_structured_output，使用 JSON Mode
-            # 返回一个包装的 LLM，它会自动处理 JSON 解析
-            return StructuredLLMWrapper(self.llm, schema)
-        else:
-            # OpenAI 支持 with_structured_output
-            return self.llm.with_structured_output(schema)
+        return StructuredLLMWrapper(
+            self.llm, schema, client=self, decision_type=decision_type, agent_role=agent_role
+        )
+    
+    @property
+    def structured_mode(self) -> str:
+        """当前使用的结构化输出方式"""
+        return get_structured_mode(self.provider, self.model)
+
+
+# 进程级 LLM 客户端注册表：按 (provider, model, temperature) 共享实例
+_client_registry: Dict[Tuple[str, Optional[str], float], LLMClient] = {}
+_registry_lock = threading.Lock()
+
+
+def get_llm_client(
+    provider: Optional[Literal["deepseek", "openai", "local"]] = None,
+    model: Optional[str] = None,
+    temperature: float = 0.7
+) -> LLMClient:
+    """
+    从注册表获取共享的 LLM 客户端
+    
+    相同 (provider, model, temperature) 的调用返回同一个实例，
+    所有实例共享同一个 HTTP 连接池。
+    
+    Args:
+        provider: LLM 提供商，如果为 None 则读取环境变量 LLM_PROVIDER（默认 "deepseek"）
+        model: 模型名称，如果为 None 则使用提供商默认值
+        temperature: 温度参数
+    
+    Returns:
+        共享的 LLMClient 实例
+    """
+    provider = provider or os.getenv("LLM_PROVIDER", "deepseek")
+    key = (provider, model, float(temperature))
+    with _registry_lock:
+        client = _client_registry.get(key)
+        if client is None:
+            client = LLMClient(provider=provider, model=model, temperature=temperature)
+            _client_registry[key] = client
+        return client
+
+
+def clear_llm_client_registry() -> None:
+    """清空客户端注册表（主要用于测试或切换配置）"""
+    with _registry_lock:
+        _client_registry.clear()
+
+
+async def _emit(on_token: Callable[[str], Any], text: str) -> None:
+    """把新增内容交给回调（支持协程函数）"""
+    if not text:
+        return
+    result = on_token(text)
+    if inspect.isawaitable(result):
+        await result
+
+
+class StructuredOutputError(ValueError):
+    """结构化输出解析失败（reason 为简短的错误描述，content 为原始输出）"""
+    
+    def __init__(self, reason: str, content: str):
+        super().__init__(f"无法解析结构化输出: {reason}\n原始内容: {content}")
+        self.reason = reason
+        self.content = content
 
 
 class StructuredLLMWrapper:
     """
-    为 DeepSeek 提供的结构化输出包装器
-    使用 JSON Mode + 手动解析的方式实现结构化输出
+    结构化输出包装器
+    按提供商能力使用工具调用 / JSON Mode / 纯 prompt 约束，统一解析为 Schema 实例
     """
     
-    def __init__(self, llm, schema):
+    def __init__(
+        self,
+        llm,
+        schema,
+        client: Optional[LLMClient] = None,
+        decision_type: Optional[str] = None,
+        agent_role: Optional[str] = None
+    ):
         self.llm = llm
         self.schema = schema
+        self.client = client
+        self.spec = get_decision_spec(schema)
+        self.decision_type = decision_type or self.spec.decision_type
+        self.agent_role = agent_role
+        self.mode = "prompt"
         
     async def ainvoke(self, messages, **kwargs):
         """
@@ -103,16 +478,199 @@ class StructuredLLMWrapper:
         Returns:
             解析后的 schema 实例
         """
-        # 修改 prompt，要求返回 JSON 格式
-        enhanced_messages = self._enhance_messages_for_json(messages)
+        mode = self.client.structured_mode if self.client is not None else "prompt"
+        
+        telemetry = get_telemetry()
+        record = telemetry.start_call(self.decision_type, role=self.agent_role) if telemetry is not None else None
+        try:
+            while True:
+                # 按结构化输出方式修改 prompt 并设置请求参数
+                enhanced_messages = self._enhance_messages_for_json(messages, mode)
+                try:
+                    content = await self._request(
+                        enhanced_messages, self.decision_type, record, **self._mode_kwargs(mode), **kwargs
+                    )
+                    if record is not None:
+                        # 降级前被拒绝的请求不算本次调用失败
+                        record.error = None
+                    break
+                except Exception as e:
+                    # 服务端不支持该方式时降级重试（并记住该模型的能力）
+                    if self.client is None or mode == "prompt" or not is_unsupported_error(e, mode):
+                        raise
+                    mode = downgrade_structured_mode(self.client.provider, self.client.model, mode)
+            self.mode = mode
+            return await self._parse_with_repair(content, record)
+        finally:
+            if record is not None:
+                telemetry.submit(record)
+    
+    async def ainvoke_streaming(
+        self,
+        messages,
+        on_token: Callable[[str], Any],
+        field: str = "content",
+        **kwargs
+    ):
+        """
+        流式调用 LLM：边生成边把某个字符串字段（默认 content）的新增内容交给 on_token，结束后解析为结构化输出
         
-        # 调用 LLM
-        response = await self.llm.ainvoke(enhanced_messages, **kwargs)
+        流式请求在第一个片段到达前失败时，退回普通调用（支持重试和降级），并把完整字段内容一次性交给 on_token。
+        最终结果与已流式发出的内容不一致时（例如经过修复），不再补发增量，而是在遥测中记录 stream_diverged，
+        调用方应以返回结果中的字段内容替换已输出的内容。
         
-        # 解析 JSON 响应
-        content = response.content if hasattr(response, 'content') else str(response)
+        Args:
+            messages: LangChain 消息列表
+            on_token: 接收新增内容的回调（可以是普通函数或协程函数）
+            field: 需要流式输出的字段名
+            **kwargs: 其他参数
+        
+        Returns:
+            解析后的 schema 实例
+        """
+        if self.client is None:
+            result = await self.ainvoke(messages, **kwargs)
+            await _emit(on_token, getattr(result, field, "") or "")
+            return result
+        
+        mode = self.client.structured_mode
+        self.mode = mode
+        enhanced_messages = self._enhance_messages_for_json(messages, mode)
+        extractor = PartialFieldExtractor(field)
+        parts = []
+        
+        telemetry = get_telemetry()
+        record = telemetry.start_call(self.decision_type, role=self.agent_role) if telemetry is not None else None
+        try:
+            try:
+                async for text in self.client.stream(
+                    enhanced_messages,
+                    decision_type=self.decision_type,
+                    schema=self.schema,
+                    record=record,
+                    **self._mode_kwargs(mode),
+                    **kwargs
+                ):
+                    parts.append(text)
+                    delta = extractor.feed(text)
+                    if delta:
+                        await _emit(on_token, delta)
+            except Exception as e:
+                if parts:
+                    raise
+                # 失败的流式请求单独记录，退回的普通调用另有记录
+                if record is not None:
+                    record.error = f"{type(e).__name__}: {e}"
+                    telemetry.submit(record)
+                    record = None
+                result = await self.ainvoke(messages, **kwargs)
+                await _emit(on_token, getattr(result, field, "") or "")
+                return result
+            
+            result = await self._parse_with_repair("".join(parts), record)
+            # 字段名不标准（如 text）或经过修复时，补发未流式输出的内容
+            value = getattr(result, field, "") or ""
+            if not value.startswith(extractor.value):
+                # 已发出的内容不是最终结果的前缀，无法用增量补齐
+                if record is not None:
+                    record.stream_diverged = True
+            elif len(value) > len(extractor.value):
+                await _emit(on_token, value[len(extractor.value):])
+            return result
+        finally:
+            if record is not None:
+                telemetry.submit(record)
+    
+    async def _parse_with_repair(self, content: str, record=None):
+        """
+        解析响应，失败时按修复策略要求 LLM 修正
+        
+        parse_time 只统计本地解析耗时；修复请求的网络耗时记录在各自的遥测记录中（决策类型带 _repair 后缀）
+        """
+        try:
+            return self._timed_parse(content, record)
+        except StructuredOutputError as e:
+            if record is not None:
+                record.error = f"ParseError: {e.reason}"
+            repair = get_repair_policy()
+            if repair is None:
+                raise
+            return await self._repair(repair, e, record)
+    
+    def _timed_parse(self, content: str, record=None):
+        """解析响应，并把本地解析耗时累加到遥测记录"""
+        started = time.perf_counter()
+        try:
+            return self._parse(content)
+        finally:
+            if record is not None:
+                record.parse_time += time.perf_counter() - started
+    
+    async def _request(self, messages, decision_type: str, record=None, **kwargs) -> str:
+        """发送请求并返回响应文本（经由客户端统一入口，支持缓存、限流、重试）"""
+        if self.client is not None:
+            return await self.client.complete(
+                messages,
+                decision_type=decision_type,
+                schema=self.schema,
+                record=record,
+                **kwargs
+            )
+        response = await self.llm.ainvoke(messages, **kwargs)
+        return response.content if hasattr(response, 'content') else str(response)
+    
+    async def _repair(self, repair, error: "StructuredOutputError", record=None):
+        """
+        修复无法解析的输出：只发回简短的错误和原输出，要求返回修正后的 JSON
+        
+        Args:
+            repair: 修复策略
+            error: 解析失败的异常
+            record: 本次调用的遥测记录
+        
+        Returns:
+            修复后的 schema 实例
+        
+        Raises:
+            StructuredOutputError: 修复次数用尽或超时后仍然无法解析
+        """
+        for _ in range(repair.max_attempts):
+            messages = repair.build_messages(error.reason, error.content, self.spec.field_names)
+            if record is not None:
+                record.repairs += 1
+            try:
+                content = await asyncio.wait_for(
+                    self._request(
+                        messages,
+                        f"{self.decision_type}_repair",
+                        max_tokens=repair.max_tokens,
+                        **self._mode_kwargs(self.mode)
+                    ),
+                    timeout=repair.timeout
+                )
+                result = self._timed_parse(content, record)
+            except StructuredOutputError as e:
+                repair.record(self.decision_type, success=False)
+                error = e
+                continue
+            except asyncio.TimeoutError:
+                repair.record(self.decision_type, success=False)
+                break
+            repair.record(self.decision_type, success=True)
+            if record is not None:
+                record.error = None
+                record.repaired = True
+            return result
+        raise error
+    
+    def _parse(self, content: str):
+        """
+        解析 LLM 响应为 schema 实例
         
-        # 尝试提取 JSON（可能包含在代码块中）
+        Raises:
+            StructuredOutputError: JSON 解析或 Schema 校验失败
+        """
+        # 解析 JSON 响应：尝试提取 JSON（可能包含在代码块中）
         json_str = self._extract_json(content)
         
         # 解析 JSON 并创建 schema 实例
@@ -124,146 +682,36 @@ class StructuredLLMWrapper:
         except (json.JSONDecodeError, TypeError, ValueError) as e:
             # 如果解析失败，尝试使用 Pydantic 的验证
             try:
-                return self.schema.parse_raw(json_str)
-            except:
-                # 最后尝试直接构造
-                raise ValueError(f"无法解析结构化输出: {e}\n原始内容: {content}")
+                return self.schema.model_validate_json(json_str)
+            except ValueError:
+                raise StructuredOutputError(short_error(e), content)
     
     def _map_fields(self, data):
-        """映射字段名，处理常见的字段名不匹配"""
-        # 字段名映射表
-        field_mapping = {
-            'action': 'action_type',
-            'actionType': 'action_type',
-            'type': 'action_type',
-            'reason': 'reasoning',
-            'reasoning_text': 'reasoning',
-            'text': 'content',  # 对于 SpeakDecision
-            'message': 'content',  # 对于 SpeakDecision
-        }
-        
-        # 应用字段映射
-        mapped_data = {}
-        for key, value in data.items():
-            # 映射字段名
-            mapped_key = field_mapping.get(key, key)
-            
-            # 处理 target 字段：如果是字符串，尝试提取数字
-            if mapped_key == 'target' and isinstance(value, str):
-                # 尝试从字符串中提取数字（如 "玩家1" -> 1）
-                import re
-                numbers = re.findall(r'\d+', value)
-                if numbers:
-                    value = int(numbers[0])
-                else:
-                    # 如果无法提取，设为 None
-                    value = None
-            
-            mapped_data[mapped_key] = value
-        
-        # 确保必需字段存在
-        schema_fields = {}
-        if hasattr(self.schema, 'model_fields'):
-            schema_fields = self.schema.model_fields
-        elif hasattr(self.schema, '__fields__'):
-            schema_fields = self.schema.__fields__
-        
-        # 为缺失的必需字段设置默认值
-        for field_name, field_info in schema_fields.items():
-            if field_name not in mapped_data:
-                # 检查是否有默认值
-                default = None
-                if hasattr(field_info, 'default'):
-                    default = field_info.default
-                    # 检查是否是有效的默认值（不是 None 且不是 Pydantic 的特殊标记）
-                    # 使用字符串比较来避免导入问题
-                    if default is not None and str(type(default).__name__) != 'PydanticUndefinedType':
-                        try:
-                            # 尝试使用默认值
-                            mapped_data[field_name] = default
-                            continue
-                        except:
-                            pass
-                
-                # 如果没有默认值且字段是必需的，设置合理的默认值
-                if field_name == 'thought':
-                    # 优先使用 reasoning，否则使用空字符串
-                    mapped_data[field_name] = mapped_data.get('reasoning', mapped_data.get('reason', ''))
-                elif field_name == 'reasoning':
-                    # 优先使用 thought，否则使用 reason
-                    mapped_data[field_name] = mapped_data.get('thought', mapped_data.get('reason', ''))
-                elif field_name == 'confidence':
-                    mapped_data[field_name] = 0.5
-                elif field_name == 'target' and mapped_data.get('action_type') in ['skip', 'explode']:
-                    mapped_data[field_name] = None
-                elif field_name == 'content' and 'text' in mapped_data:
-                    mapped_data[field_name] = mapped_data.get('text', mapped_data.get('message', ''))
-                else:
-                    # 对于字符串类型，使用空字符串
-                    if hasattr(field_info, 'annotation'):
-                        ann = str(field_info.annotation)
-                        if 'str' in ann or 'String' in ann:
-                            mapped_data[field_name] = ''
-                        elif 'int' in ann or 'Integer' in ann:
-                            mapped_data[field_name] = 0
-                        elif 'float' in ann:
-                            mapped_data[field_name] = 0.0
-        
-        return mapped_data
+        """映射字段名，处理常见的字段名不匹配（映射表和缺省值规则已在注册表中预编译）"""
+        return self.spec.map_fields(data)
     
-    def _enhance_messages_for_json(self, messages):
-        """增强消息，要求返回 JSON 格式"""
-        enhanced = []
+    def _mode_kwargs(self, mode: str) -> Dict[str, Any]:
+        """结构化输出方式对应的请求参数"""
+        if mode == "tool_calling":
+            return {"tools": [self.spec.tool], "tool_choice": self.spec.tool_choice}
+        if mode == "json_mode":
+            return {"response_format": {"type": "json_object"}}
+        return {}
+    
+    def _enhance_messages_for_json(self, messages, mode: str = "prompt"):
+        """
+        增强消息，要求返回 JSON 格式
         
-        # 获取 schema 的字段信息和示例
-        schema_fields = {}
-        if hasattr(self.schema, 'model_fields'):
-            schema_fields = self.schema.model_fields
-        elif hasattr(self.schema, '__fields__'):
-            schema_fields = self.schema.__fields__
-        
-        # 获取示例（如果有）
-        example = None
-        if hasattr(self.schema, 'Config') and hasattr(self.schema.Config, 'json_schema_extra'):
-            example = self.schema.Config.json_schema_extra.get('example')
-        
-        # 构建字段说明
-        field_descriptions = []
-        for field_name, field_info in schema_fields.items():
-            field_type = "string"
-            is_required = True
-            default_value = None
-            
-            if hasattr(field_info, 'annotation'):
-                field_type = str(field_info.annotation)
-            if hasattr(field_info, 'default'):
-                default_value = field_info.default
-                if default_value is not None:
-                    is_required = False
-            
-            field_desc = f"- {field_name} ({field_type})"
-            if not is_required:
-                field_desc += f" [可选，默认: {default_value}]"
-            field_descriptions.append(field_desc)
+        纯 prompt 约束时追加完整的格式指令；JSON Mode 只追加简短的字段说明；
+        工具调用时字段定义已经在工具参数中，不修改消息
+        """
+        if mode == "tool_calling":
+            return list(messages)
         
-        # 构建 JSON 格式指令
-        json_format_instruction = f"""
-
-重要：请严格按照以下 JSON 格式返回结果，不要使用其他字段名。
-
-必需字段：
-{chr(10).join(field_descriptions)}
-
-JSON 格式要求：
-1. 必须使用上述确切的字段名（如 action_type 而不是 action）
-2. target 字段必须是整数（玩家ID），不是字符串（如 1 而不是 "玩家1"）
-3. 所有必需字段都必须包含
-4. 只返回纯 JSON 对象，不要包含任何其他文本、说明或代码块标记
-5. 确保 JSON 格式完全正确，可以被直接解析
-
-示例格式：
-{json.dumps(example, ensure_ascii=False, indent=2) if example else '{"thought": "...", "action_type": "vote", "target": 1, "confidence": 0.75, "reasoning": "..."}'}
-"""
+        enhanced = []
+        json_format_instruction = (
+            self.spec.compact_instruction if mode == "json_mode" else self.spec.json_instruction
+        )
         
         for msg in messages:
             if hasattr(msg, 'content'):
@@ -0,0 +1,246 @@
+"""
+离线本地 LLM 后端：不访问网络，按 Schema 生成合法的决策，用于压测和基准测试
+
+通过 LLMClient(provider="local") 或环境变量 LLM_PROVIDER=local 启用。
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+from typing import Any, Dict, List, Optional
+from langchain_core.messages import AIMessage, AIMessageChunk, SystemMessage
+from ..schemas.registry import get_decision_spec
+
+# 各布尔决策为 True 的概率
+BOOL_PROBABILITIES = {
+    "should_explode": 0.05,
+    "use_antidote": 0.6,
+    "use_poison": 0.3,
+    "should_transfer": 0.8,
+    "use_order": 0.5,
+}
+
+# 各决策类型对应的 action_type（AgentAction）
+ACTION_TYPES = {
+    "seer_check": "check",
+    "guard_protect": "guard",
+    "werewolf_kill": "kill",
+}
+
+SPEECH_TEMPLATES = [
+    "我觉得玩家{target}的发言有些前后矛盾，建议大家重点关注。",
+    "我是好人，目前比较怀疑玩家{target}，理由是他的投票和发言对不上。",
+    "从昨天的情况看，玩家{target}的行为很可疑，我倾向于出他。",
+    "我先听听大家的意见，暂时认为玩家{target}身份存疑。",
+]
+
+
+class LatencyModel:
+    """
+    模拟延迟分布
+
+    支持三种模式：
+    - fixed:秒数（如 "fixed:0.2"）
+    - lognormal:中位数,sigma（如 "lognormal:0.8,0.5"）
+    - replay:文件路径（每行一个秒数，或包含 latency 字段的 JSON 对象，循环回放）
+    """
+
+    def __init__(self, mode: str = "fixed", params: Optional[List[float]] = None, trace: Optional[List[float]] = None):
+        if mode not in ("fixed", "lognormal", "replay"):
+            raise ValueError(f"Unknown latency mode: {mode}")
+        self.mode = mode
+        self.params = params or [0.0]
+        self.trace = trace or []
+        self._cursor = 0
+
+    @classmethod
+    def parse(cls, spec: Optional[str]) -> "LatencyModel":
+        """
+        从字符串解析延迟分布
+
+        Args:
+            spec: 延迟配置（如 "fixed:0.2"、"lognormal:0.8,0.5"、"replay:traces.jsonl"），为空时无延迟
+
+        Returns:
+            LatencyModel 实例
+        """
+        if not spec:
+            return cls("fixed", [0.0])
+        mode, _, value = spec.partition(":")
+        if mode == "replay":
+            return cls("replay", trace=cls._load_trace(value))
+        return cls(mode, [float(v) for v in value.split(",") if v])
+
+    @staticmethod
+    def _load_trace(path: str) -> List[float]:
+        trace = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                if line.startswith("{"):
+                    record = json.loads(line)
+                    trace.append(float(record.get("latency", record.get("latency_s", 0.0))))
+                else:
+                    trace.append(float(line))
+        if not trace:
+            raise ValueError(f"Empty latency trace: {path}")
+        return trace
+
+    def sample(self, rng: random.Random) -> float:
+        """采样一次延迟（秒）"""
+        if self.mode == "fixed":
+            return self.params[0]
+        if self.mode == "lognormal":
+            median = self.params[0]
+            sigma = self.params[1] if len(self.params) > 1 else 0.5
+            return rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+        latency = self.trace[self._cursor % len(self.trace)]
+        self._cursor += 1
+        return latency
+
+
+class LocalChatModel:
+    """
+    离线聊天模型（与 ChatOpenAI 的 ainvoke 接口兼容）
+
+    相同 seed 和相同 prompt 总是产生相同的响应，与调用顺序和并发无关；
+    模拟延迟按调用顺序从独立的随机序列采样（重复请求的延迟不同，便于测试对冲请求）。
+    """
+
+    # 接受 schema 提示：LLMClient.complete 会把结构化输出的 Schema 传给 ainvoke
+    accepts_schema_hint = True
+
+    def __init__(self, seed: int = 0, latency: Optional[LatencyModel] = None, model_name: str = "local-sim"):
+        """
+        初始化离线模型
+
+        Args:
+            seed: 随机种子
+            latency: 模拟延迟分布（为 None 时无延迟）
+            model_name: 模型名称
+        """
+        self.seed = seed
+        self.latency = latency or LatencyModel()
+        self.model_name = model_name
+        self._latency_rng = random.Random(seed)
+
+    def _rng(self, messages: list) -> random.Random:
+        digest = hashlib.sha256()
+        digest.update(str(self.seed).encode())
+        for msg in messages:
+            digest.update(str(getattr(msg, "content", msg)).encode("utf-8"))
+        return random.Random(digest.hexdigest())
+
+    @staticmethod
+    def _candidate_ids(messages: list) -> List[int]:
+        """从 prompt 中提取可选的目标玩家（排除自己和已出局玩家）"""
+        system_text = "\n".join(m.content for m in messages if isinstance(m, SystemMessage))
+        own = re.search(r"玩家(\d+)", system_text)
+        own_id = int(own.group(1)) if own else None
+
+        user_text = "\n".join(m.content for m in messages if not isinstance(m, SystemMessage))
+        ids = []
+        for line in user_text.splitlines():
+            if "已出局" in line:
+                continue
+            for match in re.findall(r"玩家(\d+)", line):
+                pid = int(match)
+                if pid != own_id and pid not in ids:
+                    ids.append(pid)
+        return ids
+
+    def _generate_decision(self, schema, rng: random.Random, candidates: List[int]) -> Dict[str, Any]:
+        spec = get_decision_spec(schema)
+        target = rng.choice(candidates) if candidates else None
+        data = {}
+        for name, field_info in schema.model_fields.items():
+            annotation = str(field_info.annotation)
+            if name in ("target", "target_id"):
+                data[name] = target
+            elif name == "action_type":
+                data[name] = ACTION_TYPES.get(spec.decision_type, "vote")
+            elif name == "content":
+                data[name] = rng.choice(SPEECH_TEMPLATES).format(target=target or "?")
+            elif name == "confidence":
+                data[name] = round(rng.uniform(0.4, 0.9), 2)
+            elif "bool" in annotation:
+                data[name] = rng.random() < BOOL_PROBABILITIES.get(name, 0.5)
+            elif "str" in annotation:
+                data[name] = f"基于当前局势的判断（{spec.decision_type}）"
+            elif "float" in annotation:
+                data[name] = 0.5
+            elif "int" in annotation:
+                data[name] = target
+        return data
+
+    def _respond(self, messages: list, schema=None):
+        rng = self._rng(messages)
+        candidates = self._candidate_ids(messages)
+        if schema is not None:
+            content = json.dumps(self._generate_decision(schema, rng, candidates), ensure_ascii=False)
+        else:
+            target = rng.choice(candidates) if candidates else "?"
+            content = f"我建议今晚攻击玩家{target}，他白天的发言很像神职。"
+
+        prompt_tokens = sum(len(str(getattr(m, "content", ""))) for m in messages) // 2
+        completion_tokens = len(content) // 2
+        usage = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        return content, usage
+
+    async def ainvoke(self, messages: list, schema=None, **kwargs) -> AIMessage:
+        """
+        生成响应
+
+        Args:
+            messages: LangChain 消息列表
+            schema: 结构化输出的 Schema（提供时返回符合 Schema 的 JSON）
+
+        Returns:
+            AIMessage
+        """
+        delay = self.latency.sample(self._latency_rng)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        content, usage = self._respond(messages, schema)
+        return AIMessage(content=content, usage_metadata=usage)
+
+    async def astream(self, messages: list, schema=None, chunk_chars: int = 4, **kwargs):
+        """
+        流式生成响应：模拟延迟的 30% 用于首个片段，其余平均分配到后续片段
+
+        Yields:
+            AIMessageChunk（最后一个片段带 usage_metadata）
+        """
+        delay = self.latency.sample(self._latency_rng)
+        content, usage = self._respond(messages, schema)
+        pieces = [content[i:i + chunk_chars] for i in range(0, len(content), chunk_chars)] or [""]
+        if delay > 0:
+            await asyncio.sleep(delay * 0.3)
+        step = delay * 0.7 / len(pieces)
+        for index, piece in enumerate(pieces):
+            if index and step > 0:
+                await asyncio.sleep(step)
+            last = index == len(pieces) - 1
+            yield AIMessageChunk(content=piece, usage_metadata=usage if last else None)
+
+
+def create_local_chat_model(model: Optional[str] = None) -> LocalChatModel:
+    """
+    按环境变量创建离线模型
+
+    环境变量：LOCAL_LLM_SEED（随机种子）、LOCAL_LLM_LATENCY（延迟分布，见 LatencyModel.parse）
+    """
+    return LocalChatModel(
+        seed=int(os.getenv("LOCAL_LLM_SEED", "0")),
+        latency=LatencyModel.parse(os.getenv("LOCAL_LLM_LATENCY")),
+        model_name=model or "local-sim",
+    )
@@ -0,0 +1,75 @@
+"""
+游戏节奏控制：发言之间的停顿
+"""
+import asyncio
+from typing import Any, Dict, Literal, Optional
+
+PacingMode = Literal["turbo", "fixed", "realtime"]
+
+# 默认节奏：每次发言后停顿 0.1 秒（与旧版本行为一致）
+DEFAULT_PACING: Dict[str, Any] = {
+    "mode": "fixed",
+    "delay": 0.1,
+    "chars_per_second": 12.0,
+    "max_delay": 10.0,
+}
+
+
+def make_pacing(
+    mode: PacingMode = "fixed",
+    delay: float = 0.1,
+    chars_per_second: float = 12.0,
+    max_delay: float = 10.0
+) -> Dict[str, Any]:
+    """
+    创建节奏配置
+
+    Args:
+        mode: 节奏模式
+            - turbo: 无停顿（批量模拟、测试）
+            - fixed: 每次发言后固定停顿 delay 秒
+            - realtime: 按观众阅读速度停顿（delay + 字数 / chars_per_second，最多 max_delay 秒）
+        delay: 固定停顿时长（秒）
+        chars_per_second: 实时模式下的阅读速度（字/秒）
+        max_delay: 实时模式下单次停顿上限（秒）
+
+    Returns:
+        节奏配置字典（存放在 GameState["pacing"] 中）
+    """
+    if mode not in ("turbo", "fixed", "realtime"):
+        raise ValueError(f"Unknown pacing mode: {mode}")
+    return {
+        "mode": mode,
+        "delay": delay,
+        "chars_per_second": chars_per_second,
+        "max_delay": max_delay,
+    }
+
+
+def pacing_delay(pacing: Optional[Dict[str, Any]], content: str = "") -> float:
+    """
+    计算一次发言后的停顿时长
+
+    Args:
+        pacing: 节奏配置（为 None 时使用默认配置）
+        content: 刚刚输出的发言内容（实时模式按字数计算停顿）
+
+    Returns:
+        停顿秒数
+    """
+    pacing = pacing or DEFAULT_PACING
+    mode = pacing.get("mode", "fixed")
+    if mode == "turbo":
+        return 0.0
+    delay = pacing.get("delay", DEFAULT_PACING["delay"])
+    if mode == "realtime":
+        reading_time = len(content or "") / max(pacing.get("chars_per_second", 12.0), 1e-6)
+        return min(delay + reading_time, pacing.get("max_delay", DEFAULT_PACING["max_delay"]))
+    return delay
+
+
+async def pace(state: Dict[str, Any], content: str = "") -> None:
+    """按游戏节奏配置停顿（turbo 模式下不停顿）"""
+    seconds = pacing_delay(state.get("pacing"), content)
+    if seconds > 0:
+        await asyncio.sleep(seconds)
@@ -1,7 +1,8 @@
 """
 Prompt 构建工具：将游戏状态转换为 LLM 可理解的格式
 """
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Sequence
+from ..state.game_state import player_index
 
 
 def format_player_info(players: List[Any], include_role: bool = False) -> str:
@@ -40,7 +41,30 @@ def format_player_info(players: List[Any], include_role: bool = False) -> str:
     return "\n".join(lines) if lines else "无玩家"
 
 
-def format_game_history(history: List[Dict[str, Any]], limit: int = 5) -> str:
+def recent_speeches(history: Sequence[Dict[str, Any]], limit: int = 5) -> List[Dict[str, Any]]:
+    """
+    从历史记录中取出最近的发言
+    
+    从最新的记录往前查找 discussion 记录，找够 limit 条发言即停止。
+    
+    Args:
+        history: 历史记录（列表或 GameHistory）
+        limit: 最多返回多少条发言
+    
+    Returns:
+        发言列表（按时间顺序），每条为 {"player_id", "player_name", "content"}
+    """
+    speeches = []
+    for entry in reversed(history):
+        if entry.get("type") != "discussion":
+            continue
+        speeches[:0] = entry.get("discussions", [])
+        if len(speeches) >= limit:
+            break
+    return speeches[-limit:]
+
+
+def format_game_history(history: Sequence[Dict[str, Any]], limit: int = 5) -> str:
     """
     格式化游戏历史记录
     
@@ -54,7 +78,7 @@ def format_game_history(history: List[Dict[str, Any]], limit: int = 5) -> str:
     if not history:
         return "暂无历史记录"
     
-    recent_history = history[-limit:] if len(history) > limit else history
+    recent_history = history[-limit:]
     lines = []
     
     for entry in recent_history:
@@ -93,14 +117,14 @@ def build_seer_prompt(
     Returns:
         (system_prompt, user_prompt)
     """
-    players = game_state.get("players", [])
-    alive_players = [p for p in players if p.is_alive]
+    index = player_index(game_state)
+    alive_players = index.alive()
     seer_checks = observation.get("seer_checks", {})
     
     # 格式化已查验的玩家
     checked_info = []
     for target_id, result in seer_checks.items():
-        target_player = next((p for p in players if p.player_id == target_id), None)
+        target_player = index.get(target_id)
         if target_player:
             # 预言家只能知道是好人还是狼人
             checked_info.append(f"玩家{target_id} ({target_player.name}) - {result}")
@@ -150,8 +174,8 @@ def build_witch_antidote_prompt(
     Returns:
         (system_prompt, user_prompt)
     """
-    players = game_state.get("players", [])
-    killed_player = next((p for p in players if p.player_id == killed_player_id), None)
+    index = player_index(game_state)
+    killed_player = index.get(killed_player_id)
     
     system_prompt = """你是一名狼人杀游戏中的女巫。你拥有解药和毒药各一瓶。
 
@@ -170,7 +194,7 @@ def build_witch_antidote_prompt(
 被杀的玩家：玩家{killed_player_id} ({killed_player.name if killed_player else '未知'})
 
 存活玩家：
-{format_player_info([p for p in players if p.is_alive])}
+{format_player_info(index.alive())}
 
 解药状态：{'已使用' if observation.get('antidote_used') else '未使用'}
 毒药状态：{'已使用' if observation.get('poison_used') else '未使用'}
@@ -200,8 +224,8 @@ def build_witch_poison_prompt(
     Returns:
         (system_prompt, user_prompt)
     """
-    players = game_state.get("players", [])
-    alive_players = [p for p in players if p.is_alive]
+    index = player_index(game_state)
+    alive_players = index.alive()
     targets = [p for p in alive_players if p.player_id != agent_id]
     
     system_prompt = """你是一名狼人杀游戏中的女巫。你拥有解药和毒药各一瓶。
@@ -250,13 +274,13 @@ def build_guard_prompt(
     Returns:
         (system_prompt, user_prompt)
     """
-    players = game_state.get("players", [])
-    alive_players = [p for p in players if p.is_alive]
+    index = player_index(game_state)
+    alive_players = index.alive()
     targets = [p for p in alive_players if p.player_id != agent_id and p.player_id != last_protected_id]
     
     last_protected_info = ""
     if last_protected_id:
-        last_protected = next((p for p in players if p.player_id == last_protected_id), None)
+        last_protected = index.get(last_protected_id)
         if last_protected:
             last_protected_info = f"上一晚守护了：玩家{last_protected_id} ({last_protected.name})"
     
@@ -304,8 +328,8 @@ def build_werewolf_discuss_prompt(
     Returns:
         (system_prompt, user_prompt)
     """
-    players = game_state.get("players", [])
-    alive_players = [p for p in players if p.is_alive]
+    index = player_index(game_state)
+    alive_players = index.alive()
     non_werewolves = [p for p in alive_players if p.role != "werewolf"]
     
     teammates_info = format_player_info(werewolf_teammates, include_role=True)
@@ -354,8 +378,8 @@ def build_werewolf_vote_prompt(
     Returns:
         (system_prompt, user_prompt)
     """
-    players = game_state.get("players", [])
-    alive_players = [p for p in players if p.is_alive]
+    index = player_index(game_state)
+    alive_players = index.alive()
     targets = [p for p in alive_players if p.role != "werewolf"]
     
     # 格式化狼人频道讨论
@@ -411,8 +435,8 @@ def build_werewolf_explode_prompt(
     Returns:
         (system_prompt, user_prompt)
     """
-    players = game_state.get("players", [])
-    alive_players = [p for p in players if p.is_alive]
+    index = player_index(game_state)
+    alive_players = index.alive()
     
     system_prompt = """你是狼人杀游戏中的狼人。你可以在发言阶段自爆。
 
@@ -469,8 +493,8 @@ def build_speak_prompt(
     Returns:
         (system_prompt, user_prompt)
     """
-    players = game_state.get("players", [])
-    alive_players = [p for p in players if p.is_alive]
+    index = player_index(game_state)
+    alive_players = index.alive()
     day_number = game_state.get("day_number", 1)
     
     role_cn = {
@@ -515,8 +539,7 @@ def build_speak_prompt(
 请根据当前情况，进行发言。"""
     
     # 获取最近的发言记录
-    discussions = game_state.get("discussions", [])
-    recent_discussions = discussions[-5:] if len(discussions) > 5 else discussions
+    recent_discussions = recent_speeches(game_state.get("history", []))
     
     discussion_text = ""
     if recent_discussions:
@@ -578,8 +601,8 @@ def build_vote_prompt(
     Returns:
         (system_prompt, user_prompt)
     """
-    players = game_state.get("players", [])
-    alive_players = [p for p in players if p.is_alive]
+    index = player_index(game_state)
+    alive_players = index.alive()
     day_number = game_state.get("day_number", 1)
     
     role_cn = {
@@ -699,8 +722,8 @@ def build_last_words_prompt(
     Returns:
         (system_prompt, user_prompt)
     """
-    players = game_state.get("players", [])
-    alive_players = [p for p in players if p.is_alive]
+    index = player_index(game_state)
+    alive_players = index.alive()
     day_number = game_state.get("day_number", 1)
     
     role_cn = {
@@ -771,8 +794,8 @@ def build_sheriff_transfer_prompt(
     Returns:
         (system_prompt, user_prompt)
     """
-    players = game_state.get("players", [])
-    alive_players = [p for p in players if p.is_alive]
+    index = player_index(game_state)
+    alive_players = index.alive()
     # 可以移交给的玩家（除了自己）
     transferable_players = [p for p in alive_players if p.player_id != agent_id]
     day_number = game_state.get("day_number", 1)
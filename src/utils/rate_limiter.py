@@ -0,0 +1,189 @@
+"""
+LLM 请求限流：按 provider/model 的令牌桶（RPM 请求数 + TPM 估算 token 数）
+
+多局游戏并发时共享同一个限流器，超出预算的请求排队等待，而不是收到 429 后退化为随机决策。
+"""
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+class TokenBucket:
+    """
+    令牌桶（预约式）
+
+    acquire 时立即扣除令牌（允许透支），并按透支量计算需要等待的时间，
+    因此并发请求按到达顺序排队，且不依赖任何事件循环绑定的同步原语。
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        """
+        初始化令牌桶
+
+        Args:
+            capacity: 桶容量（允许的突发量）
+            refill_per_second: 每秒补充的令牌数
+        """
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+        self.updated_at = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        预约令牌
+
+        Args:
+            amount: 需要的令牌数（超过容量时按容量计算）
+
+        Returns:
+            需要等待的秒数
+        """
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.refill_per_second
+
+    def adjust(self, delta: float) -> None:
+        """修正令牌数（例如用实际 token 用量修正预估值，delta > 0 表示多扣）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= delta
+
+
+class RateLimiter:
+    """
+    按 (provider, model) 分别限流的 LLM 限流器
+
+    每个 (provider, model) 有两个令牌桶：每分钟请求数（RPM）和每分钟 token 数（TPM）。
+    """
+
+    def __init__(
+        self,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        per_model: Optional[Dict[Tuple[str, str], Tuple[Optional[float], Optional[float]]]] = None
+    ):
+        """
+        初始化限流器
+
+        Args:
+            rpm: 默认每分钟请求数上限（None 表示不限制）
+            tpm: 默认每分钟 token 数上限（None 表示不限制）
+            per_model: 按 (provider, model) 覆盖的上限 {(provider, model): (rpm, tpm)}
+        """
+        self.rpm = rpm
+        self.tpm = tpm
+        self.per_model = dict(per_model or {})
+        self._buckets: Dict[Tuple[str, str], Tuple[Optional[TokenBucket], Optional[TokenBucket]]] = {}
+        self._lock = threading.Lock()
+
+    def _get_buckets(self, provider: str, model: str):
+        key = (provider, model)
+        with self._lock:
+            buckets = self._buckets.get(key)
+            if buckets is None:
+                rpm, tpm = self.per_model.get(key, (self.rpm, self.tpm))
+                buckets = (
+                    TokenBucket(rpm, rpm / 60.0) if rpm else None,
+                    TokenBucket(tpm, tpm / 60.0) if tpm else None,
+                )
+                self._buckets[key] = buckets
+            return buckets
+
+    async def acquire(self, provider: str, model: str, tokens: int = 0) -> float:
+        """
+        获取一次请求的配额（不足时排队等待）
+
+        Args:
+            provider: LLM 提供商
+            model: 模型名称
+            tokens: 本次请求估算的 token 数
+
+        Returns:
+            排队等待的秒数
+        """
+        request_bucket, token_bucket = self._get_buckets(provider, model)
+        wait = 0.0
+        if request_bucket is not None:
+            wait = max(wait, request_bucket.reserve(1))
+        if token_bucket is not None and tokens > 0:
+            wait = max(wait, token_bucket.reserve(tokens))
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def record_usage(self, provider: str, model: str, estimated_tokens: int, actual_tokens: int) -> None:
+        """用实际 token 用量修正 TPM 预算"""
+        _, token_bucket = self._get_buckets(provider, model)
+        if token_bucket is not None and actual_tokens:
+            token_bucket.adjust(actual_tokens - estimated_tokens)
+
+
+def estimate_tokens(messages: list, completion_tokens: int = 300) -> int:
+    """
+    粗略估算一次请求的 token 数（中文约 1.5 字符 / token）
+
+    Args:
+        messages: LangChain 消息列表
+        completion_tokens: 预估的输出 token 数
+
+    Returns:
+        估算的总 token 数
+    """
+    chars = sum(len(getattr(msg, "content", "") or "") for msg in messages)
+    return int(chars / 1.5) + completion_tokens
+
+
+# 进程级限流器（默认读取环境变量 LLM_RPM / LLM_TPM，未设置时不限流）
+_limiter: Optional[RateLimiter] = None
+_limiter_configured = False
+_limiter_lock = threading.Lock()
+
+
+def configure_rate_limiter(
+    rpm: Optional[float] = None,
+    tpm: Optional[float] = None,
+    per_model: Optional[Dict[Tuple[str, str], Tuple[Optional[float], Optional[float]]]] = None
+) -> Optional[RateLimiter]:
+    """
+    配置进程级限流器
+
+    Args:
+        rpm: 每分钟请求数上限（None 表示不限制）
+        tpm: 每分钟 token 数上限（None 表示不限制）
+        per_model: 按 (provider, model) 覆盖的上限
+
+    Returns:
+        新的限流器（未设置任何上限时返回 None）
+    """
+    global _limiter, _limiter_configured
+    with _limiter_lock:
+        _limiter = RateLimiter(rpm, tpm, per_model) if (rpm or tpm or per_model) else None
+        _limiter_configured = True
+        return _limiter
+
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """获取进程级限流器"""
+    global _limiter, _limiter_configured
+    if _limiter_configured:
+        return _limiter
+    with _limiter_lock:
+        if not _limiter_configured:
+            rpm = float(os.getenv("LLM_RPM", "0")) or None
+            tpm = float(os.getenv("LLM_TPM", "0")) or None
+            _limiter = RateLimiter(rpm, tpm) if (rpm or tpm) else None
+            _limiter_configured = True
+    return _limiter
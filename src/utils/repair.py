@@ -0,0 +1,153 @@
+"""
+结构化输出修复：解析或校验失败时，把简短的错误和错误输出发回给 LLM，要求返回修正后的 JSON
+
+修复请求只包含错误信息和原输出（不重发完整对局 prompt），限制 max_tokens 和耗时，
+比让 Agent 退化为随机决策更便宜，也更接近真实的对局。
+"""
+import os
+import threading
+from typing import Any, Dict, List, Optional
+from langchain_core.messages import HumanMessage, SystemMessage
+from pydantic import ValidationError
+
+REPAIR_SYSTEM_PROMPT = "你上一次的输出无法被解析为要求的 JSON。请根据错误信息修正，只返回修正后的纯 JSON 对象，不要包含任何其他文本。"
+
+
+def short_error(error: BaseException, limit: int = 300) -> str:
+    """
+    生成简短的错误描述（Pydantic 校验错误只保留字段和原因）
+
+    Args:
+        error: 解析或校验异常
+        limit: 最大字符数
+
+    Returns:
+        错误描述
+    """
+    if isinstance(error, ValidationError):
+        parts = [
+            f"{'.'.join(str(loc) for loc in item['loc']) or '(root)'}: {item['msg']}"
+            for item in error.errors()
+        ]
+        text = "; ".join(parts)
+    else:
+        text = f"{type(error).__name__}: {error}"
+    return text[:limit]
+
+
+class RepairPolicy:
+    """
+    修复策略
+
+    Attributes:
+        max_attempts: 每次决策最多修复次数
+        max_tokens: 修复请求的 max_tokens
+        timeout: 单次修复请求的耗时上限（秒）
+        max_output_chars: 发回的错误输出最多保留的字符数
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 1,
+        max_tokens: int = 256,
+        timeout: float = 10.0,
+        max_output_chars: int = 1500
+    ):
+        self.max_attempts = max_attempts
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.max_output_chars = max_output_chars
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def build_messages(self, reason: str, bad_output: str, field_names: List[str]) -> list:
+        """
+        构造修复请求
+
+        Args:
+            reason: 简短的错误描述
+            bad_output: 无法解析的原始输出
+            field_names: Schema 字段名
+
+        Returns:
+            LangChain 消息列表
+        """
+        user_prompt = (
+            f"错误：{reason}\n\n"
+            f"你的输出：\n{bad_output[:self.max_output_chars]}\n\n"
+            f"必需字段：{', '.join(field_names)}"
+        )
+        return [SystemMessage(content=REPAIR_SYSTEM_PROMPT), HumanMessage(content=user_prompt)]
+
+    def record(self, decision_type: str, success: bool) -> None:
+        """记录一次修复结果"""
+        with self._lock:
+            counters = self._stats.setdefault(decision_type, {"attempts": 0, "successes": 0})
+            counters["attempts"] += 1
+            if success:
+                counters["successes"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取修复成功率
+
+        Returns:
+            {"attempts", "successes", "success_rate", "by_decision": {decision_type: {...}}}
+        """
+        with self._lock:
+            by_decision = {
+                decision_type: dict(
+                    counters,
+                    success_rate=counters["successes"] / counters["attempts"] if counters["attempts"] else 0.0
+                )
+                for decision_type, counters in self._stats.items()
+            }
+        attempts = sum(c["attempts"] for c in by_decision.values())
+        successes = sum(c["successes"] for c in by_decision.values())
+        return {
+            "attempts": attempts,
+            "successes": successes,
+            "success_rate": successes / attempts if attempts else 0.0,
+            "by_decision": by_decision,
+        }
+
+
+# 进程级修复策略（默认开启，环境变量 LLM_REPAIR_ATTEMPTS=0 关闭）
+_policy: Optional[RepairPolicy] = None
+_policy_configured = False
+_policy_lock = threading.Lock()
+
+
+def configure_repair(enabled: bool = True, **kwargs) -> Optional[RepairPolicy]:
+    """
+    配置进程级修复策略
+
+    Args:
+        enabled: 是否开启
+        **kwargs: 传给 RepairPolicy 的参数
+
+    Returns:
+        新的修复策略（关闭时返回 None）
+    """
+    global _policy, _policy_configured
+    with _policy_lock:
+        _policy = RepairPolicy(**kwargs) if enabled else None
+        _policy_configured = True
+        return _policy
+
+
+def get_repair_policy() -> Optional[RepairPolicy]:
+    """获取进程级修复策略"""
+    global _policy, _policy_configured
+    if _policy_configured:
+        return _policy
+    with _policy_lock:
+        if not _policy_configured:
+            max_attempts = int(os.getenv("LLM_REPAIR_ATTEMPTS", "1"))
+            if max_attempts > 0:
+                _policy = RepairPolicy(
+                    max_attempts=max_attempts,
+                    timeout=float(os.getenv("LLM_REPAIR_TIMEOUT", "10"))
+                )
+            _policy_configured = True
+    return _policy
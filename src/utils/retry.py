@@ -0,0 +1,211 @@
+"""
+LLM 请求重试：区分临时性传输错误和不可重试错误，带抖动的指数退避 + 按决策类型的截止时间
+
+- 临时性错误（超时、连接失败、429、5xx）：重试，优先遵守服务端的 Retry-After
+- 解析失败、4xx 等：不重试，直接交给调用方（解析失败由修复流程处理）
+"""
+import asyncio
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Literal, Optional
+import httpx
+import openai
+from tenacity import (
+    AsyncRetrying,
+    RetryCallState,
+    retry_if_exception,
+    stop_after_attempt,
+    stop_before_delay,
+    wait_random_exponential,
+)
+
+ErrorKind = Literal["transient", "rate_limited", "fatal"]
+
+TRANSIENT_STATUS_CODES = {408, 409, 425, 500, 502, 503, 504}
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def classify_error(error: BaseException) -> ErrorKind:
+    """
+    对 LLM 请求异常分类
+
+    Args:
+        error: 异常
+
+    Returns:
+        transient（可重试的传输错误）/ rate_limited（429）/ fatal（不可重试）
+    """
+    status = _status_code(error)
+    if status == 429 or isinstance(error, openai.RateLimitError):
+        return "rate_limited"
+    if status is not None:
+        return "transient" if status in TRANSIENT_STATUS_CODES or status >= 500 else "fatal"
+    if isinstance(error, (asyncio.TimeoutError, httpx.TransportError, openai.APIConnectionError)):
+        return "transient"
+    return "fatal"
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """
+    读取服务端要求的等待时间（Retry-After / retry-after-ms 响应头）
+
+    Returns:
+        等待秒数，没有该响应头时返回 None
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class RetryPolicy:
+    """
+    LLM 请求重试策略
+
+    每次决策有一个总截止时间：预计等待后会超过截止时间时不再重试，
+    单次请求的超时也不会超过剩余时间，保证延迟有界。
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        deadline: Optional[float] = 60.0,
+        deadline_by_decision: Optional[Dict[str, Optional[float]]] = None
+    ):
+        """
+        初始化重试策略
+
+        Args:
+            max_attempts: 最多尝试次数（含第一次）
+            base_delay: 退避基数（秒）
+            max_delay: 单次退避上限（秒）
+            deadline: 默认每次决策的总截止时间（秒），None 表示不限制
+            deadline_by_decision: 按决策类型覆盖截止时间 {decision_type: deadline}
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.deadline_by_decision = dict(deadline_by_decision or {})
+        self._jitter = wait_random_exponential(multiplier=base_delay, max=max_delay)
+
+    def deadline_for(self, decision_type: str) -> Optional[float]:
+        """获取决策类型的截止时间"""
+        return self.deadline_by_decision.get(decision_type, self.deadline)
+
+    def _wait(self, retry_state: RetryCallState) -> float:
+        error = retry_state.outcome.exception()
+        retry_after = retry_after_seconds(error) if error is not None else None
+        if retry_after is not None:
+            return retry_after
+        return self._jitter(retry_state)
+
+    async def run(
+        self,
+        decision_type: str,
+        attempt: Callable[[], Awaitable[Any]],
+        on_retry: Optional[Callable[[BaseException], None]] = None
+    ) -> Any:
+        """
+        执行请求（临时性错误时重试）
+
+        Args:
+            decision_type: 决策类型
+            attempt: 发起一次请求的协程工厂
+            on_retry: 每次重试前的回调（参数为上一次的异常）
+
+        Returns:
+            请求结果
+
+        Raises:
+            最后一次请求的异常（不可重试、次数用尽或超过截止时间）
+        """
+        deadline = self.deadline_for(decision_type)
+        stop = stop_after_attempt(self.max_attempts)
+        if deadline is not None:
+            stop = stop | stop_before_delay(deadline)
+        started = time.monotonic()
+
+        def before_sleep(retry_state: RetryCallState) -> None:
+            if on_retry is not None:
+                on_retry(retry_state.outcome.exception())
+
+        retrying = AsyncRetrying(
+            stop=stop,
+            wait=self._wait,
+            retry=retry_if_exception(lambda e: classify_error(e) != "fatal"),
+            before_sleep=before_sleep,
+            reraise=True,
+        )
+        async for attempt_state in retrying:
+            with attempt_state:
+                if deadline is None:
+                    return await attempt()
+                remaining = deadline - (time.monotonic() - started)
+                return await asyncio.wait_for(attempt(), timeout=max(remaining, 0.001))
+
+
+# 进程级重试策略（默认开启，环境变量 LLM_MAX_ATTEMPTS / LLM_RETRY_DEADLINE 配置）
+_policy: Optional[RetryPolicy] = None
+_policy_configured = False
+_policy_lock = threading.Lock()
+
+
+def configure_retry(enabled: bool = True, **kwargs) -> Optional[RetryPolicy]:
+    """
+    配置进程级重试策略
+
+    Args:
+        enabled: 是否开启（关闭时每次决策只请求一次）
+        **kwargs: 传给 RetryPolicy 的参数
+
+    Returns:
+        新的重试策略（关闭时返回 None）
+    """
+    global _policy, _policy_configured
+    with _policy_lock:
+        _policy = RetryPolicy(**kwargs) if enabled else None
+        _policy_configured = True
+        return _policy
+
+
+def get_retry_policy() -> Optional[RetryPolicy]:
+    """获取进程级重试策略"""
+    global _policy, _policy_configured
+    if _policy_configured:
+        return _policy
+    with _policy_lock:
+        if not _policy_configured:
+            max_attempts = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+            if max_attempts > 1:
+                deadline = float(os.getenv("LLM_RETRY_DEADLINE", "60"))
+                _policy = RetryPolicy(max_attempts=max_attempts, deadline=deadline or None)
+            _policy_configured = True
+    return _policy
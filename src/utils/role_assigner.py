@@ -2,11 +2,15 @@
 身份分配工具
 """
 import random
-from typing import List, Dict
+from typing import List, Dict, Optional
 from ..state.game_state import Player
 
 
-def assign_roles(player_names: List[str], role_config: Dict[str, int] = None) -> List[Player]:
+def assign_roles(
+    player_names: List[str],
+    role_config: Dict[str, int] = None,
+    rng: Optional[random.Random] = None
+) -> List[Player]:
     """
     随机分配身份
     
@@ -15,6 +19,7 @@ def assign_roles(player_names: List[str], role_config: Dict[str, int] = None) ->
         role_config: 角色配置，格式为 {role: count}
                     默认配置：4人局（2村民+2狼人），6人局（3村民+2狼人+1预言家），
                     8人局（3村民+2狼人+1预言家+1女巫+1守卫）
+        rng: 随机数生成器（传入带种子的 random.Random 可复现分配结果，默认使用全局 random）
     
     Returns:
         分配好身份的玩家列表
@@ -42,7 +47,7 @@ def assign_roles(player_names: List[str], role_config: Dict[str, int] = None) ->
         roles.extend([role] * count)
     
     # 随机打乱
-    random.shuffle(roles)
+    (rng or random).shuffle(roles)
     
     # 创建玩家对象
     players = []
@@ -0,0 +1,112 @@
+"""
+单飞（single-flight）合并：完全相同的请求同时在途时，只向服务端发送一次，其余请求等待同一个结果
+
+只在采样确定（temperature=0）或调用方显式允许时合并，不改变对局结果。
+"""
+import asyncio
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class SingleFlight:
+    """
+    在途请求合并器
+
+    按 (事件循环, 请求键) 记录在途任务；后到的相同请求等待同一个任务。
+    任务用 asyncio.shield 保护，某个等待者被取消不会影响其他等待者。
+    """
+
+    def __init__(self, coalesce_all: bool = False):
+        """
+        初始化合并器
+
+        Args:
+            coalesce_all: 是否合并所有相同请求（包括 temperature > 0 的请求）
+        """
+        self.coalesce_all = coalesce_all
+        self._inflight: Dict[Tuple[int, str], asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self._stats = {"leaders": 0, "followers": 0}
+
+    def should_coalesce(self, temperature: float, opt_in: Optional[bool] = None) -> bool:
+        """
+        判断请求是否可以合并
+
+        Args:
+            temperature: 温度参数
+            opt_in: 调用方显式指定（None 表示按温度和 coalesce_all 决定）
+        """
+        if opt_in is not None:
+            return opt_in
+        return self.coalesce_all or temperature == 0
+
+    async def do(self, key: str, request: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        执行请求（相同键的请求在途时等待其结果）
+
+        Args:
+            key: 请求键
+            request: 发起请求的协程工厂
+
+        Returns:
+            (结果, 是否复用了其他请求的结果)
+        """
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        with self._lock:
+            task = self._inflight.get(flight_key)
+            shared = task is not None
+            if task is None:
+                task = loop.create_task(request())
+                self._inflight[flight_key] = task
+                task.add_done_callback(lambda _: self._forget(flight_key, task))
+            self._stats["followers" if shared else "leaders"] += 1
+        return await asyncio.shield(task), shared
+
+    def _forget(self, flight_key: Tuple[int, str], task: asyncio.Task) -> None:
+        with self._lock:
+            if self._inflight.get(flight_key) is task:
+                del self._inflight[flight_key]
+
+    def stats(self) -> Dict[str, int]:
+        """获取合并统计 {"leaders", "followers", "inflight"}"""
+        with self._lock:
+            return dict(self._stats, inflight=len(self._inflight))
+
+
+# 进程级合并器（默认开启，只合并 temperature=0 或显式允许的请求；LLM_SINGLE_FLIGHT=0 关闭）
+_single_flight: Optional[SingleFlight] = None
+_single_flight_configured = False
+_single_flight_lock = threading.Lock()
+
+
+def configure_single_flight(enabled: bool = True, **kwargs) -> Optional[SingleFlight]:
+    """
+    配置进程级合并器
+
+    Args:
+        enabled: 是否开启
+        **kwargs: 传给 SingleFlight 的参数
+
+    Returns:
+        新的合并器（关闭时返回 None）
+    """
+    global _single_flight, _single_flight_configured
+    with _single_flight_lock:
+        _single_flight = SingleFlight(**kwargs) if enabled else None
+        _single_flight_configured = True
+        return _single_flight
+
+
+def get_single_flight() -> Optional[SingleFlight]:
+    """获取进程级合并器"""
+    global _single_flight, _single_flight_configured
+    if _single_flight_configured:
+        return _single_flight
+    with _single_flight_lock:
+        if not _single_flight_configured:
+            if os.getenv("LLM_SINGLE_FLIGHT", "1").lower() not in ("0", "false", "no"):
+                _single_flight = SingleFlight()
+            _single_flight_configured = True
+    return _single_flight
@@ -0,0 +1,293 @@
+"""
+LLM 调用遥测：记录每次调用的耗时、token 用量和兜底情况，按局 / 全程汇总
+
+调用上下文（game_id、节点名、Agent 角色）通过 contextvars 传递，
+asyncio.gather 创建的子任务会自动继承。
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+from pydantic import BaseModel
+
+# 当前调用上下文：{"game_id", "node", "role", "agent_id"}
+_call_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar(
+    "llm_call_context", default={}
+)
+
+
+class LLMCallRecord(BaseModel):
+    """
+    单次 LLM 调用记录
+
+    耗时单位均为秒（ttft 为流式请求首个片段的到达时间）；fallback=True 的记录表示 Agent 放弃了 LLM 结果，改用默认决策；
+    stream_diverged=True 表示流式发出的内容与最终结果不一致（例如经过修复），调用方需要以最终结果替换已输出的内容。
+    parse_time 只包含本地解析耗时；修复请求各自有一条记录（decision_type 带 _repair 后缀），其网络耗时不计入原调用。
+    """
+    decision_type: str = "text"
+    game_id: Optional[str] = None
+    day: Optional[int] = None
+    node: Optional[str] = None
+    role: Optional[str] = None
+    agent_id: Optional[int] = None
+    model: Optional[str] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    queue_wait: float = 0.0
+    latency: float = 0.0
+    ttft: Optional[float] = None
+    parse_time: float = 0.0
+    retries: int = 0
+    repairs: int = 0
+    repaired: bool = False
+    cache_hit: bool = False
+    coalesced: bool = False
+    stream_diverged: bool = False
+    fallback: bool = False
+    error: Optional[str] = None
+
+
+@contextmanager
+def telemetry_context(**fields):
+    """
+    设置调用上下文（在 with 块内发起的 LLM 调用都会带上这些字段）
+
+    Args:
+        **fields: game_id / day / node / role / agent_id
+    """
+    token = _call_context.set({**_call_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _call_context.reset(token)
+
+
+def current_context() -> Dict[str, Any]:
+    """获取当前调用上下文（game_id / day / node / role / agent_id）"""
+    return dict(_call_context.get())
+
+
+def with_node_context(name: str, node: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]):
+    """
+    包装图节点：节点内发起的 LLM 调用（和日志）带上 game_id、天数和节点名
+
+    Args:
+        name: 节点名
+        node: 异步节点函数
+
+    Returns:
+        包装后的节点函数
+    """
+    @functools.wraps(node)
+    async def wrapper(state):
+        with telemetry_context(game_id=state.get("game_id"), day=state.get("day_number"), node=name):
+            return await node(state)
+    return wrapper
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    计算分位数（线性插值）
+
+    Args:
+        values: 数值列表
+        q: 分位（0-100）
+
+    Returns:
+        分位数，列表为空时返回 0.0
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _distribution(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else 0.0,
+        "total": sum(values),
+    }
+
+
+class LLMTelemetry:
+    """LLM 调用遥测收集器（线程安全，超过 max_records 时丢弃最早的记录）"""
+
+    def __init__(self, max_records: int = 100_000):
+        self._records: "deque[LLMCallRecord]" = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def start_call(self, decision_type: str = "text", **fields) -> LLMCallRecord:
+        """
+        创建一条调用记录（自动带上当前调用上下文，尚未提交）
+
+        Args:
+            decision_type: 决策类型
+            **fields: 覆盖上下文的字段（如 role）
+
+        Returns:
+            LLMCallRecord
+        """
+        context = {k: v for k, v in fields.items() if v is not None}
+        return LLMCallRecord(decision_type=decision_type, **{**_call_context.get(), **context})
+
+    def submit(self, record: LLMCallRecord) -> None:
+        """提交调用记录"""
+        with self._lock:
+            self._records.append(record)
+
+    def record_fallback(self, decision_type: str, error: Any = None, role: Optional[str] = None) -> None:
+        """
+        记录一次兜底（Agent 因 LLM 失败或返回非法结果而使用默认决策）
+
+        Args:
+            decision_type: 决策类型
+            error: 失败原因
+            role: Agent 角色
+        """
+        record = self.start_call(decision_type, role=role)
+        record.fallback = True
+        record.error = str(error) if error is not None else None
+        self.submit(record)
+
+    def records(self, game_id: Optional[str] = None) -> List[LLMCallRecord]:
+        """获取调用记录（可按 game_id 过滤）"""
+        with self._lock:
+            records = list(self._records)
+        if game_id is not None:
+            records = [r for r in records if r.game_id == game_id]
+        return records
+
+    def game_ids(self) -> List[str]:
+        """获取有记录的所有 game_id（按首次出现顺序）"""
+        return list(dict.fromkeys(r.game_id for r in self.records() if r.game_id))
+
+    @staticmethod
+    def _summarize(records: Iterable[LLMCallRecord]) -> Dict[str, Any]:
+        calls = [r for r in records if not r.fallback]
+        fallbacks = sum(1 for r in records if r.fallback)
+        network_calls = [r for r in calls if not (r.cache_hit or r.coalesced)]
+        return {
+            "calls": len(calls),
+            "cache_hits": sum(1 for r in calls if r.cache_hit),
+            "coalesced": sum(1 for r in calls if r.coalesced),
+            "errors": sum(1 for r in calls if r.error),
+            "retries": sum(r.retries for r in calls),
+            "repairs": sum(r.repairs for r in calls),
+            "repaired": sum(1 for r in calls if r.repaired),
+            "stream_divergences": sum(1 for r in calls if r.stream_diverged),
+            "fallbacks": fallbacks,
+            "fallback_rate": fallbacks / len(calls) if calls else 0.0,
+            "prompt_tokens": sum(r.prompt_tokens for r in calls),
+            "completion_tokens": sum(r.completion_tokens for r in calls),
+            "latency": _distribution([r.latency for r in network_calls]),
+            "ttft": _distribution([r.ttft for r in network_calls if r.ttft is not None]),
+            "queue_wait": _distribution([r.queue_wait for r in network_calls]),
+            "parse_time": _distribution([r.parse_time for r in calls]),
+        }
+
+    def summary(self, game_id: Optional[str] = None, group_by: str = "decision_type") -> Dict[str, Any]:
+        """
+        汇总统计
+
+        Args:
+            game_id: 只统计某一局（为 None 时统计全程）
+            group_by: 分组字段（decision_type / node / role / model）
+
+        Returns:
+            {"overall": {...}, "by_<group_by>": {key: {...}}}，每组包含调用数、兜底率、
+            token 用量以及 latency / ttft / queue_wait / parse_time 的 p50/p95/p99
+        """
+        records = self.records(game_id)
+        groups: Dict[str, List[LLMCallRecord]] = {}
+        for record in records:
+            groups.setdefault(str(getattr(record, group_by)), []).append(record)
+        return {
+            "overall": self._summarize(records),
+            f"by_{group_by}": {key: self._summarize(group) for key, group in groups.items()},
+        }
+
+    def to_dict(self, include_records: bool = False) -> Dict[str, Any]:
+        """导出全程汇总、每局汇总（以及可选的原始记录）"""
+        data = {
+            "run": self.summary(),
+            "games": {game_id: self.summary(game_id) for game_id in self.game_ids()},
+        }
+        if include_records:
+            data["records"] = [r.model_dump() for r in self.records()]
+        return data
+
+    def dump_json(self, path: Optional[str] = None, include_records: bool = False) -> str:
+        """
+        导出为 JSON
+
+        Args:
+            path: 输出文件路径（为 None 时只返回字符串）
+            include_records: 是否包含原始调用记录
+
+        Returns:
+            JSON 字符串
+        """
+        text = json.dumps(self.to_dict(include_records), ensure_ascii=False, indent=2)
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        return text
+
+    def clear(self) -> None:
+        """清空所有记录"""
+        with self._lock:
+            self._records.clear()
+
+
+# 进程级遥测收集器（默认开启，环境变量 LLM_TELEMETRY=0 关闭）
+_telemetry: Optional[LLMTelemetry] = None
+_telemetry_configured = False
+_telemetry_lock = threading.Lock()
+
+
+def configure_telemetry(enabled: bool = True, **kwargs) -> Optional[LLMTelemetry]:
+    """
+    配置进程级遥测收集器
+
+    Args:
+        enabled: 是否开启
+        **kwargs: 传给 LLMTelemetry 的参数
+
+    Returns:
+        新的收集器（关闭时返回 None）
+    """
+    global _telemetry, _telemetry_configured
+    with _telemetry_lock:
+        _telemetry = LLMTelemetry(**kwargs) if enabled else None
+        _telemetry_configured = True
+        return _telemetry
+
+
+def get_telemetry() -> Optional[LLMTelemetry]:
+    """获取进程级遥测收集器"""
+    global _telemetry, _telemetry_configured
+    if _telemetry_configured:
+        return _telemetry
+    with _telemetry_lock:
+        if not _telemetry_configured:
+            if os.getenv("LLM_TELEMETRY", "1").lower() not in ("0", "false", "no"):
+                _telemetry = LLMTelemetry()
+            _telemetry_configured = True
+    return _telemetry
+
+
+def record_fallback(decision_type: str, error: Any = None, role: Optional[str] = None) -> None:
+    """记录一次 Agent 兜底（遥测关闭时不做任何事）"""
+    telemetry = get_telemetry()
+    if telemetry is not None:
+        telemetry.record_fallback(decision_type, error, role=role)
@@ -0,0 +1,402 @@
+"""
+锦标赛：在同一个事件循环中并发运行多局游戏，并增量汇总结果（胜率、对局长度、token 用量、耗时）
+
+所有对局共享进程级的 LLM 客户端、限流器和缓存；每局使用独立的随机种子，
+本地后端下相同种子得到相同的对局。对局数很多时，可以用 run_tournament_processes
+把对局分给多个进程（每个进程一个事件循环），绕开单个解释器的 CPU 瓶颈。
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import random
+import signal
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from pydantic import BaseModel, Field
+from .pacing import make_pacing
+from .rate_limiter import configure_rate_limiter
+from .role_assigner import assign_roles
+from .telemetry import configure_telemetry, get_telemetry, percentile
+
+
+class GameSpec(BaseModel):
+    """一局游戏的配置"""
+    game_index: int
+    seed: int
+    player_count: int = 6
+    role_config: Optional[Dict[str, int]] = None  # 为 None 时按人数使用 assign_roles 的默认配置
+    max_rounds: int = 20
+
+
+class GameResult(BaseModel):
+    """一局游戏的结果"""
+    game_index: int
+    seed: int
+    game_id: Optional[str] = None
+    player_count: int
+    role_config: Dict[str, int] = Field(default_factory=dict)
+    winner: Optional[str] = None
+    days: int = 0
+    rounds: int = 0
+    wall_time: float = 0.0
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    fallbacks: int = 0
+    error: Optional[str] = None
+
+
+def make_game_specs(
+    games: int,
+    seed: int = 0,
+    player_counts: Iterable[int] = (6,),
+    role_configs: Optional[Dict[int, Dict[str, int]]] = None,
+    max_rounds: int = 20
+) -> List[GameSpec]:
+    """
+    生成锦标赛的对局配置（人数轮流使用，每局的种子由总种子派生）
+
+    Args:
+        games: 对局数
+        seed: 总种子
+        player_counts: 参与轮换的玩家人数
+        role_configs: 按人数指定的角色配置 {人数: {role: count}}
+        max_rounds: 每局最大轮次
+
+    Returns:
+        对局配置列表
+    """
+    player_counts = list(player_counts)
+    role_configs = role_configs or {}
+    seeds = random.Random(seed)
+    specs = []
+    for index in range(games):
+        count = player_counts[index % len(player_counts)]
+        specs.append(GameSpec(
+            game_index=index,
+            seed=seeds.randrange(2 ** 31),
+            player_count=count,
+            role_config=role_configs.get(count),
+            max_rounds=max_rounds,
+        ))
+    return specs
+
+
+class TournamentStats:
+    """锦标赛结果的增量汇总"""
+
+    def __init__(self):
+        self.results: List[GameResult] = []
+        self.started = time.perf_counter()
+        self.cancelled = False  # 是否被中断（Ctrl-C）
+
+    def add(self, result: GameResult) -> None:
+        """加入一局结果"""
+        self.results.append(result)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        汇总统计
+
+        Returns:
+            {"games", "errors", "win_rates", "days", "wall_time", "tokens", "games_per_minute", ...}
+        """
+        finished = [r for r in self.results if r.error is None]
+        winners = Counter(r.winner or "draw" for r in finished)
+        elapsed = time.perf_counter() - self.started
+        wall_times = [r.wall_time for r in finished]
+        days = [r.days for r in finished]
+        return {
+            "games": len(self.results),
+            "errors": len(self.results) - len(finished),
+            "win_rates": {winner: count / len(finished) for winner, count in winners.items()},
+            "days": {
+                "mean": sum(days) / len(days) if days else 0.0,
+                "p50": percentile(days, 50),
+                "max": max(days) if days else 0,
+            },
+            "wall_time": {
+                "mean": sum(wall_times) / len(wall_times) if wall_times else 0.0,
+                "p50": percentile(wall_times, 50),
+                "p95": percentile(wall_times, 95),
+            },
+            "llm_calls": sum(r.llm_calls for r in finished),
+            "prompt_tokens": sum(r.prompt_tokens for r in finished),
+            "completion_tokens": sum(r.completion_tokens for r in finished),
+            "fallbacks": sum(r.fallbacks for r in finished),
+            "cancelled": self.cancelled,
+            "elapsed": elapsed,
+            "games_per_minute": len(self.results) / elapsed * 60 if elapsed > 0 else 0.0,
+        }
+
+
+async def run_game_spec(
+    spec: GameSpec,
+    graph=None,
+    recursion_limit: int = 500,
+    **state_options
+) -> GameResult:
+    """
+    运行一局游戏（出错时记录在结果中，不抛出）
+
+    Args:
+        spec: 对局配置
+        graph: 编译好的游戏图（为 None 时新建）
+        recursion_limit: LangGraph 递归上限
+        **state_options: 传给 init_state 的运行配置（如 parallel_voting）
+
+    Returns:
+        对局结果
+    """
+    from ..graph.game_graph import create_game_graph, run_game
+    from ..state.game_state import StateManager
+
+    graph = graph if graph is not None else create_game_graph()
+    players = assign_roles(
+        [f"玩家{i}" for i in range(1, spec.player_count + 1)],
+        role_config=spec.role_config,
+        rng=random.Random(spec.seed)
+    )
+    state_options.setdefault("pacing", make_pacing("turbo"))
+    initial_state = StateManager().init_state(
+        players, max_rounds=spec.max_rounds, seed=spec.seed, **state_options
+    )
+    result = GameResult(
+        game_index=spec.game_index,
+        seed=spec.seed,
+        game_id=initial_state["game_id"],
+        player_count=spec.player_count,
+        role_config=dict(Counter(p.role for p in players)),
+    )
+
+    started = time.perf_counter()
+    try:
+        # run_game 在出错、超过递归上限或被取消时同样释放本局名册
+        final_state = await run_game(initial_state, graph=graph, config={"recursion_limit": recursion_limit})
+        result.winner = final_state.get("winner")
+        result.days = final_state.get("day_number", 0)
+        result.rounds = final_state.get("round_number", 0)
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    result.wall_time = time.perf_counter() - started
+
+    telemetry = get_telemetry()
+    if telemetry is not None:
+        overall = telemetry.summary(result.game_id)["overall"]
+        result.llm_calls = overall["calls"]
+        result.prompt_tokens = overall["prompt_tokens"]
+        result.completion_tokens = overall["completion_tokens"]
+        result.fallbacks = overall["fallbacks"]
+    return result
+
+
+async def run_tournament(
+    specs: List[GameSpec],
+    concurrency: int = 8,
+    output_path: Optional[str] = None,
+    on_result: Optional[Callable[[GameResult, TournamentStats], None]] = None,
+    recursion_limit: int = 500,
+    **state_options
+) -> TournamentStats:
+    """
+    在当前事件循环中并发运行多局游戏
+
+    每局结束后立即写入一行 JSONL（{"type": "game", ...}），全部结束后追加汇总行（{"type": "summary", ...}）。
+    限流、缓存等通过进程级配置共享（如 configure_rate_limiter）。
+
+    Args:
+        specs: 对局配置列表
+        concurrency: 同时进行的最大对局数
+        output_path: JSONL 结果文件路径（为 None 时不写文件）
+        on_result: 每局结束后的回调（用于显示进度）
+        recursion_limit: LangGraph 递归上限
+        **state_options: 传给 init_state 的运行配置
+
+    Returns:
+        汇总统计
+    """
+    from ..graph.game_graph import create_game_graph
+
+    graph = create_game_graph()
+    stats = TournamentStats()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    output = open(output_path, "a", encoding="utf-8") if output_path else None
+
+    def write(entry: Dict[str, Any]) -> None:
+        if output is not None:
+            output.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            output.flush()
+
+    async def run(spec: GameSpec) -> None:
+        async with semaphore:
+            result = await run_game_spec(spec, graph, recursion_limit, **state_options)
+        stats.add(result)
+        write({"type": "game", **result.model_dump()})
+        if on_result is not None:
+            on_result(result, stats)
+
+    try:
+        await asyncio.gather(*(run(spec) for spec in specs))
+        write({"type": "summary", **stats.summary()})
+    finally:
+        if output is not None:
+            output.close()
+    return stats
+
+
+def _worker_main(
+    specs: List[Dict[str, Any]],
+    concurrency: int,
+    rpm: Optional[float],
+    tpm: Optional[float],
+    recursion_limit: int,
+    state_options: Dict[str, Any],
+    results: "multiprocessing.Queue",
+    stop: "multiprocessing.synchronize.Event"
+) -> None:
+    """工作进程：在自己的事件循环中运行分到的对局，每局结果立即发回主进程"""
+    # Ctrl-C 由主进程统一处理，通过 stop 通知工作进程
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    configure_rate_limiter(rpm=rpm, tpm=tpm)
+    configure_telemetry(enabled=True)
+
+    async def main():
+        tournament = asyncio.ensure_future(run_tournament(
+            [GameSpec(**spec) for spec in specs],
+            concurrency=concurrency,
+            on_result=lambda result, _: results.put(("result", result.model_dump())),
+            recursion_limit=recursion_limit,
+            **state_options
+        ))
+        while not tournament.done():
+            if stop.is_set():
+                tournament.cancel()
+                break
+            await asyncio.wait({tournament}, timeout=0.2)
+        try:
+            await tournament
+        except asyncio.CancelledError:
+            pass
+
+    try:
+        asyncio.run(main())
+    finally:
+        results.put(("done", None))
+
+
+def run_tournament_processes(
+    specs: List[GameSpec],
+    workers: Optional[int] = None,
+    concurrency: int = 8,
+    output_path: Optional[str] = None,
+    on_result: Optional[Callable[[GameResult, TournamentStats], None]] = None,
+    rpm: Optional[float] = None,
+    tpm: Optional[float] = None,
+    recursion_limit: int = 500,
+    **state_options
+) -> TournamentStats:
+    """
+    把对局分给多个进程运行（每个进程一个事件循环，各自最多 concurrency 局同时进行）
+
+    全局限流预算（rpm / tpm，未指定时读取 LLM_RPM / LLM_TPM）平均分给各进程；
+    每局结果实时发回主进程，由主进程增量汇总并写入 JSONL（格式与 run_tournament 相同）。
+    Ctrl-C 时通知各进程取消未完成的对局，返回已完成对局的汇总（cancelled=True）。
+
+    Args:
+        specs: 对局配置列表
+        workers: 进程数（默认 CPU 核数）
+        concurrency: 每个进程同时进行的最大对局数
+        output_path: JSONL 结果文件路径
+        on_result: 每局结束后的回调（在主进程中调用）
+        rpm: 所有进程共享的每分钟请求数上限
+        tpm: 所有进程共享的每分钟 token 数上限
+        recursion_limit: LangGraph 递归上限
+        **state_options: 传给 init_state 的运行配置（需要可以 pickle）
+
+    Returns:
+        汇总统计
+    """
+    workers = max(1, min(workers or os.cpu_count() or 1, len(specs)))
+    rpm = rpm if rpm is not None else float(os.getenv("LLM_RPM", "0")) or None
+    tpm = tpm if tpm is not None else float(os.getenv("LLM_TPM", "0")) or None
+
+    # spawn：子进程不继承父进程的线程、连接池和事件循环
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    stop = context.Event()
+    processes = [
+        context.Process(
+            target=_worker_main,
+            args=(
+                [spec.model_dump() for spec in specs[index::workers]],
+                concurrency,
+                rpm / workers if rpm else None,
+                tpm / workers if tpm else None,
+                recursion_limit,
+                state_options,
+                results,
+                stop,
+            ),
+            daemon=True,
+        )
+        for index in range(workers)
+    ]
+
+    stats = TournamentStats()
+    output = open(output_path, "a", encoding="utf-8") if output_path else None
+
+    def write(entry: Dict[str, Any]) -> None:
+        if output is not None:
+            output.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            output.flush()
+
+    def collect(timeout: float) -> bool:
+        """接收一条工作进程消息，返回是否为进程结束消息"""
+        kind, payload = results.get(timeout=timeout)
+        if kind == "done":
+            return True
+        result = GameResult(**payload)
+        stats.add(result)
+        write({"type": "game", **result.model_dump()})
+        if on_result is not None:
+            on_result(result, stats)
+        return False
+
+    for process in processes:
+        process.start()
+    running = workers
+    try:
+        try:
+            while running:
+                try:
+                    if collect(timeout=0.5):
+                        running -= 1
+                except queue.Empty:
+                    # 工作进程异常退出时不会发送结束消息
+                    if not any(process.is_alive() for process in processes):
+                        break
+        except KeyboardInterrupt:
+            stats.cancelled = True
+            stop.set()
+            # 收集取消前已经完成的对局
+            deadline = time.monotonic() + 10
+            while running and time.monotonic() < deadline:
+                try:
+                    if collect(timeout=0.5):
+                        running -= 1
+                except queue.Empty:
+                    if not any(process.is_alive() for process in processes):
+                        break
+        write({"type": "summary", **stats.summary()})
+    finally:
+        stop.set()
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        if output is not None:
+            output.close()
+    return stats
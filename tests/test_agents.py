@@ -140,3 +140,53 @@ async def test_seer_check_player(mock_llm_client):
     result = await seer.check_player(state, 999)
     assert result == {}
 
+
+
+@pytest.mark.asyncio
+async def test_agent_roster_reuses_agents(mock_llm_client):
+    """测试 Agent 名册在整局游戏中复用同一个 Agent 实例"""
+    from src.utils.agent_roster import build_roster, get_roster, release_roster
+    
+    manager = StateManager()
+    players = [
+        Player(player_id=1, name="玩家1", role="seer"),
+        Player(player_id=2, name="玩家2", role="werewolf"),
+        Player(player_id=3, name="玩家3", role="werewolf"),
+    ]
+    state = manager.init_state(players)
+    roster = build_roster(state["game_id"], players, llm_client=mock_llm_client)
+    
+    assert get_roster(state) is roster
+    seer = roster.get(players[0])
+    assert roster.get(players[0]) is seer
+    
+    # 私有状态跨阶段保留
+    await seer.check_player(state, 2)
+    assert get_roster(state).get(players[0]).check_history == [{2: "狼人"}]
+    
+    # 狼人知道团队成员
+    assert roster.get(players[1]).werewolf_team == [2, 3]
+    
+    release_roster(state["game_id"])
+    assert get_roster(state) is not roster
+
+
+@pytest.mark.asyncio
+async def test_fallback_choices_use_roster_rng():
+    """测试 LLM 调用失败时的兜底随机选择使用本局的随机数生成器（同一种子可复现）"""
+    from src.utils.agent_roster import AgentRoster
+    
+    failing_client = Mock()
+    failing_client.get_structured_llm = Mock(side_effect=RuntimeError("LLM unavailable"))
+    players = [Player(player_id=1, name="玩家1", role="werewolf")] + [
+        Player(player_id=i, name=f"玩家{i}", role="villager") for i in range(2, 10)
+    ]
+    state = StateManager().init_state(players)
+    
+    async def fallback_targets(seed):
+        roster = AgentRoster(players, llm_client=failing_client, seed=seed)
+        werewolf = roster.get(players[0])
+        assert werewolf.rng is roster.rng
+        return [await werewolf.vote_to_kill(state, [], []) for _ in range(5)]
+    
+    assert await fallback_targets(42) == await fallback_targets(42)
@@ -151,3 +151,21 @@ def test_sheriff_transfer():
     assert updated_state["sheriff_transfer"]["to_id"] == 2
     assert updated_state["sheriff_transfer"]["destroyed"] == False
 
+
+
+def test_resolve_night():
+    """测试夜晚结算规则（守卫、解药、毒药）"""
+    from src.graph.nodes import resolve_night
+    
+    # 狼人攻击成功
+    assert resolve_night(1, None, None, None) == {"killed": [1], "guard_blocked": False}
+    # 守卫守护抵消狼人攻击
+    assert resolve_night(1, 1, None, None) == {"killed": [], "guard_blocked": True}
+    # 女巫解药救人
+    assert resolve_night(1, 2, 1, None)["killed"] == []
+    # 守卫不能防御毒药
+    assert resolve_night(1, 3, None, 3)["killed"] == [1, 3]
+    # 毒药目标与狼人目标相同时只出局一次
+    assert resolve_night(1, None, None, 1)["killed"] == [1]
+    # 平安夜
+    assert resolve_night(None, None, None, None)["killed"] == []
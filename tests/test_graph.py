@@ -8,6 +8,7 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
+import copy
 import pytest
 from src.graph.game_graph import create_game_graph
 from src.state.game_state import StateManager, Player
@@ -138,3 +139,387 @@ def test_graph_structure():
         # 如果编译失败，至少图对象存在
         pass
 
+
+
+@pytest.mark.asyncio
+async def test_parallel_exile_voting_matches_sequential(capsys):
+    """测试并行放逐投票与顺序投票的输出和历史记录一致"""
+    import asyncio
+    from unittest.mock import Mock
+    from src.graph.nodes import exile_voting_node
+    from src.utils.agent_roster import build_roster, release_roster
+    
+    # 固定投票目标，座位越靠前的玩家返回越慢（乱序完成）
+    vote_map = {1: 2, 2: 2, 3: 4, 4: 2}
+    
+    async def run(parallel: bool):
+        players = [Player(player_id=i, name=f"玩家{i}", role="villager") for i in range(1, 5)]
+        state = StateManager().init_state(players, parallel_voting=parallel, vote_concurrency=2)
+        roster = build_roster(state["game_id"], players, llm_client=Mock())
+        for player in players:
+            agent = roster.get(player)
+            
+            async def vote(game_state, vote_type="exile", candidates=None, pid=player.player_id):
+                await asyncio.sleep(0.01 * (5 - pid))
+                return vote_map[pid]
+            agent.vote = vote
+        
+        capsys.readouterr()
+        result = await exile_voting_node(state)
+        output = capsys.readouterr().out
+        release_roster(state["game_id"])
+        return result, output
+    
+    sequential_result, sequential_output = await run(parallel=False)
+    parallel_result, parallel_output = await run(parallel=True)
+    
+    assert parallel_output == sequential_output
+    assert parallel_result["history"] == sequential_result["history"]
+    assert list(parallel_result["votes"].items()) == list(sequential_result["votes"].items())
+
+
+@pytest.mark.asyncio
+async def test_sheriff_badge_lost_when_nobody_votes_in_pk_round():
+    """测试警长PK后第二轮无人投票时警徽流失，不再回到PK发言"""
+    from unittest.mock import Mock
+    from src.graph.nodes import sheriff_voting_node
+    from src.utils.agent_roster import build_roster, release_roster
+    
+    players = [Player(player_id=i, name=f"玩家{i}", role="villager") for i in range(1, 5)]
+    state = StateManager().init_state(players)
+    state.update({
+        "day_number": 1,
+        "sheriff_candidates": [1, 2],
+        "sheriff_vote_round": 1,
+        "sheriff_tied_candidates": [1, 2],
+    })
+    roster = build_roster(state["game_id"], players, llm_client=Mock())
+    for player in players:
+        async def abstain(game_state, vote_type="exile", candidates=None):
+            return None
+        roster.get(player).vote = abstain
+    
+    result = await sheriff_voting_node(state)
+    release_roster(state["game_id"])
+    
+    assert result["sheriff_votes"] == {}
+    assert result["sheriff_vote_round"] == 0
+    assert result["sheriff_tied_candidates"] == [] and result["sheriff_candidates"] == []
+    assert not any(p.is_sheriff for p in state["players"])
+    
+    # 第一轮无人投票仍保留候选人（按原流程进入公布死讯）
+    state["sheriff_vote_round"] = 0
+    roster = build_roster(state["game_id"], players, llm_client=Mock())
+    for player in players:
+        roster.get(player).vote = abstain
+    assert await sheriff_voting_node(state) == {"sheriff_votes": {}}
+    release_roster(state["game_id"])
+
+
+@pytest.mark.asyncio
+async def test_night_advances_day_after_first_night():
+    """测试第一夜之后每次入夜天数和轮次加一，且不修改传入的状态"""
+    from unittest.mock import Mock
+    from src.graph.nodes import night_phase_node
+    from src.utils.agent_roster import build_roster, release_roster
+    
+    players = [
+        Player(player_id=1, name="玩家1", role="werewolf"),
+        Player(player_id=2, name="玩家2", role="villager"),
+        Player(player_id=3, name="玩家3", role="villager"),
+    ]
+    state = StateManager().init_state(players)
+    build_roster(state["game_id"], players, llm_client=Mock())
+    
+    # 第一夜仍是第 1 天
+    first = await night_phase_node(state)
+    assert first["day_number"] == 1 and first["round_number"] == 1
+    assert first["history"][0]["day"] == 1
+    
+    # 已经有夜晚记录：进入第 2 天
+    state = {**state, "history": state["history"] + first["history"]}
+    second = await night_phase_node(state)
+    release_roster(state["game_id"])
+    assert second["day_number"] == 2 and second["round_number"] == 2
+    assert second["history"][0]["day"] == 2
+    assert state["day_number"] == 1 and state["round_number"] == 1
+
+
+@pytest.mark.asyncio
+async def test_game_ends_in_draw_after_max_rounds():
+    """测试超过最大轮次时双方都有存活玩家也结束对局，判定平局"""
+    from src.graph.game_graph import check_game_end
+    from src.graph.nodes import judgment_node
+    
+    players = [
+        Player(player_id=1, name="玩家1", role="werewolf"),
+        Player(player_id=2, name="玩家2", role="villager"),
+        Player(player_id=3, name="玩家3", role="seer"),
+    ]
+    state = StateManager().init_state(players, max_rounds=3)
+    state["round_number"] = 3
+    assert check_game_end(state) == "continue"
+    assert await judgment_node(state) == {}
+    
+    state["round_number"] = 4
+    assert check_game_end(state) == "end"
+    result = await judgment_node(state)
+    assert result["game_status"] == "ended"
+    assert result["winner"] is None
+    assert result["history"][0]["type"] == "game_end" and result["history"][0]["round"] == 4
+
+
+@pytest.mark.asyncio
+async def test_full_game_with_local_backend(monkeypatch):
+    """测试使用离线后端完整运行游戏图（不访问网络）"""
+    from src.utils.llm_client import clear_llm_client_registry
+    from src.utils.pacing import make_pacing
+    from src.utils.role_assigner import assign_roles
+    from src.state.game_state import count_alive
+    
+    monkeypatch.setenv("LLM_PROVIDER", "local")
+    clear_llm_client_registry()
+    
+    players = assign_roles(
+        [f"玩家{i}" for i in range(1, 7)],
+        role_config={"villager": 2, "werewolf": 2, "seer": 1, "witch": 1}
+    )
+    initial_state = StateManager().init_state(players, pacing=make_pacing("turbo"))
+    
+    graph = create_game_graph()
+    final_state = await graph.ainvoke(initial_state, config={"recursion_limit": 200})
+    clear_llm_client_registry()
+    
+    assert final_state["game_status"] == "ended"
+    assert final_state["winner"] in ("werewolves", "villagers")
+    
+    # 玩家索引随每次出局、警长变化一起更新
+    index = final_state["player_index"]
+    assert index.players is final_state["players"]
+    assert index.alive_ids == {p.player_id for p in final_state["players"] if p.is_alive}
+    # 各阵营存活人数随出局增量更新，与完整统计一致
+    assert final_state["alive_counts"] == count_alive(final_state["players"])
+
+
+@pytest.mark.asyncio
+async def test_state_snapshots_are_not_mutated(monkeypatch):
+    """测试每一步的状态快照不会被后续节点原地修改（集合只追加 / 合并出新对象）"""
+    import random
+    from src.utils.llm_client import clear_llm_client_registry
+    from src.utils.pacing import make_pacing
+    from src.utils.role_assigner import assign_roles
+    
+    monkeypatch.setenv("LLM_PROVIDER", "local")
+    clear_llm_client_registry()
+    
+    players = assign_roles(
+        [f"玩家{i}" for i in range(1, 7)],
+        role_config={"villager": 2, "werewolf": 2, "seer": 1, "witch": 1},
+        rng=random.Random(0)
+    )
+    # 历史窗口很小，早期记录会写入磁盘
+    initial_state = StateManager().init_state(players, pacing=make_pacing("turbo"), seed=0, history_window=4)
+    
+    keys = ("players", "history", "seer_checks", "last_words", "werewolf_channel")
+    snapshots = []
+    graph = create_game_graph()
+    async for values in graph.astream(initial_state, config={"recursion_limit": 200}, stream_mode="values"):
+        # 保存快照中的对象本身，以及当时内容的深拷贝
+        snapshots.append(({key: values[key] for key in keys}, {key: copy.deepcopy(list(values[key]) if key == "history" else values[key]) for key in keys}))
+    clear_llm_client_registry()
+    
+    final = snapshots[-1][0]
+    assert final["werewolf_channel"] and final["last_words"]
+    assert any(entry["type"] == "discussion" for entry in final["history"])
+    assert len(final["history"]) > 4 and final["history"].in_memory == 4
+    for objects, contents in snapshots:
+        for key in keys:
+            assert objects[key] == contents[key], key
+
+
+@pytest.mark.asyncio
+async def test_stream_game_events(monkeypatch):
+    """测试以事件流方式运行游戏：产出类型化事件，额外的消费者收到同样的事件"""
+    import asyncio
+    import random
+    from src.graph.game_graph import stream_game
+    from src.graph.events import PhaseEvent, SpeechEvent, VoteEvent, DeathEvent, GameOverEvent
+    from src.utils.llm_client import clear_llm_client_registry
+    from src.utils.pacing import make_pacing
+    from src.utils.role_assigner import assign_roles
+    
+    monkeypatch.setenv("LLM_PROVIDER", "local")
+    clear_llm_client_registry()
+    
+    # 固定身份分配和流程中的随机选择（避免狼人首轮自爆跳过投票）
+    players = assign_roles(
+        [f"玩家{i}" for i in range(1, 7)],
+        role_config={"villager": 2, "werewolf": 2, "seer": 1, "witch": 1},
+        rng=random.Random(0)
+    )
+    initial_state = StateManager().init_state(players, pacing=make_pacing("turbo"), stream_speech=True, seed=0)
+    
+    received = []
+    
+    async def slow_consumer(event):
+        await asyncio.sleep(0)
+        received.append(event)
+    
+    stream = stream_game(initial_state, config={"recursion_limit": 200}, consumers=[slow_consumer])
+    events = [event async for event in stream]
+    clear_llm_client_registry()
+    
+    assert stream.final_state["game_status"] == "ended"
+    assert received == events
+    assert all(event.game_id == initial_state["game_id"] for event in events)
+    phases = [e.phase for e in events if isinstance(e, PhaseEvent)]
+    assert phases[0] == "night" and phases[-1] == "judgment"
+    assert any(isinstance(e, SpeechEvent) and e.streamed for e in events)
+    assert any(isinstance(e, VoteEvent) and e.vote_type == "exile" for e in events)
+    assert any(isinstance(e, DeathEvent) for e in events)
+    game_over = [e for e in events if isinstance(e, GameOverEvent)]
+    assert len(game_over) == 1 and game_over[0].winner == stream.final_state["winner"]
+
+
+@pytest.mark.asyncio
+async def test_structured_logging_of_game_events(monkeypatch, tmp_path):
+    """测试事件日志订阅者：日志经后台线程写入，带上 game_id / day / phase，安静模式只输出警告"""
+    import random
+    import io
+    import json
+    from src.graph.game_graph import stream_game
+    from src.graph.events import log_event
+    from src.utils.game_logging import configure_logging, shutdown_logging, get_logger
+    from src.utils.llm_client import clear_llm_client_registry
+    from src.utils.pacing import make_pacing
+    from src.utils.role_assigner import assign_roles
+    
+    monkeypatch.setenv("LLM_PROVIDER", "local")
+    clear_llm_client_registry()
+    
+    console = io.StringIO()
+    log_path = tmp_path / "game.jsonl"
+    configure_logging(quiet=True, json_path=str(log_path), stream=console)
+    
+    players = assign_roles(
+        [f"玩家{i}" for i in range(1, 7)],
+        role_config={"villager": 2, "werewolf": 2, "seer": 1, "witch": 1},
+        rng=random.Random(0)
+    )
+    initial_state = StateManager().init_state(players, pacing=make_pacing("turbo"), seed=0)
+    stream = stream_game(initial_state, config={"recursion_limit": 200}, consumers=[log_event])
+    async for _ in stream:
+        pass
+    get_logger("tests").warning("⚠️  测试警告")
+    shutdown_logging()
+    clear_llm_client_registry()
+    
+    entries = [json.loads(line) for line in log_path.read_text(encoding="utf-8").splitlines()]
+    game_entries = [e for e in entries if e.get("event")]
+    assert game_entries
+    assert all(e["game_id"] == initial_state["game_id"] for e in game_entries)
+    assert {"night", "discussion", "exile_voting"} <= {e["phase"] for e in game_entries}
+    assert any(e["event"] == "vote" and e["vote_type"] == "exile" for e in game_entries)
+    # 安静模式下控制台只有警告
+    assert console.getvalue().strip() == "⚠️  测试警告"
+
+
+@pytest.mark.asyncio
+async def test_tournament_runs_games_concurrently(monkeypatch, tmp_path):
+    """测试锦标赛：并发运行多局，相同种子的结果与逐局运行一致，结果增量写入 JSONL"""
+    import json
+    from src.utils.llm_client import clear_llm_client_registry
+    from src.utils.tournament import make_game_specs, run_tournament
+    
+    monkeypatch.setenv("LLM_PROVIDER", "local")
+    clear_llm_client_registry()
+    
+    specs = make_game_specs(6, seed=1, player_counts=[6, 8])
+    output = tmp_path / "results.jsonl"
+    concurrent = await run_tournament(specs, concurrency=6, output_path=str(output))
+    sequential = await run_tournament(specs, concurrency=1)
+    clear_llm_client_registry()
+    
+    def outcomes(stats):
+        return sorted((r.game_index, r.winner, r.days) for r in stats.results)
+    
+    assert outcomes(concurrent) == outcomes(sequential)
+    assert {r.player_count for r in concurrent.results} == {6, 8}
+    
+    lines = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert [line["type"] for line in lines] == ["game"] * 6 + ["summary"]
+    summary = lines[-1]
+    assert summary["games"] == 6 and summary["errors"] == 0
+    assert abs(sum(summary["win_rates"].values()) - 1.0) < 1e-9
+
+
+def test_tournament_across_processes(monkeypatch, tmp_path):
+    """测试多进程锦标赛：结果发回主进程汇总，与单进程运行的结果一致"""
+    import asyncio
+    import json
+    from src.utils.llm_client import clear_llm_client_registry
+    from src.utils.tournament import make_game_specs, run_tournament, run_tournament_processes
+    
+    monkeypatch.setenv("LLM_PROVIDER", "local")
+    clear_llm_client_registry()
+    
+    specs = make_game_specs(4, seed=2)
+    output = tmp_path / "results.jsonl"
+    reported = []
+    stats = run_tournament_processes(
+        specs, workers=2, concurrency=2, output_path=str(output),
+        on_result=lambda result, _: reported.append(result.game_index)
+    )
+    single = asyncio.run(run_tournament(specs, concurrency=4))
+    clear_llm_client_registry()
+    
+    def outcomes(tournament_stats):
+        return sorted((r.game_index, r.winner, r.days) for r in tournament_stats.results)
+    
+    assert sorted(reported) == [0, 1, 2, 3]
+    assert outcomes(stats) == outcomes(single)
+    assert not stats.cancelled
+    assert all(r.llm_calls > 0 for r in stats.results)
+    lines = output.read_text(encoding="utf-8").splitlines()
+    assert json.loads(lines[-1])["type"] == "summary" and len(lines) == 5
+
+
+@pytest.mark.asyncio
+async def test_rosters_released_when_games_stop_early(monkeypatch):
+    """测试对局出错或事件流被提前停止时，本局 Agent 名册也会释放"""
+    import asyncio
+    import random
+    from src.graph.game_graph import run_game, stream_game
+    from src.utils import agent_roster
+    from src.utils.llm_client import clear_llm_client_registry
+    from src.utils.pacing import make_pacing
+    from src.utils.role_assigner import assign_roles
+    from src.utils.tournament import make_game_specs, run_game_spec
+    
+    monkeypatch.setenv("LLM_PROVIDER", "local")
+    clear_llm_client_registry()
+    
+    # 超过递归上限的对局
+    result = await run_game_spec(make_game_specs(1, seed=3)[0], recursion_limit=3)
+    assert result.error and "Recursion" in result.error
+    assert result.game_id not in agent_roster._rosters
+    
+    # 直接使用 run_game：异常照常抛出，名册已释放
+    players = assign_roles([f"玩家{i}" for i in range(1, 7)], rng=random.Random(1))
+    initial_state = StateManager().init_state(players, pacing=make_pacing("turbo"), seed=1)
+    with pytest.raises(Exception, match="Recursion"):
+        await run_game(initial_state, config={"recursion_limit": 3})
+    assert initial_state["game_id"] not in agent_roster._rosters
+    
+    # 消费者只读取第一个事件就停止迭代
+    players = assign_roles([f"玩家{i}" for i in range(1, 7)], rng=random.Random(0))
+    initial_state = StateManager().init_state(players, pacing=make_pacing("turbo"), seed=0)
+    events = stream_game(initial_state, config={"recursion_limit": 200}).__aiter__()
+    await events.__anext__()
+    await events.aclose()
+    for _ in range(20):
+        if initial_state["game_id"] not in agent_roster._rosters:
+            break
+        await asyncio.sleep(0.01)
+    clear_llm_client_registry()
+    assert initial_state["game_id"] not in agent_roster._rosters
@@ -0,0 +1,729 @@
+"""
+LLM 客户端测试
+"""
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import pytest
+from src.utils.llm_client import (
+    get_llm_client,
+    clear_llm_client_registry,
+    get_shared_http_client,
+)
+
+
+@pytest.fixture
+def fake_api_key(monkeypatch):
+    """设置假的 API Key（不会真正发起请求）"""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    clear_llm_client_registry()
+    yield
+    clear_llm_client_registry()
+
+
+def test_llm_client_registry_shares_instances(fake_api_key):
+    """测试注册表按 (provider, model, temperature) 共享客户端"""
+    client_a = get_llm_client("deepseek")
+    client_b = get_llm_client("deepseek", temperature=0.7)
+    client_c = get_llm_client("deepseek", temperature=0.0)
+
+    assert client_a is client_b
+    assert client_a is not client_c
+    assert client_a.model == "deepseek-chat"
+
+
+def test_llm_clients_share_connection_pool(fake_api_key):
+    """测试所有客户端共享同一个 HTTP 连接池"""
+    client_a = get_llm_client("deepseek")
+    client_b = get_llm_client("deepseek", temperature=0.0)
+
+    shared = get_shared_http_client()
+    assert client_a.llm.http_async_client is shared
+    assert client_b.llm.http_async_client is shared
+
+
+class FakeChatModel:
+    """记录调用次数的假 LLM"""
+    
+    model_name = "fake-model"
+    
+    def __init__(self, content='{"thought": "t", "target_id": 2, "confidence": 0.8, "reasoning": "r"}'):
+        self.content = content
+        self.calls = 0
+    
+    async def ainvoke(self, messages, **kwargs):
+        from langchain_core.messages import AIMessage
+        self.calls += 1
+        return AIMessage(content=self.content)
+
+
+@pytest.fixture
+def llm_cache():
+    """开启进程级响应缓存，测试结束后关闭"""
+    from src.utils.llm_cache import configure_llm_cache
+    cache = configure_llm_cache(enabled=True, bypass=["werewolf_discuss"])
+    yield cache
+    configure_llm_cache(enabled=False)
+
+
+@pytest.mark.asyncio
+async def test_llm_response_cache_hits(fake_api_key, llm_cache):
+    """测试相同 prompt 命中缓存，不再请求 LLM"""
+    from src.schemas.actions import VoteDecision
+    from langchain_core.messages import SystemMessage, HumanMessage
+    
+    client = get_llm_client("deepseek")
+    client.llm = FakeChatModel()
+    structured_llm = client.get_structured_llm(VoteDecision)
+    messages = [SystemMessage(content="系统"), HumanMessage(content="请投票")]
+    
+    first = await structured_llm.ainvoke(messages)
+    second = await structured_llm.ainvoke(messages)
+    assert first.target_id == second.target_id == 2
+    assert client.llm.calls == 1
+    
+    # 被配置为跳过缓存的决策类型每次都请求
+    await client.call("系统", "狼人讨论", decision_type="werewolf_discuss")
+    await client.call("系统", "狼人讨论", decision_type="werewolf_discuss")
+    assert client.llm.calls == 3
+    
+    stats = llm_cache.stats()
+    assert stats["hits"] == 1
+    assert stats["by_decision"]["vote"]["hit_rate"] == 0.5
+
+
+def test_llm_response_cache_disk_tier_and_ttl(tmp_path):
+    """测试 SQLite 磁盘层在多个缓存实例间共享，并按决策类型过期"""
+    from src.utils.llm_cache import LLMResponseCache
+    
+    path = str(tmp_path / "llm_cache.sqlite")
+    writer = LLMResponseCache(sqlite_path=path)
+    writer.set("k1", "v1", "vote")
+    writer.set("k2", "v2", "speak")
+    writer.close()
+    
+    reader = LLMResponseCache(sqlite_path=path, ttl_by_decision={"speak": -1})
+    assert reader.get("k1", "vote") == "v1"
+    assert reader.get("k2", "speak") is None
+    assert reader.stats()["by_decision"]["vote"]["disk_hits"] == 1
+    
+    # LRU 淘汰
+    small = LLMResponseCache(max_entries=1)
+    small.set("a", "1")
+    small.set("b", "2")
+    assert small.get("a") is None
+    assert small.get("b") == "2"
+
+
+def test_llm_cache_key_covers_request_params_and_schema():
+    """测试缓存键区分结构化输出参数、max_tokens、stop 和 Schema 定义"""
+    from pydantic import BaseModel
+    from langchain_core.messages import HumanMessage
+    from src.utils.llm_cache import LLMResponseCache
+    
+    messages = [HumanMessage(content="投票")]
+    
+    def key(schema=None, **params):
+        return LLMResponseCache.make_key("model", 0.0, messages, schema, params)
+    
+    base = key()
+    assert key(response_format={"type": "json_object"}) != base
+    assert key(tools=[{"name": "vote"}], tool_choice="required") != key(tools=[{"name": "vote"}])
+    assert key(max_tokens=256) != key(max_tokens=512)
+    assert key(stop=["\n"]) != base
+    # 不影响响应内容的参数不参与计算
+    assert key(timeout=30) == base
+    
+    # 同名 Schema 的字段变化后缓存键随之变化
+    class Decision(BaseModel):
+        target_id: int
+    first = Decision
+    
+    class Decision(BaseModel):
+        target_id: int
+        reasoning: str
+    assert key(first) != key(Decision)
+    assert key(first) == key(first)
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_queues_requests():
+    """测试限流器超出预算时排队等待而不是失败"""
+    from src.utils.rate_limiter import RateLimiter
+    
+    # 每分钟 60 次请求 = 每秒 1 次，桶容量 60
+    limiter = RateLimiter(rpm=60, tpm=600)
+    
+    # 容量内不等待
+    assert await limiter.acquire("deepseek", "deepseek-chat", tokens=100) == 0.0
+    
+    # token 预算透支后需要排队（600 - 100 - 550 = -50 tokens，每秒补充 10）
+    request_bucket, token_bucket = limiter._get_buckets("deepseek", "deepseek-chat")
+    assert token_bucket.reserve(550) == pytest.approx(5.0, abs=0.1)
+    
+    # 不同模型独立计算预算
+    assert await limiter.acquire("deepseek", "other-model", tokens=100) == 0.0
+    
+    # 用实际用量修正预算
+    limiter.record_usage("deepseek", "other-model", estimated_tokens=100, actual_tokens=40)
+    _, other_bucket = limiter._get_buckets("deepseek", "other-model")
+    assert other_bucket.tokens == pytest.approx(560, abs=1)
+
+
+def test_decision_spec_registry():
+    """测试决策 Schema 注册表预编译的指令、字段映射和缺省值"""
+    from src.schemas.actions import VoteDecision, AgentAction
+    from src.schemas.registry import get_decision_spec
+    
+    spec = get_decision_spec(VoteDecision)
+    assert spec is get_decision_spec(VoteDecision)
+    assert spec.decision_type == "vote"
+    assert "- target_id" in spec.json_instruction
+    
+    # 字段名映射 + 从字符串中提取玩家ID + 缺失字段填充
+    data = spec.map_fields({"target": "玩家3", "reason": "发言矛盾"})
+    assert data["target_id"] == 3
+    assert data["reasoning"] == "发言矛盾"
+    assert data["thought"] == "发言矛盾"
+    assert data["confidence"] == 0.5
+    assert VoteDecision(**data).target_id == 3
+    
+    # 带示例的 Schema 使用示例作为格式说明
+    action_spec = get_decision_spec(AgentAction)
+    assert "玩家3的行为可疑" in action_spec.json_instruction
+    assert action_spec.map_fields({"action": "skip", "thought": "t"})["target"] is None
+
+
+@pytest.mark.asyncio
+async def test_local_backend_is_deterministic_and_schema_valid(monkeypatch):
+    """测试离线后端：不需要 API Key，相同种子 + 相同 prompt 得到相同的合法决策"""
+    from src.schemas.actions import VoteDecision, AntidoteDecision
+    from langchain_core.messages import SystemMessage, HumanMessage
+    from src.utils.local_llm import LatencyModel
+    import random
+    
+    monkeypatch.delenv("DEEPSEEK_API_KEY", raising=False)
+    monkeypatch.setenv("LOCAL_LLM_SEED", "7")
+    clear_llm_client_registry()
+    client = get_llm_client("local")
+    assert client.model == "local-sim"
+    
+    messages = [
+        SystemMessage(content="你的身份：村民（玩家1）"),
+        HumanMessage(content="可投票的目标玩家：\n玩家2 (玩家2)\n玩家3 (玩家3) [已出局]\n玩家4 (玩家4)"),
+    ]
+    structured_llm = client.get_structured_llm(VoteDecision)
+    first = await structured_llm.ainvoke(messages)
+    second = await structured_llm.ainvoke(messages)
+    assert first == second
+    assert first.target_id in (2, 4)
+    
+    decision = await client.get_structured_llm(AntidoteDecision).ainvoke(messages)
+    assert isinstance(decision.use_antidote, bool)
+    assert await client.call("系统", "狼人讨论")
+    clear_llm_client_registry()
+    
+    # 延迟分布
+    assert LatencyModel.parse("fixed:0.2").sample(random.Random(0)) == 0.2
+    assert LatencyModel.parse("lognormal:0.5,0.3").sample(random.Random(0)) > 0
+    assert LatencyModel.parse(None).sample(random.Random(0)) == 0.0
+
+
+@pytest.mark.asyncio
+async def test_llm_call_telemetry(fake_api_key, tmp_path):
+    """测试每次 LLM 调用记录遥测，并按局、按决策类型汇总"""
+    import json
+    from src.schemas.actions import VoteDecision
+    from langchain_core.messages import SystemMessage, HumanMessage
+    from src.utils.telemetry import configure_telemetry, telemetry_context, record_fallback, percentile
+    
+    telemetry = configure_telemetry(enabled=True)
+    client = get_llm_client("deepseek")
+    client.llm = FakeChatModel()
+    messages = [SystemMessage(content="系统"), HumanMessage(content="请投票")]
+    
+    with telemetry_context(game_id="g1", node="exile_voting"):
+        await client.get_structured_llm(VoteDecision, agent_role="villager").ainvoke(messages)
+        record_fallback("vote", "timeout", role="villager")
+    
+    client.llm = FakeChatModel(content="不是 JSON")
+    with telemetry_context(game_id="g2", node="exile_voting"):
+        with pytest.raises(ValueError):
+            await client.get_structured_llm(VoteDecision).ainvoke(messages)
+    
+    records = telemetry.records("g1")
+    assert records[0].decision_type == "vote"
+    assert records[0].role == "villager"
+    assert records[0].node == "exile_voting"
+    assert records[0].model == "fake-model"
+    
+    vote = telemetry.summary()["by_decision_type"]["vote"]
+    assert vote["calls"] == 2
+    assert vote["errors"] == 1
+    assert vote["fallback_rate"] == 0.5
+    assert telemetry.summary("g1", group_by="role")["by_role"]["villager"]["fallbacks"] == 1
+    failed = next(r for r in telemetry.records("g2") if r.decision_type == "vote")
+    assert failed.error.startswith("ParseError")
+    
+    path = tmp_path / "telemetry.json"
+    telemetry.dump_json(str(path))
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert set(data["games"]) == {"g1", "g2"}
+    assert "p99" in data["run"]["overall"]["latency"]
+    
+    assert percentile([1, 2, 3, 4, 5], 50) == 3
+    assert percentile([], 99) == 0.0
+    configure_telemetry(enabled=True)
+
+
+@pytest.mark.asyncio
+async def test_hedged_requests_cut_tail_latency():
+    """测试慢请求触发对冲，先返回的结果胜出，慢请求被取消，且额外请求不超过预算"""
+    import asyncio
+    from src.utils.hedging import HedgingPolicy
+    
+    policy = HedgingPolicy(percentile=90, min_samples=5, min_delay=0.01, max_extra_ratio=0.5)
+    
+    async def fast():
+        await asyncio.sleep(0.001)
+        return "fast"
+    
+    # 积累延迟样本前不对冲
+    for _ in range(5):
+        assert await policy.run("speak", fast) == "fast"
+    assert policy.stats()["hedges"] == 0
+    
+    # 第一次请求很慢，对冲请求很快
+    delays = iter([5.0, 0.001])
+    cancelled = []
+    
+    async def slow_then_fast():
+        delay = next(delays)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(delay)
+            raise
+        return f"done after {delay}"
+    
+    result = await asyncio.wait_for(policy.run("speak", slow_then_fast), timeout=1.0)
+    assert result == "done after 0.001"
+    await asyncio.sleep(0)
+    assert cancelled == [5.0]
+    
+    stats = policy.stats()
+    assert stats["hedges"] == 1
+    assert stats["hedge_wins"] == 1
+    assert stats["by_decision"]["speak"]["hedge_wins"] == 1
+    
+    # 预算用尽（7 次请求 * 0.5 = 3.5，已对冲 1 次）后不再对冲
+    policy.max_extra_ratio = 0.1
+    delays = iter([0.05, 0.001])
+    assert await policy.run("speak", slow_then_fast) == "done after 0.05"
+    assert policy.stats()["skipped_budget"] == 1
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_cancelled_by_caller():
+    """测试调用方在等待对冲延迟期间被取消时，主请求也被取消"""
+    import asyncio
+    from src.utils.hedging import HedgingPolicy
+    
+    policy = HedgingPolicy(percentile=90, min_samples=1, min_delay=1.0)
+    policy.observe("speak", 1.0)
+    cancelled = []
+    
+    async def slow():
+        try:
+            await asyncio.sleep(5.0)
+        except asyncio.CancelledError:
+            cancelled.append("primary")
+            raise
+    
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(policy.run("speak", slow), timeout=0.05)
+    await asyncio.sleep(0)
+    assert cancelled == ["primary"]
+
+
+@pytest.mark.asyncio
+async def test_retry_transient_errors_with_backoff(fake_api_key):
+    """测试临时性错误（429、超时）按 Retry-After / 退避重试，不可重试错误直接抛出"""
+    import asyncio
+    import httpx
+    import openai
+    from src.utils.retry import RetryPolicy, classify_error, retry_after_seconds, configure_retry
+    from src.utils.telemetry import configure_telemetry
+    
+    request = httpx.Request("POST", "https://api.example.com/v1/chat/completions")
+    rate_limited = openai.RateLimitError(
+        "rate limited",
+        response=httpx.Response(429, headers={"retry-after": "0.01"}, request=request),
+        body=None
+    )
+    bad_request = openai.BadRequestError(
+        "bad request", response=httpx.Response(400, request=request), body=None
+    )
+    assert classify_error(rate_limited) == "rate_limited"
+    assert classify_error(httpx.ReadTimeout("timeout")) == "transient"
+    assert classify_error(bad_request) == "fatal"
+    assert classify_error(ValueError("无法解析结构化输出")) == "fatal"
+    assert retry_after_seconds(rate_limited) == 0.01
+    
+    class FlakyChatModel(FakeChatModel):
+        def __init__(self, errors):
+            super().__init__()
+            self.errors = list(errors)
+        
+        async def ainvoke(self, messages, **kwargs):
+            if self.errors:
+                self.calls += 1
+                raise self.errors.pop(0)
+            return await super().ainvoke(messages, **kwargs)
+    
+    configure_retry(max_attempts=3, base_delay=0.01, max_delay=0.02, deadline=5.0)
+    telemetry = configure_telemetry(enabled=True)
+    client = get_llm_client("deepseek")
+    
+    client.llm = FlakyChatModel([rate_limited, httpx.ReadTimeout("timeout")])
+    assert await client.call("系统", "你好")
+    assert client.llm.calls == 3
+    assert telemetry.records()[-1].retries == 2
+    
+    # 不可重试的错误只请求一次
+    client.llm = FlakyChatModel([bad_request])
+    with pytest.raises(openai.BadRequestError):
+        await client.call("系统", "你好")
+    assert client.llm.calls == 1
+    
+    # 截止时间内没有成功则放弃，延迟有界
+    class HangingChatModel(FakeChatModel):
+        async def ainvoke(self, messages, **kwargs):
+            await asyncio.sleep(10)
+    
+    policy = RetryPolicy(max_attempts=5, base_delay=0.01, deadline_by_decision={"vote": 0.05})
+    client.llm = HangingChatModel()
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(policy.run("vote", lambda: client.llm.ainvoke([])), timeout=1.0)
+    
+    configure_retry(enabled=True)
+    configure_telemetry(enabled=True)
+
+
+@pytest.mark.asyncio
+async def test_structured_output_repair(fake_api_key):
+    """测试解析失败时发回简短错误要求修正，而不是直接失败"""
+    from src.schemas.actions import VoteDecision
+    from langchain_core.messages import SystemMessage, HumanMessage
+    from src.utils.repair import configure_repair
+    from src.utils.llm_client import StructuredOutputError
+    
+    class RepairingChatModel(FakeChatModel):
+        """第一次返回校验失败的 JSON（置信度超出范围），修复请求返回正确的 JSON"""
+        
+        def __init__(self, repaired_content):
+            super().__init__(content='{"thought": "t", "target_id": 3, "confidence": 85}')
+            self.repaired_content = repaired_content
+            self.repair_kwargs = None
+        
+        async def ainvoke(self, messages, **kwargs):
+            from langchain_core.messages import AIMessage
+            if "max_tokens" in kwargs:
+                self.calls += 1
+                self.repair_kwargs = kwargs
+                self.repair_prompt = messages[-1].content
+                return AIMessage(content=self.repaired_content)
+            return await super().ainvoke(messages, **kwargs)
+    
+    repair = configure_repair(max_attempts=1, max_tokens=128, timeout=1.0)
+    client = get_llm_client("deepseek")
+    messages = [SystemMessage(content="系统"), HumanMessage(content="请投票")]
+    
+    client.llm = RepairingChatModel('{"thought": "t", "target_id": 3, "confidence": 0.9, "reasoning": "r"}')
+    decision = await client.get_structured_llm(VoteDecision).ainvoke(messages)
+    assert decision.target_id == 3
+    assert client.llm.repair_kwargs["max_tokens"] == 128
+    assert "confidence" in client.llm.repair_prompt
+    assert '"confidence": 85' in client.llm.repair_prompt
+    
+    # 修复失败时抛出解析错误（调用方再走兜底逻辑）
+    client.llm = RepairingChatModel("仍然不是 JSON")
+    with pytest.raises(StructuredOutputError):
+        await client.get_structured_llm(VoteDecision).ainvoke(messages)
+    
+    stats = repair.stats()
+    assert stats["attempts"] == 2
+    assert stats["by_decision"]["vote"]["success_rate"] == 0.5
+    
+    # 解析耗时只统计本地解析，修复请求的网络耗时记录在修复请求自己的记录中
+    import asyncio
+    from src.utils.telemetry import configure_telemetry
+    
+    class SlowRepairingChatModel(RepairingChatModel):
+        async def ainvoke(self, messages, **kwargs):
+            if "max_tokens" in kwargs:
+                await asyncio.sleep(0.05)
+            return await super().ainvoke(messages, **kwargs)
+    
+    telemetry = configure_telemetry(enabled=True)
+    client.llm = SlowRepairingChatModel('{"thought": "t", "target_id": 3, "confidence": 0.9, "reasoning": "r"}')
+    await client.get_structured_llm(VoteDecision).ainvoke(messages)
+    vote = next(r for r in telemetry.records() if r.decision_type == "vote")
+    repair_call = next(r for r in telemetry.records() if r.decision_type == "vote_repair")
+    assert vote.repaired and vote.error is None
+    assert vote.parse_time < 0.05 <= repair_call.latency
+    configure_telemetry(enabled=True)
+    configure_repair(enabled=True)
+
+
+@pytest.mark.asyncio
+async def test_structured_mode_detection_and_fallback(fake_api_key):
+    """测试按提供商选择结构化输出方式，服务端拒绝时自动降级"""
+    import httpx
+    import openai
+    from langchain_core.messages import AIMessage, SystemMessage, HumanMessage
+    from src.schemas.actions import VoteDecision
+    from src.utils.capabilities import configure_structured_mode, get_structured_mode, clear_structured_modes
+    from src.utils.telemetry import configure_telemetry
+    
+    clear_structured_modes()
+    telemetry = configure_telemetry(enabled=True)
+    assert get_structured_mode("openai") == "tool_calling"
+    assert get_structured_mode("deepseek") == "json_mode"
+    assert get_structured_mode("local") == "prompt"
+    
+    class ToolRejectingChatModel(FakeChatModel):
+        """不支持工具调用；JSON Mode 下返回 JSON"""
+        
+        def __init__(self):
+            super().__init__()
+            self.requests = []
+        
+        async def ainvoke(self, messages, **kwargs):
+            self.requests.append((messages, kwargs))
+            if "tools" in kwargs:
+                request = httpx.Request("POST", "https://api.example.com/v1/chat/completions")
+                raise openai.BadRequestError(
+                    "tools not supported", response=httpx.Response(400, request=request), body=None
+                )
+            return await super().ainvoke(messages, **kwargs)
+    
+    client = get_llm_client("deepseek")
+    client.llm = ToolRejectingChatModel()
+    configure_structured_mode("deepseek", "tool_calling")
+    messages = [SystemMessage(content="系统"), HumanMessage(content="请投票")]
+    
+    decision = await client.get_structured_llm(VoteDecision).ainvoke(messages)
+    assert decision.target_id == 2
+    assert client.structured_mode == "json_mode"
+    # 降级后成功的调用不计为错误
+    assert telemetry.records()[-1].error is None
+    assert telemetry.summary()["overall"]["errors"] == 0
+    
+    # 工具调用请求不追加格式指令；JSON Mode 只追加简短的字段说明
+    (tool_messages, tool_kwargs), (json_messages, json_kwargs) = client.llm.requests
+    assert tool_messages[0].content == "系统"
+    assert tool_kwargs["tool_choice"]["function"]["name"] == "VoteDecision"
+    assert json_kwargs["response_format"] == {"type": "json_object"}
+    assert "target_id" in json_messages[0].content
+    assert len(json_messages[0].content) < 200
+    
+    # 工具调用的参数作为结构化输出
+    class ToolCallingChatModel(FakeChatModel):
+        async def ainvoke(self, messages, **kwargs):
+            return AIMessage(content="", tool_calls=[{
+                "name": "VoteDecision",
+                "args": {"thought": "t", "target_id": 4, "confidence": 0.6, "reasoning": "r"},
+                "id": "call_1",
+            }])
+    
+    configure_structured_mode("deepseek", "tool_calling")
+    client.llm = ToolCallingChatModel()
+    decision = await client.get_structured_llm(VoteDecision).ainvoke(messages)
+    assert decision.target_id == 4
+    clear_structured_modes()
+    configure_telemetry(enabled=True)
+
+
+@pytest.mark.asyncio
+async def test_structured_mode_not_downgraded_on_other_request_errors(fake_api_key):
+    """测试上下文超长等与结构化参数无关的 400 / 404 不会降级结构化输出方式"""
+    import httpx
+    import openai
+    from langchain_core.messages import SystemMessage, HumanMessage
+    from src.schemas.actions import VoteDecision
+    from src.utils.capabilities import configure_structured_mode, is_unsupported_error, clear_structured_modes
+    
+    request = httpx.Request("POST", "https://api.example.com/v1/chat/completions")
+    
+    class ContextOverflowChatModel(FakeChatModel):
+        async def ainvoke(self, messages, **kwargs):
+            raise openai.BadRequestError(
+                "This model's maximum context length is 8192 tokens. However, your messages resulted in 9000 tokens.",
+                response=httpx.Response(400, request=request),
+                body={"code": "context_length_exceeded"}
+            )
+    
+    clear_structured_modes()
+    client = get_llm_client("deepseek")
+    client.llm = ContextOverflowChatModel()
+    configure_structured_mode("deepseek", "tool_calling")
+    messages = [SystemMessage(content="系统"), HumanMessage(content="请投票")]
+    
+    with pytest.raises(openai.BadRequestError):
+        await client.get_structured_llm(VoteDecision).ainvoke(messages)
+    assert client.structured_mode == "tool_calling"
+    
+    # 404（如模型名错误）即使提到参数也不降级；422 指明参数不支持时降级
+    not_found = openai.NotFoundError(
+        "tools not supported", response=httpx.Response(404, request=request), body=None
+    )
+    assert not is_unsupported_error(not_found)
+    unprocessable = openai.UnprocessableEntityError(
+        "invalid request", response=httpx.Response(422, request=request),
+        body={"message": "response_format is not supported by this model"}
+    )
+    assert is_unsupported_error(unprocessable)
+    assert is_unsupported_error(unprocessable, "json_mode")
+    assert not is_unsupported_error(unprocessable, "tool_calling")
+    
+    # 只说 "not supported" 而不指明结构化参数时不降级
+    class RejectingChatModel(FakeChatModel):
+        def __init__(self, error):
+            super().__init__()
+            self.error = error
+        
+        async def ainvoke(self, messages, **kwargs):
+            raise self.error
+    
+    for message in ("model not supported in this region", "temperature not supported"):
+        other = openai.BadRequestError(message, response=httpx.Response(400, request=request), body=None)
+        assert not is_unsupported_error(other)
+        client.llm = RejectingChatModel(other)
+        with pytest.raises(openai.BadRequestError):
+            await client.get_structured_llm(VoteDecision).ainvoke(messages)
+        assert client.structured_mode == "tool_calling"
+    clear_structured_modes()
+
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesces_identical_requests(fake_api_key):
+    """测试 temperature=0 或显式允许时，相同的在途请求只发送一次"""
+    import asyncio
+    from src.utils.single_flight import configure_single_flight
+    
+    class SlowChatModel(FakeChatModel):
+        async def ainvoke(self, messages, **kwargs):
+            await asyncio.sleep(0.02)
+            return await super().ainvoke(messages, **kwargs)
+    
+    single_flight = configure_single_flight(enabled=True)
+    
+    deterministic = get_llm_client("deepseek", temperature=0.0)
+    deterministic.llm = SlowChatModel(content="结果")
+    results = await asyncio.gather(*[deterministic.call("系统", "同一个问题") for _ in range(3)])
+    assert results == ["结果"] * 3
+    assert deterministic.llm.calls == 1
+    
+    # 不同的 prompt 不合并
+    await asyncio.gather(deterministic.call("系统", "问题A"), deterministic.call("系统", "问题B"))
+    assert deterministic.llm.calls == 3
+    
+    # temperature > 0 默认不合并，显式允许时合并
+    sampled = get_llm_client("deepseek", temperature=0.7)
+    sampled.llm = SlowChatModel(content="结果")
+    await asyncio.gather(*[sampled.call("系统", "同一个问题") for _ in range(2)])
+    assert sampled.llm.calls == 2
+    from langchain_core.messages import HumanMessage
+    messages = [HumanMessage(content="同一个问题")]
+    await asyncio.gather(*[sampled.complete(messages, coalesce=True) for _ in range(2)])
+    assert sampled.llm.calls == 3
+    
+    assert single_flight.stats()["followers"] == 3
+    assert single_flight.stats()["inflight"] == 0
+    configure_single_flight(enabled=True)
+
+
+@pytest.mark.asyncio
+async def test_streaming_speech_with_ttft(monkeypatch):
+    """测试流式发言：按片段输出 content 字段，记录首字延迟，结果与完整解析一致"""
+    import json
+    from src.schemas.actions import SpeakDecision
+    from langchain_core.messages import SystemMessage, HumanMessage
+    from src.utils.json_stream import PartialFieldExtractor
+    from src.utils.telemetry import configure_telemetry
+    
+    # 任意切分（包括切断转义序列和代理对）都能还原字段内容
+    raw = json.dumps({"reasoning": "r", "content": "我是\"好人\"\n😀 投玩家3"})
+    for size in (1, 2, 5):
+        extractor = PartialFieldExtractor("content")
+        text = "".join(extractor.feed(raw[i:i + size]) for i in range(0, len(raw), size))
+        assert text == "我是\"好人\"\n😀 投玩家3"
+        assert extractor.done
+    
+    monkeypatch.setenv("LOCAL_LLM_LATENCY", "fixed:0.02")
+    clear_llm_client_registry()
+    telemetry = configure_telemetry(enabled=True)
+    client = get_llm_client("local")
+    messages = [
+        SystemMessage(content="你的身份：村民（玩家1）"),
+        HumanMessage(content="请发言。存活玩家：玩家2、玩家3"),
+    ]
+    
+    tokens = []
+    decision = await client.get_structured_llm(SpeakDecision, agent_role="villager").ainvoke_streaming(
+        messages, tokens.append
+    )
+    assert len(tokens) > 1
+    assert "".join(tokens) == decision.content
+    
+    record = telemetry.records()[-1]
+    assert record.decision_type == "speak"
+    assert 0 < record.ttft < record.latency
+    assert telemetry.summary()["overall"]["ttft"]["max"] == record.ttft
+    
+    configure_telemetry(enabled=True)
+    clear_llm_client_registry()
+
+
+@pytest.mark.asyncio
+async def test_streaming_records_divergence_after_repair(fake_api_key):
+    """测试修复后的发言与已流式发出的内容不一致时，不补发错误的增量，并在遥测中记录"""
+    from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+    from src.schemas.actions import SpeakDecision
+    from src.utils.repair import configure_repair
+    from src.utils.telemetry import configure_telemetry
+    
+    class TruncatedStreamModel(FakeChatModel):
+        """流式响应被截断（JSON 不完整），修复请求返回不同的发言"""
+        
+        async def astream(self, messages, **kwargs):
+            for part in ('{"reasoning": "r", "content": "我投玩家', '3号', '，因为'):
+                yield AIMessageChunk(content=part)
+        
+        async def ainvoke(self, messages, **kwargs):
+            self.calls += 1
+            return AIMessage(content='{"reasoning": "r", "content": "我投玩家5"}')
+    
+    configure_repair(max_attempts=1, max_tokens=128, timeout=1.0)
+    telemetry = configure_telemetry(enabled=True)
+    client = get_llm_client("deepseek")
+    client.llm = TruncatedStreamModel()
+    
+    tokens = []
+    decision = await client.get_structured_llm(SpeakDecision).ainvoke_streaming(
+        [HumanMessage(content="请发言")], tokens.append
+    )
+    assert decision.content == "我投玩家5"
+    assert "".join(tokens) == "我投玩家3号，因为"
+    
+    record = telemetry.records()[-1]
+    assert record.repaired and record.stream_diverged
+    assert telemetry.summary()["overall"]["stream_divergences"] == 1
+    
+    configure_telemetry(enabled=True)
+    configure_repair(enabled=True)
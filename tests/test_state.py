@@ -9,7 +9,7 @@ project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
 import pytest
-from src.state.game_state import StateManager, Player
+from src.state.game_state import StateManager, Player, player_index, players_update, update_player, alive_counts, record_deaths
 
 
 def test_state_manager():
@@ -87,6 +87,165 @@ def test_sheriff_state():
     assert sheriff.is_sheriff == True
 
 
+def test_player_index():
+    """测试玩家索引"""
+    manager = StateManager()
+    players = [
+        Player(player_id=1, name="玩家1", role="villager", is_sheriff=True),
+        Player(player_id=2, name="玩家2", role="werewolf"),
+        Player(player_id=3, name="玩家3", role="werewolf", is_alive=False),
+        Player(player_id=4, name="玩家4", role="seer"),
+    ]
+    state = manager.init_state(players)
+    
+    index = player_index(state)
+    assert index is state["player_index"]
+    assert index.get(3).name == "玩家3"
+    assert index.get(5) is None
+    assert index.get_alive(3) is None
+    assert index.alive_ids == {1, 2, 4}
+    assert [p.player_id for p in index.alive()] == [1, 2, 4]
+    assert [p.player_id for p in index.with_role("werewolf")] == [2]
+    assert [p.player_id for p in index.with_role("werewolf", alive_only=False)] == [2, 3]
+    assert [p.player_id for p in index.with_role("seer", "witch", "guard")] == [4]
+    assert index.sheriff().player_id == 1
+    
+    # 出局后通过 players_update 生成新的索引
+    updated = [Player(**{**p.model_dump(), "is_alive": False}) if p.player_id == 1 else p for p in players]
+    updates = players_update(updated)
+    assert updates["player_index"].players is updated
+    assert updates["player_index"].sheriff() is None
+    assert 1 not in updates["player_index"].alive_ids
+    
+    # 只更新了玩家列表时按新列表重建索引
+    state = manager.update_state({"players": updated})
+    assert player_index(state).alive_ids == {2, 4}
+    assert player_index({"players": updated}).alive_ids == {2, 4}
+
+
+def test_alive_counts():
+    """测试各阵营存活计数"""
+    manager = StateManager()
+    players = [
+        Player(player_id=1, name="玩家1", role="villager"),
+        Player(player_id=2, name="玩家2", role="werewolf"),
+        Player(player_id=3, name="玩家3", role="werewolf"),
+        Player(player_id=4, name="玩家4", role="seer"),
+        Player(player_id=5, name="玩家5", role="guard", is_alive=False),
+    ]
+    state = manager.init_state(players)
+    assert alive_counts(state) == {"werewolves": 2, "villagers": 1, "gods": 1}
+    
+    # 出局时按阵营增量更新，已出局的玩家不重复计数，原计数不被修改
+    counts = record_deaths(state, [players[1], players[3], players[4], None])
+    assert counts == {"werewolves": 1, "villagers": 1, "gods": 0}
+    assert state["alive_counts"]["werewolves"] == 2
+    
+    # 状态中没有计数时按玩家列表统计
+    assert alive_counts({"players": players}) == {"werewolves": 2, "villagers": 1, "gods": 1}
+    
+    # 未登记阵营的角色直接报错，不会被悄悄漏掉而改变胜负判定
+    hunter = Player(player_id=6, name="玩家6", role="hunter")
+    with pytest.raises(ValueError, match="hunter"):
+        alive_counts({"players": players + [hunter]})
+    with pytest.raises(ValueError, match="hunter"):
+        record_deaths(state, [hunter])
+
+
+def test_update_player():
+    """测试修改玩家（共享未变化的记录，增量更新索引和存活计数）"""
+    manager = StateManager()
+    players = [
+        Player(player_id=1, name="玩家1", role="villager", is_sheriff=True),
+        Player(player_id=2, name="玩家2", role="werewolf"),
+        Player(player_id=3, name="玩家3", role="seer"),
+    ]
+    state = manager.init_state(players)
+    
+    updates = update_player(state, 1, is_alive=False)
+    new_players = updates["players"]
+    assert new_players[0].is_alive is False and new_players[0].is_sheriff is True
+    assert new_players[1] is players[1] and new_players[2] is players[2]
+    # 原玩家列表、索引和计数不变
+    assert players[0].is_alive is True
+    assert state["player_index"].alive_ids == {1, 2, 3}
+    assert state["alive_counts"]["villagers"] == 1
+    
+    index = updates["player_index"]
+    assert index.players is new_players
+    assert index.alive_ids == {2, 3}
+    assert [p.player_id for p in index.alive()] == [2, 3]
+    assert index.sheriff() is None
+    assert updates["alive_counts"] == {"werewolves": 1, "villagers": 0, "gods": 1}
+    
+    # 连续修改：警徽移交给玩家3
+    updates.update(update_player({**state, **updates}, 3, is_sheriff=True))
+    assert updates["player_index"].sheriff().player_id == 3
+    assert updates["players"][2].is_sheriff is True
+    assert updates["player_index"].get(3) is updates["players"][2]
+    assert updates["alive_counts"] == {"werewolves": 1, "villagers": 0, "gods": 1}
+    
+    # 不存在的玩家不产生更新；玩家记录不可变
+    assert update_player(state, 9, is_alive=False) == {}
+    with pytest.raises(Exception):
+        players[0].is_alive = False
+
+
+def test_game_history_spills_to_disk():
+    """测试历史记录：内存只保留最近的记录，快照视图不受后续追加影响"""
+    from src.state.history import GameHistory, append_history
+    from src.utils.prompt_builder import recent_speeches, format_game_history
+    
+    history = GameHistory(window=3)
+    snapshots = []
+    for day in range(1, 6):
+        history = append_history(history, [
+            {"type": "night_action", "day": day, "actions": {}, "killed": [day], "guard_protected": None},
+            {"type": "discussion", "day": day, "discussions": [
+                {"player_id": day, "player_name": f"玩家{day}", "content": f"第{day}天"},
+            ]},
+        ])
+        snapshots.append(history)
+    
+    assert len(history) == 10
+    assert history.in_memory == 3
+    # 早期记录从磁盘读取，保持原样（包括整数键）
+    assert history[0]["killed"] == [1]
+    assert [entry["day"] for entry in history][::2] == [1, 2, 3, 4, 5]
+    assert history[-1]["discussions"][0]["content"] == "第5天"
+    assert history[2:4] == list(history)[2:4]
+    assert [e["day"] for e in reversed(history)][:2] == [5, 5]
+    
+    # 之前的快照仍然只包含当时的记录
+    assert len(snapshots[0]) == 2
+    assert snapshots[1][-1]["day"] == 2
+    
+    # 从较早的快照继续追加（分支）不影响原日志
+    branch = snapshots[1].extend([{"type": "self_explode", "day": 3, "player_id": 2, "player_name": "玩家2", "role": "werewolf"}])
+    assert len(branch) == 5 and branch[-1]["type"] == "self_explode"
+    assert history[4]["type"] == "night_action"
+    
+    # prompt 构建从最近的记录中取发言
+    assert [s["content"] for s in recent_speeches(history, limit=2)] == ["第4天", "第5天"]
+    assert "第5天发言：1人发言" in format_game_history(history)
+    
+    # 图初始化时的空列表与初始历史合并
+    assert append_history([], history) is history
+    assert append_history([], [{"type": "game_end", "day": 1}]) == [{"type": "game_end", "day": 1}]
+    
+    # 序列化只复制磁盘字节和内存尾部，反序列化后磁盘记录仍留在磁盘
+    import pickle
+    restored = pickle.loads(pickle.dumps(history))
+    assert restored == history and restored.in_memory == 3 and restored.window == 3
+    earlier = pickle.loads(pickle.dumps(snapshots[2]))
+    assert earlier == snapshots[2] and earlier.in_memory == 0
+    assert len(earlier.extend([{"type": "game_end", "day": 4}])) == 7
+    
+    # 按内容比较，不可哈希
+    with pytest.raises(TypeError):
+        hash(history)
+
+
 def test_vote_state():
     """测试投票状态"""
     manager = StateManager()
@@ -194,3 +353,27 @@ def test_last_words_state():
     updated_state = manager.update_state(updates)
     assert updated_state["last_words"][1] == "我是好人"
 
+
+
+def test_pacing_config():
+    """测试发言节奏配置"""
+    from src.utils.pacing import make_pacing, pacing_delay
+    
+    manager = StateManager()
+    players = [Player(player_id=1, name="玩家1", role="villager")]
+    
+    # 默认保持每次发言后停顿 0.1 秒
+    state = manager.init_state(players)
+    assert pacing_delay(state["pacing"], "你好") == 0.1
+    
+    # 批量模拟模式无停顿
+    state = manager.init_state(players, pacing=make_pacing("turbo"))
+    assert pacing_delay(state["pacing"], "你好") == 0.0
+    
+    # 实时模式按字数计算，且不超过上限
+    realtime = make_pacing("realtime", delay=0.5, chars_per_second=10, max_delay=2.0)
+    assert pacing_delay(realtime, "一" * 10) == 1.5
+    assert pacing_delay(realtime, "一" * 100) == 2.0
+    
+    with pytest.raises(ValueError):
+        make_pacing("slow")